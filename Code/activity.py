@@ -1,21 +1,33 @@
+import heapq
+
 import numpy as np
 
+from history import HistoryStore
+from rng import RandomStreams, ACTIVITY_STAY
+
 
 class Activity:
     """
     Class which defines Activities within the park simulation. Stores activity characteristics, current state and log.
     """
 
-    def __init__(self, activity_characteristics, random_seed=None):
+    def __init__(self, activity_characteristics, random_seed=None, rng=None, history_store=None):
         """  
         Required Inputs:
             activity_characteristics: dictionary of characteristics for the activity        
+        Optional Inputs:
+            random_seed: seeds random number generation for reproduction
+            rng: shared RandomStreams service, one is created from random_seed if not given
+            history_store: shared HistoryStore the activity records its metrics in, it keeps its own if not given
         """
 
         self.activity_characteristics = activity_characteristics
         self.state = {}  # characterizes activity current state
         self.history = {} 
         self.random_seed = random_seed
+        if rng is None and random_seed is not None:
+            rng = RandomStreams(random_seed)
+        self.rng = rng
 
         if (
             type(self.activity_characteristics["popularity"]) != int 
@@ -33,21 +45,25 @@ class Activity:
         self.mean_time = self.activity_characteristics["mean_time"]
        
         # state
-        self.state["visitors"] = []
-        self.state["visitor_time_remaining"] = []
+        # agent_id -> sequence number of the visit, only visits still in this dict are live
+        self.state["visitors"] = {}
+        # min-heap of (exit_time, -sequence number, agent_id). Entries of visits that were force exited stay in the heap
+        # and are skipped when they surface. The negated sequence number releases simultaneous exits newest first.
+        self.state["exit_schedule"] = []
+        self.visit_counter = 0
 
         # history
-        self.history["total_vistors"] = {}
+        history_store = history_store if history_store is not None else HistoryStore()
+        self.history["total_vistors"] = history_store.add_column(metric="total_vistors", name=self.name, dtype=np.int32)
 
-    def add_to_activity(self, agent_id, expedited_return_time):
-        """ Adds an agent to the activity and generates the time they will spend there. """
+    def add_to_activity(self, agent_id, expedited_return_time, time, visit=None):
+        """ Adds an agent to the activity and generates the time they will spend there. Returns that stay time. visit
+        is the agent's visit index, which keys the stay time draw. """
 
-        self.state["visitors"].append(agent_id)
-
-        if self.random_seed:
-            rng = np.random.default_rng(self.random_seed+agent_id)
+        if self.rng is not None:
             stay_time = int(
-                max((rng.normal(self.mean_time, self.mean_time/2, 1))[0], 1)
+                max(self.rng.normal(ACTIVITY_STAY, agent_id=agent_id, index=visit, mean=self.mean_time,
+                                    std=self.mean_time/2), 1)
             )
         else:
             stay_time = int(
@@ -58,46 +74,34 @@ class Activity:
         if expedited_return_time:
             stay_time = min(max(1, min(expedited_return_time)), stay_time)
         
-        self.state["visitor_time_remaining"].append(stay_time)
+        self.visit_counter += 1
+        self.state["visitors"][agent_id] = self.visit_counter
+        heapq.heappush(self.state["exit_schedule"], (time + stay_time, -self.visit_counter, agent_id))
+
+        return stay_time
 
     def force_exit(self, agent_id):
         """ Handles case where agent is forced to leave an activity to get on their
         expedited queue attraction """
 
-        ind = self.state["visitors"].index(agent_id)
-        del self.state["visitors"][ind]
-        del self.state["visitor_time_remaining"][ind]
+        del self.state["visitors"][agent_id]
 
     def step(self, time):
         """ Handles the following actions:
             - Allows agents to exit activity if they've spent all their time there
         """
 
-        exiting_agents = [
-            (ind, agent_id) for ind, agent_id in enumerate(self.state["visitors"])
-            if self.state["visitor_time_remaining"][ind] == 0
-        ]
-
-        # remove from visitor list, going in reverse maintains indices
-        exiting_agents.reverse()
-        for ind, agent_id in exiting_agents:
-            del self.state["visitors"][ind]
-            del self.state["visitor_time_remaining"][ind]
-
-        exiting_agents = [agent_id for ind, agent_id in exiting_agents]
+        exiting_agents = []
+        exit_schedule = self.state["exit_schedule"]
+        while exit_schedule and exit_schedule[0][0] <= time:
+            _, neg_visit, agent_id = heapq.heappop(exit_schedule)
+            if self.state["visitors"].get(agent_id) == -neg_visit:
+                del self.state["visitors"][agent_id]
+                exiting_agents.append(agent_id)
 
         return exiting_agents
 
-    def pass_time(self):
-        """ Pass 1 minute of time """
-
-        self.state["visitor_time_remaining"] = [visitor_time-1 for visitor_time in self.state["visitor_time_remaining"]]
-
     def store_history(self, time):
         """ Stores metrics """
 
-        self.history["total_vistors"].update(
-            {
-                time: len(self.state["visitors"])
-            }
-        )
+        self.history["total_vistors"][time] = len(self.state["visitors"])
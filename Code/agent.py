@@ -1,7 +1,17 @@
-import random
 import numpy as np
 
 from behavior_reference import BEHAVIOR_ARCHETYPE_PARAMETERS
+from event_log import (
+    EventLog, ARRIVED, BALKED, LEFT_PARK, ENTERED_QUEUE, ENTERED_EXP_QUEUE, VISITED_ACTIVITY, GOT_PASS,
+    ASSIGNED_RETURN_TIME, EXITED_ATTRACTION, BOARDED, BOARDED_WITH_PASS, EXITED_ACTIVITY
+)
+from park_model import ParkModel, AttractionHistoryView, ActivityHistoryView
+from population import validate_behavior_archetypes
+from wait_snapshot import WaitSnapshot
+from rng import (
+    RandomStreams, BEHAVIOR_ARCHETYPE, AGE_CLASS, STAY_TIME_PREFERENCE, LEAVE_PARK, ATTRACTION_OR_ACTIVITY,
+    ATTRACTION_CHOICE, ACTIVITY_CHOICE
+)
 
 
 def calculate_utility(w_0, popularity, w_1, n_past, n_future, w_2, wait_time, w_3, distance):
@@ -19,6 +29,34 @@ def calculate_utility(w_0, popularity, w_1, n_past, n_future, w_2, wait_time, w_
     return utility
 
 
+def calculate_utility_matrix(w_0, popularity, w_1, n_past, n_future, w_2, wait_time, w_3, distance):
+    """ Vectorized calculate_utility for many agents and attractions at once. popularity and wait_time are
+    (attractions,) vectors, w_2 is an (agents,) vector of wait discount betas, and n_past, n_future and distance are
+    (agents x attractions) matrices. Returns the (agents x attractions) utility matrix. """
+
+    utility = w_0 * popularity[None, :] / (w_1 * (1 + n_past + n_future))
+    utility *= np.asarray(w_2, dtype=float)[:, None] ** wait_time[None, :]
+    utility -= w_3 * distance
+    return utility
+
+
+def sample_masked_softmax(utilities, mask, uniforms):
+    """ Draws one column per row of a utility matrix with probability proportional to exp(utility), restricted to
+    the columns where mask is True. This is the same distribution the softmax weights give in
+    Agent.select_attraction_decision. uniforms holds one U(0, 1) draw per row. Returns the selected column per row, -1
+    for rows without any unmasked column. """
+
+    masked = np.where(mask, utilities, -np.inf)
+    row_max = masked.max(axis=1, initial=-np.inf)
+    has_choice = np.isfinite(row_max)
+    weights = np.exp(masked - np.where(has_choice, row_max, 0)[:, None])
+    cumulative = np.cumsum(weights, axis=1)
+    targets = uniforms * cumulative[:, -1]
+    selected = (cumulative <= targets[:, None]).sum(axis=1)
+    selected = np.minimum(selected, utilities.shape[1] - 1)
+    return np.where(has_choice, selected, -1)
+
+
 def softmax(attraction_utilities, normalize=True):
     """ Quick self-implementation of softmax.
     attraction_utilities: dict of utility scores of valid attractions.
@@ -40,26 +78,89 @@ def softmax(attraction_utilities, normalize=True):
     }
 
 
+class SelectionStats:
+    """ Instrumentation for attraction selection. select_attraction_decision used to sample an attraction, reject it
+    if it broke one of the agent's rules and sample again, recomputing softmax each time. For every decision this
+    records how many candidates were masked out up front and how many retries the old sample-and-reject loop would
+    have needed: when some attraction is acceptable, a rejected candidate r is drawn before the first acceptable one
+    with probability w_r / (w_r + W_accepted) (weights w = exp(utility)), otherwise every candidate is drawn.
+
+    The old loop is no longer run, so expected_retries is an analytic expectation computed from the weights, not a
+    measured count. max_rejected_candidates is the most candidates masked out in one decision, an upper bound on the
+    retries any single decision of the old loop could have needed. """
+
+    def __init__(self):
+        self.decisions = 0
+        self.candidates = 0
+        self.rejected = 0
+        self.expected_retries = 0.0
+        self.max_rejected_candidates = 0
+        self.rejected_histogram = {}  # number of rejected candidates -> decisions
+
+    def record(self, utilities, accepted):
+        """ Records one decision given the utilities of all candidate attractions and whether each was accepted """
+
+        utilities = np.asarray(utilities, dtype=float)
+        accepted = np.asarray(accepted, dtype=bool)
+        rejected = int(np.count_nonzero(~accepted))
+
+        if rejected == 0:
+            expected_retries = 0.0
+        elif accepted.any():
+            weights = np.exp(utilities - utilities.max())
+            accepted_weight = weights[accepted].sum()
+            expected_retries = float((weights[~accepted] / (weights[~accepted] + accepted_weight)).sum())
+        else:
+            expected_retries = float(rejected)
+
+        self.decisions += 1
+        self.candidates += len(utilities)
+        self.rejected += rejected
+        self.expected_retries += expected_retries
+        self.max_rejected_candidates = max(self.max_rejected_candidates, rejected)
+        self.rejected_histogram[rejected] = self.rejected_histogram.get(rejected, 0) + 1
+
+    def summary(self):
+        """ Returns the collected statistics as a dictionary. The old path figures are analytic expectations (see the
+        class docstring). """
+
+        decisions = max(self.decisions, 1)
+        return {
+            "decisions": self.decisions,
+            "mean_candidates": self.candidates / decisions,
+            "mean_rejected": self.rejected / decisions,
+            "expected_old_path_retries": self.expected_retries / decisions,
+            "expected_old_path_softmax_calls": 1 + self.expected_retries / decisions,
+            "max_rejected_candidates": self.max_rejected_candidates,
+            "rejected_histogram": dict(sorted(self.rejected_histogram.items())),
+        }
+
+
 class Agent:
     """ Class which defines agents within the park simulation. Stores agent characteristics, current state and log. """
 
-    def __init__(self, random_seed):
-        """  """
+    def __init__(self, random_seed, index=None, selection_stats=None, rng=None, event_log=None, model=None):
+        """
+        Required Inputs:
+            random_seed: seeds random number generation for reproduction
+        Optional Inputs:
+            index: shared AgentIndex that is notified of the agent's state transitions
+            selection_stats: shared SelectionStats that records every attraction selection
+            rng: shared RandomStreams service, one is created from random_seed if not given
+            event_log: shared EventLog the agent records its history in, the agent keeps its own if not given
+            model: shared ParkModel whose count matrices hold the agent's ride and activity history in a row the agent
+                acquires when initialized, the agent keeps a single row model of its own if not given
+        """
 
         self.agent_id = None  # unique identification number for agent
         self.state = {}  # characterizes agents current state
-        self.log = ""  # logs agent history as text
+        self.event_log = event_log if event_log is not None else EventLog()  # logs agent history as typed records
         self.random_seed = random_seed
-
-        for behavior_type, behavior_dict in BEHAVIOR_ARCHETYPE_PARAMETERS.items():
-            age_class_sum = behavior_dict["percent_no_child_rides"] + behavior_dict["percent_no_adult_rides"] + \
-                            behavior_dict["percent_no_preference"]
-            # deal with fuzzy float addition
-            if not 0.98 <= age_class_sum <= 1.0:
-                raise AssertionError(
-                    f"Behavior Archetype {behavior_type} characteristics percent_no_child_rides, percent_no_adult_rides,"
-                    "and percent_no_preference, must add up to 1"
-                )
+        self.index = index
+        self.selection_stats = selection_stats
+        self.rng = rng if rng is not None else RandomStreams(random_seed)
+        self.model = model
+        self.model_row = None  # row of the agent in the model's count matrices
 
     def initialize_agent(
             self,
@@ -69,11 +170,15 @@ class Agent:
             exp_limit,
             agent_id,
             attraction_names,
-            activity_names
+            activity_names,
+            behavior_archetype=None,
+            age_class=None,
+            stay_time_preference=None
     ):
         """ Takes a dictionary of the agent behavior distributions, the agents unique id, a list of all attractions, and
         a list of all activities (non-attraction things to do at park). Initializes the agents characteristics, current state
-        and their log. """
+        and their log. The behavior archetype, age class and stay time preference are drawn here unless they were
+        already drawn in bulk for the whole population (see Population). """
 
         self.agent_id = agent_id
 
@@ -92,55 +197,57 @@ class Agent:
                 "anticipated_wait_time": 0,
                 "expedited_return_time": [],
                 "expedited_pass": [],
+                "passes_redeemed": 0,
+                "decisions": 0,  # decision index, keys the agent's decision draws
+                "activity_visits": 0,  # visit index, keys the agent's activity stay draws
                 "expedited_pass_ability": exp_ability,
                 "exp_wait_threshold": exp_wait_threshold,
                 "exp_limit": exp_limit
             }
         )
-        # initialize attraction history
-        self.state.update(
-            {
-                "attractions": {
-                    attraction: {
-                        "times_completed": 0,
-                    } for attraction in attraction_names
-                }
-            }
-        )
-        # initialize activity history
+        # attraction and activity history are rows of the model's count matrices
+        if self.model is None:
+            self.model = ParkModel.for_names(attraction_names=attraction_names, activity_names=activity_names)
+            self.model_row = 0
+        else:
+            self.model_row = self.model.acquire_row()
         self.state.update(
             {
-                "activities": {
-                    activity: {
-                        "times_visited": 0,
-                        "time_spent": 0,
-                    } for activity in activity_names
-                }
+                "attractions": AttractionHistoryView(model=self.model, row=self.model_row),
+                "activities": ActivityHistoryView(model=self.model, row=self.model_row),
             }
         )
 
         # initialize agent behavior
-        behavior_archetype = self.select_behavior_archetype(
-            behavior_archetype_distribution=behavior_archetype_distribution,
-            agent_id=agent_id,
-        )
+        if behavior_archetype is None:
+            validate_behavior_archetypes()
+            behavior_archetype = self.select_behavior_archetype(
+                behavior_archetype_distribution=behavior_archetype_distribution,
+                agent_id=agent_id,
+            )
 
-        self.state.update(
-            {
-                "age_class": self.select_age_class(
-                    agent_id=agent_id,
-                    behavior_archetype_dict=BEHAVIOR_ARCHETYPE_PARAMETERS[behavior_archetype]
-                )
-            }
-        )
+        if age_class is None:
+            age_class = self.select_age_class(
+                agent_id=agent_id,
+                behavior_archetype_dict=BEHAVIOR_ARCHETYPE_PARAMETERS[behavior_archetype]
+            )
+        self.state.update({"age_class": age_class})
         if not self.state["age_class"]:
             raise ValueError("Agent age_class not set.")
 
         parameters = BEHAVIOR_ARCHETYPE_PARAMETERS[behavior_archetype]
-        rng = np.random.default_rng(self.random_seed + self.agent_id)
-        stay_time_preference = int(
-            max((rng.normal(parameters["stay_time_preference"], parameters["stay_time_preference"] / 4, 1))[0], 0)
-        )
+        if stay_time_preference is None:
+            stay_time_preference = int(
+                max(
+                    self.rng.normal(
+                        STAY_TIME_PREFERENCE,
+                        agent_id=self.agent_id,
+                        mean=parameters["stay_time_preference"],
+                        std=parameters["stay_time_preference"] / 4
+                    ),
+                    0
+                )
+            )
 
         self.behavior = {
             "archetype": behavior_archetype,
@@ -151,10 +258,21 @@ class Agent:
             "wait_discount_beta": parameters["wait_discount_beta"]
         }
 
+    @property
+    def log(self):
+        """ The agent history as text, rendered from the event log on access """
+
+        return self.event_log.render(agent_id=self.agent_id)
+
+    def record_event(self, time, event_code, location=None, extra=0):
+        """ Records an event in the agent history """
+
+        self.event_log.record(agent_id=self.agent_id, minute=time, event_code=event_code, location=location, extra=extra)
+
     def select_behavior_archetype(self, agent_id, behavior_archetype_distribution):
         """ Selects a behavior_archetype based off of the behavior_archetype_distribution. """
 
-        rng = random.uniform(0, sum(behavior_archetype_distribution.values()))
+        rng = self.rng.uniform(BEHAVIOR_ARCHETYPE, agent_id=agent_id) * sum(behavior_archetype_distribution.values())
         floor = 0.0
         for behavior_archetype, behavior_archetype_weight in behavior_archetype_distribution.items():
             floor += behavior_archetype_weight
@@ -169,7 +287,7 @@ class Agent:
             "no_adult_rides": behavior_archetype_dict["percent_no_adult_rides"],
             "no_preference": behavior_archetype_dict["percent_no_preference"]
         }
-        rng = random.uniform(0, sum(age_class_distribution.values()))
+        rng = self.rng.uniform(AGE_CLASS, agent_id=agent_id) * sum(age_class_distribution.values())
         floor = 0.0
         for age_class, age_class_weight in age_class_distribution.items():
             floor += age_class_weight
@@ -183,21 +301,25 @@ class Agent:
         self.state["arrival_time"] = time
         self.state["current_location"] = "gate"
         self.state["current_park_area"] = park_area
-        self.state["current_action"] = "idling"
+        self.set_action("idling")
         self.state["time_spent_at_current_location"] = 0
-        self.log += f"Agent arrived at park at time {time}. "
+        if self.index is not None:
+            self.index.agent_arrived()
+        self.record_event(time=time, event_code=ARRIVED)
 
     def balk(self, time, expected_wait_time, actual_wait_time):
         """ Reset agent action due to unexpected increase in posted wait time"""
 
-        self.state["current_action"] = "idling"
+        self.set_action("idling")
         self.state["time_spent_at_current_location"] = 0
         delta = int(actual_wait_time - expected_wait_time)
         loc = self.state["current_location"]
-        self.log += f"Agent balked at {loc} at time {time} due to +{delta} minute posted wait. "
+        self.record_event(time=time, event_code=BALKED, location=loc, extra=delta)
 
-    def make_state_change_decision(self, attractions_dict, activities_dict, time, park_map, park_closed):
-        """  When an agent is idle allow them to make a decision about what to do next. """
+    def make_state_change_decision(self, attractions_dict, activities_dict, time, park_map, park_closed,
+                                   wait_snapshot=None):
+        """  When an agent is idle allow them to make a decision about what to do next. wait_snapshot is the park's
+        WaitSnapshot of the current step, one is taken from attractions_dict if not given. """
         # TODO: Should this method return action, location tuple or should it update internal state? or both?
         # ^ no, I think it's ok as-is.  agent wants to do something, park object will orchestrate the result of that
         # intended action.
@@ -215,21 +337,20 @@ class Agent:
             action, location = self.make_attraction_activity_decision(
                 activities_dict=activities_dict,
                 attractions_dict=attractions_dict,
-                park_map=park_map
+                park_map=park_map,
+                time=time,
+                wait_snapshot=wait_snapshot
             )
 
         return action, location
 
-    def make_attraction_activity_decision(self, activities_dict, attractions_dict, park_map):
+    def make_attraction_activity_decision(self, activities_dict, attractions_dict, park_map, time, wait_snapshot=None):
         """ Decide what to do """
-        for i in range(len(self.state["expedited_pass"])):
-            if self.state["expedited_return_time"][i] <= 0:
-                action, location = "redeeming exp pass", self.state["expedited_pass"][i]
-                return action, location
+        action, location = self.decide_to_redeem_pass()
+        if action:
+            return action, location
 
-        desired_decision_type, valid_attractions = self.decide_attraction_or_activity(
-            attractions_dict=attractions_dict,
-        )
+        desired_decision_type, valid_attractions = self.decide_attraction_or_activity(attractions_dict=attractions_dict)
         # select activity
         if desired_decision_type == "activity":
             selected_activity = self.select_activity_decision(activities_dict=activities_dict)
@@ -239,7 +360,9 @@ class Agent:
             action, location = self.select_attraction_decision(
                 valid_attractions=valid_attractions,
                 attractions_dict=attractions_dict,
-                park_map=park_map
+                park_map=park_map,
+                time=time,
+                wait_snapshot=wait_snapshot
             )
             # only default to activity if all wait times are too long for agent and
             # no exp passes are available
@@ -249,6 +372,14 @@ class Agent:
 
         return action, location
 
+    def decide_to_redeem_pass(self):
+        """ Agent heads to redeem the first held expedited pass whose return time has arrived """
+
+        for i in range(len(self.state["expedited_pass"])):
+            if self.state["expedited_return_time"][i] <= 0:
+                return "redeeming exp pass", self.state["expedited_pass"][i]
+        return None, None
+
     def decide_attraction_or_activity(self, attractions_dict):
         """ Agent decides if they want to visit an attraction or activity. The agent will decide between
         an attraction or activity. If they select an activity, that's it. If they select an attraction, they
@@ -256,11 +387,11 @@ class Agent:
         history and their expedited_pass status. If no valid attractions exist then they will default to 
         an activity. """
 
+        held_passes = self.state["expedited_pass"]
         # if agent has room for another exp pass, they should attempt to get one.?
-        can_get_exp = len(self.state["expedited_pass"]) < self.state["exp_limit"] \
-            and self.state["expedited_pass_ability"]
+        can_get_exp = len(held_passes) < self.state["exp_limit"] and self.state["expedited_pass_ability"]
 
-        coinflip = random.uniform(0, 1)
+        coinflip = self.rng.uniform(ATTRACTION_OR_ACTIVITY, agent_id=self.agent_id, index=self.state["decisions"])
         if coinflip <= self.behavior["attraction_preference"] or can_get_exp:
             # determine which attractions agent is eligible for
             # remove repeats and/or attractions with exp pass in hand
@@ -268,12 +399,17 @@ class Agent:
             if self.behavior["allow_repeats"]:
                 valid_attractions = [
                     attraction for attraction in attractions_dict.keys()
-                    if attraction not in self.state["expedited_pass"]
+                    if attraction not in held_passes
                 ]
             else:
+                # keep the park's attraction order so a given random draw selects the same attraction here and in
+                # Park.batch_select_attractions
+                rides = self.model.ride_counts[self.model_row].tolist()
+                attraction_ids = self.model.attraction_ids
                 valid_attractions = [
-                    attraction for attraction, attractions_history in self.state["attractions"].items()
-                    if attractions_history["times_completed"] == 0 and attraction not in self.state["expedited_pass"]
+                    attraction for attraction in attractions_dict.keys()
+                    if rides[attraction_ids[attraction]] == 0
+                    and attraction not in held_passes
                 ]
             if self.state["age_class"] == "no_child_rides":
                 valid_attractions = [
@@ -294,33 +430,52 @@ class Agent:
 
         return desired_decision_type, valid_attractions
 
-    def select_attraction_decision(self, valid_attractions, attractions_dict, park_map):
-        """ Selects an attraction to visit based on the attraction popularity """
-
-        # get valid attraction wait times
+    def select_attraction_decision(self, valid_attractions, attractions_dict, park_map, time=None, wait_snapshot=None):
+        """ Selects an attraction to visit based on the attraction popularity. time (park minute) only dates the wait
+        snapshot taken when none is given. """
+
+        if wait_snapshot is None:
+            wait_snapshot = WaitSnapshot.from_attractions(attractions=attractions_dict, time=time)
+        state = self.state
+        current_park_area = state["current_park_area"]
+        held_passes = state["expedited_pass"]
+        return_times = state["expedited_return_time"]
+        can_get_pass = state["expedited_pass_ability"] and len(held_passes) < state["exp_limit"]
+        exp_wait_threshold = state["exp_wait_threshold"]
+        # get valid attraction posted wait times
+        posted_wait_times = wait_snapshot.wait_time_values
+        snapshot_ids = wait_snapshot.attraction_ids
         attraction_wait_times = {
-            attraction_name: attraction.get_wait_time()
-            for attraction_name, attraction in attractions_dict.items()
+            attraction_name: posted_wait_times[snapshot_ids[attraction_name]]
+            for attraction_name in attractions_dict.keys()
             if attraction_name in valid_attractions  # attractions_dict
         }
         # get valid attraction distances from agent (in minutes)
-        attraction_distances = {
-            attraction_name: park_map[self.state["current_park_area"]][attraction.park_area]
-            for attraction_name, attraction in attractions_dict.items()
-            if attraction_name in valid_attractions
-        }
+        model = self.model
+        if model.attraction_areas:
+            area_distances = model.distances[model.park_area_ids[current_park_area]]
+            attraction_distances = {
+                attraction_name: area_distances[model.attraction_areas[model.attraction_ids[attraction_name]]]
+                for attraction_name in attractions_dict.keys()
+                if attraction_name in valid_attractions
+            }
+        else:
+            attraction_distances = {
+                attraction_name: park_map[current_park_area][attraction.park_area]
+                for attraction_name, attraction in attractions_dict.items()
+                if attraction_name in valid_attractions
+            }
         attraction_popularity_distribution = {
             attraction_name: parameters.popularity for attraction_name, parameters in attractions_dict.items()
             if attraction_name in valid_attractions
         }
+        rides = model.ride_counts[self.model_row].tolist()
         attraction_n_past = {
-            attr_name:
-                attr_history["times_completed"] for attr_name, attr_history in self.state["attractions"].items()
-            if attr_name in valid_attractions
+            attr_name: rides[model.attraction_ids[attr_name]] for attr_name in valid_attractions
         }
         attraction_n_future = {
             attr_name:
-                1 if attr_name in self.state["expedited_pass"] else 0 for attr_name in attractions_dict.keys()
+                1 if attr_name in held_passes else 0 for attr_name in attractions_dict.keys()
             if attr_name in valid_attractions
         }
         # get utility of all valid attractions once
@@ -339,45 +494,58 @@ class Agent:
             if attraction_name in valid_attractions
         }
         # remove any attractions with negative utility
-        for attraction in valid_attractions:
+        for attraction in list(valid_attractions):
             if attraction_utilities[attraction] <= 0:
                 valid_attractions.remove(attraction)
                 del attraction_utilities[attraction]
-        action, location = None, None
-        step_rng = 0
-        while len(valid_attractions) > 0 and not action:
-            step_rng += 1
-            # generate popularity distribution for valid attractions
-            probability_dist = softmax({
-                attr: attraction_utilities[attr] for attr in valid_attractions
-            })
-            desired_attraction = random.choices(
-                population=valid_attractions,
-                weights=[probability_dist[attr] for attr in valid_attractions],
-                k=1
-            )[0]
+        # the rules below only depend on the agent and the attraction, so instead of sampling and rejecting until an
+        # attraction is accepted they are applied up front and a single draw is made among the accepted attractions.
+        # sampling is proportional to exp(utility), so this gives the same distribution as the sample-and-reject loop.
+        accepted_actions = {}
+        for attraction in valid_attractions:
             if (
-                attraction_wait_times[desired_attraction] > self.state["exp_wait_threshold"]
-                and self.state["expedited_pass_ability"]
-                and len(self.state["expedited_pass"]) < self.state["exp_limit"]
-                and attractions_dict[desired_attraction].expedited_queue
-                and attractions_dict[desired_attraction].exp_pass_status == "open"
+                attraction_wait_times[attraction] > exp_wait_threshold
+                and can_get_pass
+                and wait_snapshot.pass_open_values[snapshot_ids[attraction]]
             ):
-                action, location = "get pass", desired_attraction
+                accepted_actions[attraction] = "get pass"
             elif (
-                    attraction_wait_times[desired_attraction]
-                    > (self.behavior["wait_threshold"] + (attractions_dict[desired_attraction].popularity * 6))
+                    attraction_wait_times[attraction]
+                    > (self.behavior["wait_threshold"] + (attractions_dict[attraction].popularity * 6))
             ):
-                valid_attractions.remove(desired_attraction)
-                del attraction_utilities[desired_attraction]
+                continue
             elif any(
-                    rt < attraction_wait_times[desired_attraction] + attractions_dict[desired_attraction].run_time
-                    for rt in self.state["expedited_return_time"]
+                    rt < attraction_wait_times[attraction] + attractions_dict[attraction].run_time
+                    for rt in return_times
             ):
-                valid_attractions.remove(desired_attraction)
-                del attraction_utilities[desired_attraction]
+                continue
             else:
-                action, location = "traveling", desired_attraction
+                accepted_actions[attraction] = "traveling"
+
+        if self.selection_stats is not None:
+            self.selection_stats.record(
+                utilities=[attraction_utilities[attr] for attr in valid_attractions],
+                accepted=[attr in accepted_actions for attr in valid_attractions]
+            )
+
+        action, location = None, None
+        if accepted_actions:
+            accepted_attractions = list(accepted_actions.keys())
+            # generate popularity distribution for accepted attractions
+            probability_dist = softmax({
+                attr: attraction_utilities[attr] for attr in accepted_attractions
+            })
+            rng = self.rng.uniform(ATTRACTION_CHOICE, agent_id=self.agent_id, index=state["decisions"]) * sum(
+                probability_dist[attr] for attr in accepted_attractions
+            )
+            floor = 0.0
+            desired_attraction = accepted_attractions[-1]
+            for attr in accepted_attractions:
+                floor += probability_dist[attr]
+                if rng < floor:
+                    desired_attraction = attr
+                    break
+            action, location = accepted_actions[desired_attraction], desired_attraction
 
         return action, location
 
@@ -396,8 +564,8 @@ class Agent:
         # determine if they should leave park, the larger this number is the more likely they are to leave
         if time != self.state["arrival_time"]:
             actual_preference_value = (time - self.state["arrival_time"]) - self.behavior["stay_time_preference"]
-            rng = np.random.default_rng(self.random_seed + self.agent_id + time)
-            normal_coinflip = (rng.normal(0, 1, 1) * 60)[0]  # N(0,1) * 60 has 95% CI of (-117.6, 117.6)
+            # N(0,1) * 60 has 95% CI of (-117.6, 117.6)
+            normal_coinflip = self.rng.normal(LEAVE_PARK, agent_id=self.agent_id, index=self.state["decisions"]) * 60
             if actual_preference_value > normal_coinflip:
                 action = "leaving"
                 location = "gate"
@@ -410,7 +578,9 @@ class Agent:
         activity_popularity_distribution = {
             activity: parameters.popularity for activity, parameters in activities_dict.items()
         }
-        rng = random.uniform(0, sum(activity_popularity_distribution.values()))
+        rng = self.rng.uniform(ACTIVITY_CHOICE, agent_id=self.agent_id, index=self.state["decisions"]) * sum(
+            activity_popularity_distribution.values()
+        )
         floor = 0.0
         for activity, activity_weight in activity_popularity_distribution.items():
             floor += activity_weight
@@ -419,21 +589,32 @@ class Agent:
 
     def pass_time(self):
         """ Pass 1 minute of time """
-        if self.state["within_park"]:
-            self.state["time_spent_at_current_location"] += 1
-            if self.state["expedited_pass"]:
-                self.state["expedited_return_time"] = [val - 1 for val in self.state["expedited_return_time"]]
-            if self.state["time_to_destination"] > 0:
-                self.state["time_to_destination"] -= 1
+        state = self.state
+        if state["within_park"]:
+            state["time_spent_at_current_location"] += 1
+            if state["expedited_pass"]:
+                state["expedited_return_time"] = [val - 1 for val in state["expedited_return_time"]]
+            if state["time_to_destination"] > 0:
+                state["time_to_destination"] -= 1
 
     def set_destination(self, action, location, travel_time, anticipated_wait_time):
         """ Updates agent state when they decide upon an action at a specified location"""
 
         # update internal state based on decided destination
+        self.state["decisions"] += 1
         self.state["destination"] = location
         self.state["time_to_destination"] = travel_time  # primitive 5 min delay on all actions for now
-        self.state["current_action"] = action
+        self.set_action(action)
         self.state["anticipated_wait_time"] = anticipated_wait_time
+        if self.index is not None:
+            self.index.schedule_destination(agent_id=self.agent_id, travel_time=travel_time)
+
+    def set_action(self, action):
+        """ Updates the agent's current action and keeps the park's idle index in sync """
+
+        self.state["current_action"] = action
+        if self.index is not None:
+            self.index.update_idle(agent_id=self.agent_id, idle=action == "idling")
 
     # ACTIONS
     def leave_park(self, time):
@@ -444,10 +625,12 @@ class Agent:
         self.state["current_park_area"] = None
         self.state["destination"] = None
         self.state["time_to_destination"] = 0  # should be idempotent, just for safekeeping
-        self.state["current_action"] = None
+        self.set_action(None)
         self.state["exit_time"] = time
         self.state["time_spent_at_current_location"] = 0
-        self.log += f"Agent left park at {time}. "
+        if self.index is not None:
+            self.index.agent_left(agent_id=self.agent_id)
+        self.record_event(time=time, event_code=LEFT_PARK)
 
     def enter_queue(self, attraction, park_area, time):
         """ Updates agent state when they enter an attraction queue """
@@ -456,9 +639,9 @@ class Agent:
         self.state["current_park_area"] = park_area
         self.state["destination"] = None
         self.state["time_to_destination"] = 0  # should be idempotent, just for safekeeping
-        self.state["current_action"] = "queueing"
+        self.set_action("queueing")
         self.state["time_spent_at_current_location"] = 0
-        self.log += f"Agent entered queue for {attraction} at time {time}. "
+        self.record_event(time=time, event_code=ENTERED_QUEUE, location=attraction)
 
     def enter_exp_queue(self, attraction, park_area, time):
         """ Updates agent state when they enter an attraction's expedited queue """
@@ -467,9 +650,9 @@ class Agent:
         self.state["current_park_area"] = park_area
         self.state["destination"] = None
         self.state["time_to_destination"] = 0  # should be idempotent, just for safekeeping
-        self.state["current_action"] = "queueing"
+        self.set_action("queueing")
         self.state["time_spent_at_current_location"] = 0
-        self.log += f"Agent entered exp queue for {attraction} at time {time}. "
+        self.record_event(time=time, event_code=ENTERED_EXP_QUEUE, location=attraction)
 
     def begin_activity(self, activity, park_area, time):
         """ Updates agent state when they visit an activity """
@@ -478,9 +661,10 @@ class Agent:
         self.state["current_park_area"] = park_area
         self.state["destination"] = None
         self.state["time_to_destination"] = 0  # should be idempotent, just for safekeeping
-        self.state["current_action"] = "browsing"
+        self.state["activity_visits"] += 1
+        self.set_action("browsing")
         self.state["time_spent_at_current_location"] = 0
-        self.log += f"Agent visited the activity {activity} at time {time}. "
+        self.record_event(time=time, event_code=VISITED_ACTIVITY, location=activity)
 
     def get_pass(self, attraction, park_area, time):
         """ Updates agent state when they get a pass """
@@ -489,22 +673,18 @@ class Agent:
         self.state["current_park_area"] = park_area
         self.state["destination"] = None
         self.state["time_to_destination"] = 0  # should be idempotent, just for safekeeping
-        self.state["current_action"] = "getting pass"
+        self.set_action("getting pass")
         self.state["expedited_pass"].append(attraction)
         self.state["time_spent_at_current_location"] = 0
-        self.log += (
-            f"Agent picked up an expedited pass for {attraction} at time {time}. "
-        )
+        self.record_event(time=time, event_code=GOT_PASS, location=attraction)
 
     def assign_expedited_return_time(self, expedited_return_time, current_time):
         """ Updates agent state when they are assigned a return time to their expedited attraction """
 
         minutes_to_return_time = max(0, expedited_return_time - current_time)
         self.state["expedited_return_time"].append(minutes_to_return_time)
-        self.state["current_action"] = "idling"
-        self.log += (
-            f"The expedited queue return time is in {minutes_to_return_time} minutes. "
-        )
+        self.set_action("idling")
+        self.record_event(time=current_time, event_code=ASSIGNED_RETURN_TIME, extra=minutes_to_return_time)
 
     def return_exp_pass(self, attraction):
         """ Updates agent state when they leave park before using the pass """
@@ -524,36 +704,36 @@ class Agent:
         """ Update agents state after they leave an attraction """
 
         # self.state["current_location"] = "gate"  ## removing this because they shouldn't actually leave the area?
-        self.state["current_action"] = "idling"
-        self.state["attractions"][name]["times_completed"] += 1
+        self.set_action("idling")
+        self.model.ride_counts[self.model_row, self.model.attraction_ids[name]] += 1
         self.state["time_spent_at_current_location"] = 0
 
-        self.log += f"Agent exited {name} at time {time}. "
+        self.record_event(time=time, event_code=EXITED_ATTRACTION, location=name)
 
     def agent_boarded_attraction(self, name, time):
         """ Update agents state after they board an attraction """
         if name in self.state["expedited_pass"]:
             self.return_exp_pass(name)
+            self.state["passes_redeemed"] += 1
             # self.state["current_location"] = name  # they should now already be there from enter_queue/enter_exp_queue
-            self.state["current_action"] = "riding"
+            self.set_action("riding")
             self.state["time_spent_at_current_location"] = 0
-            self.log += (
-                f"Agent boarded {name} and redeemed their expedited queue pass at time {time}. "
-            )
+            self.record_event(time=time, event_code=BOARDED_WITH_PASS, location=name)
             return True
         else:
             # self.state["current_location"] = name  # same as above
-            self.state["current_action"] = "riding"
+            self.set_action("riding")
             self.state["time_spent_at_current_location"] = 0
-            self.log += f"Agent boarded {name} at time {time}. "
+            self.record_event(time=time, event_code=BOARDED, location=name)
             return False
 
     def agent_exited_activity(self, name, time):
         """ Update agents state after they leave an activity """
 
         # self.state["current_location"] = "gate"
-        self.state["current_action"] = "idling"
-        self.state["activities"][name]["times_visited"] += 1
-        self.state["activities"][name]["time_spent"] += self.state["time_spent_at_current_location"]
+        self.set_action("idling")
+        activity_id = self.model.activity_ids[name]
+        self.model.visit_counts[self.model_row, activity_id] += 1
+        self.model.activity_minutes[self.model_row, activity_id] += self.state["time_spent_at_current_location"]
         self.state["time_spent_at_current_location"] = 0
-        self.log += f"Agent exited the activity {name} at time {time}. "
+        self.record_event(time=time, event_code=EXITED_ACTIVITY, location=name)
@@ -0,0 +1,60 @@
+class AgentIndex:
+    """ Incrementally maintained indexes over agent state so that Park.step only touches agents whose state changed.
+    Agents report their own state transitions (see Agent.set_action, Agent.set_destination, Agent.arrive_at_park and
+    Agent.leave_park), which keeps the following up to date:
+        - idle_agent_ids: agents within the park whose current action is "idling"
+        - destination_buckets: minute -> agent ids that reach their chosen destination at that minute
+        - active_agents: number of agents currently within the park
+    """
+
+    def __init__(self):
+        self.time = 0  # current park time, kept in sync by Park.step
+        self.idle_agent_ids = set()
+        self.destination_buckets = {}
+        self.destination_time = {}  # agent_id -> minute the agent reaches their destination
+        self.active_agents = 0
+
+    def update_idle(self, agent_id, idle):
+        """ Adds or removes an agent from the idle set """
+
+        if idle:
+            self.idle_agent_ids.add(agent_id)
+        else:
+            self.idle_agent_ids.discard(agent_id)
+
+    def schedule_destination(self, agent_id, travel_time):
+        """ Places an agent in the countdown bucket of the minute they will reach their destination """
+
+        arrival_minute = self.time + travel_time
+        self.destination_time[agent_id] = arrival_minute
+        self.destination_buckets.setdefault(arrival_minute, []).append(agent_id)
+
+    def agent_arrived(self):
+        """ Counts an agent entering the park """
+
+        self.active_agents += 1
+
+    def agent_left(self, agent_id):
+        """ Counts an agent leaving the park and drops any of their pending entries """
+
+        self.active_agents -= 1
+        self.idle_agent_ids.discard(agent_id)
+        self.destination_time.pop(agent_id, None)
+
+    def get_idle_agent_ids(self):
+        """ Returns the idle agent ids in ascending order, the same order a full scan of the park would produce """
+
+        return sorted(self.idle_agent_ids)
+
+    def pop_reached_destination_agent_ids(self, time):
+        """ Returns the agent ids (ascending) that reach their destination at the given minute. Entries that were
+        rescheduled to a different minute since they were bucketed are skipped. """
+
+        bucket = self.destination_buckets.pop(time, [])
+        reached_agent_ids = []
+        for agent_id in bucket:
+            if self.destination_time.get(agent_id) == time:
+                del self.destination_time[agent_id]
+                reached_agent_ids.append(agent_id)
+
+        return sorted(reached_agent_ids)
@@ -1,11 +1,22 @@
+import heapq
+import math
+from collections import deque
+
+import numpy as np
+
+from history import HistoryStore
+
+
 class Attraction:
     """ Class which defines Attractions within the park simulation. Stores attraction characteristics,
     current state and log. """
 
-    def __init__(self, attraction_characteristics):
+    def __init__(self, attraction_characteristics, history_store=None):
         """  
         Required Inputs:
             attraction_characteristics: dictionary of characteristics for the attraction        
+        Optional Inputs:
+            history_store: shared HistoryStore the attraction records its metrics in, it keeps its own if not given
         """
 
         self.attraction_characteristics = attraction_characteristics
@@ -43,25 +54,36 @@ class Attraction:
         # state
         # self.state["agents_in_attraction"] = []
         self.state["vehicles"] = [
-            {"run_time_remaining": round(i * self.run_time / self.num_vehicles),  # evenly spread out vehicles
+            {"dispatch_time": round(i * self.run_time / self.num_vehicles),  # evenly spread out vehicles
              "agents_in_vehicle": []
              } for i in range(self.num_vehicles)]
-        self.state["queue"] = []
-        self.state["exp_queue"] = []
+        # dispatch calendar, a heap of (dispatch_time, vehicle index) so the next dispatch is always at the top
+        self.dispatch_calendar = [(vehicle["dispatch_time"], ind) for ind, vehicle in enumerate(self.state["vehicles"])]
+        heapq.heapify(self.dispatch_calendar)
+        # FIFO queues of agent ids, O(1) appends and pops from the front
+        self.state["queue"] = deque()
+        self.state["exp_queue"] = deque()
         self.exp_pass_status = "open" if self.exp_queue_ratio > 0 else "closed"
         self.state["exp_queue_passes_distributed"] = 0
         self.state["exp_queue_passes_skipped"] = 0
         self.state["exp_queue_passes_redeemed"] = 0
         self.state["exp_return_time"] = 0
+        # the return window is cached until the first minute it could change (see update_exp_return_window)
+        self.exp_return_valid_until = -1
+        self.exp_return_inputs = None
         self.wait_time = 0
         self.exp_wait_time = 0
 
         # history
-        self.history["queue_length"] = {}
-        self.history["queue_wait_time"] = {}
-        self.history["exp_queue_length"] = {}
-        self.history["exp_queue_wait_time"] = {}
-        self.history["exp_return_time"] = {}
+        history_store = history_store if history_store is not None else HistoryStore()
+        for metric, dtype in (
+            ("queue_length", np.int32),
+            ("queue_wait_time", np.float64),
+            ("exp_queue_length", np.int32),
+            ("exp_queue_wait_time", np.float64),
+            ("exp_return_time", np.int32),
+        ):
+            self.history[metric] = history_store.add_column(metric=metric, name=self.name, dtype=dtype)
 
     def get_wait_time(self):
         """ Returns the expected queue wait time according to the equation
@@ -78,6 +100,23 @@ class Attraction:
         """
         return self.state["exp_return_time"]
 
+    def queue_length(self):
+        """ Returns the number of agents in the standby queue """
+
+        return len(self.state["queue"])
+
+    def exp_queue_length(self):
+        """ Returns the number of agents in the expedited queue """
+
+        return len(self.state["exp_queue"])
+
+    @staticmethod
+    def pop_agents(queue, count):
+        """ Pops up to count agent ids from the front of a queue """
+
+        count = min(count, len(queue))
+        return [queue.popleft() for _ in range(count)]
+
     def add_to_queue(self, agent_id):
         """ Adds an agent to the queue """
 
@@ -95,6 +134,7 @@ class Attraction:
 
         self.exp_queue_passes -= 1
         self.state["exp_queue_passes_distributed"] += 1
+        self.invalidate_exp_return_window()
 
     # TODO: Consider deprecating this method or updating it to not remove agent from queue
     def return_pass(self, agent_id):
@@ -103,11 +143,13 @@ class Attraction:
         self.exp_queue_passes += 1
         self.state["exp_queue_passes_distributed"] -= 1
         self.state["exp_queue"].remove(agent_id)
+        self.invalidate_exp_return_window()
 
     def redeem_pass(self):
         """ Redeems a valid expedited pass after agent had it removed. """
 
         self.state["exp_queue_passes_redeemed"] += 1
+        self.invalidate_exp_return_window()
 
     def step(self, time, park_close):
         """ Handles the following actions:
@@ -120,83 +162,73 @@ class Attraction:
         exiting_agents = []
         loaded_agents = []
 
-        for vehicle in self.state["vehicles"]:
+        # only vehicles due this minute are touched, popped in vehicle order for vehicles sharing a dispatch time
+        while self.dispatch_calendar and self.dispatch_calendar[0][0] <= time:
+            _, vehicle_ind = heapq.heappop(self.dispatch_calendar)
+            vehicle = self.state["vehicles"][vehicle_ind]
 
-            if vehicle["run_time_remaining"] == 0:
-                # left agents off attraction
-                exiting_agents.extend(vehicle["agents_in_vehicle"])
-                vehicle["agents_in_vehicle"] = []
-                vehicle["run_time_remaining"] = self.run_time
+            # left agents off attraction
+            exiting_agents.extend(vehicle["agents_in_vehicle"])
+            vehicle["agents_in_vehicle"] = []
+            vehicle["dispatch_time"] = time + self.run_time
+            heapq.heappush(self.dispatch_calendar, (vehicle["dispatch_time"], vehicle_ind))
 
-                # devote seats to queue and expedited queue
-                max_exp_queue_agents = int(self.agents_per_vehicle * self.exp_queue_ratio)
-                # Handle case where expedited queue has fewer agents than the maximum number of expedited queue spots
-                if len(self.state["exp_queue"]) < max_exp_queue_agents:
-                    max_queue_agents = int(self.agents_per_vehicle - len(self.state["exp_queue"]))
-                else:
-                    max_queue_agents = int(self.agents_per_vehicle - max_exp_queue_agents)
+            # devote seats to queue and expedited queue
+            max_exp_queue_agents = int(self.agents_per_vehicle * self.exp_queue_ratio)
+            # Handle case where expedited queue has fewer agents than the maximum number of expedited queue spots
+            if self.exp_queue_length() < max_exp_queue_agents:
+                max_queue_agents = int(self.agents_per_vehicle - self.exp_queue_length())
+            else:
+                max_queue_agents = int(self.agents_per_vehicle - max_exp_queue_agents)
 
-                # load expedited queue agents
-                expedited_agents_to_load = [agent_id for agent_id in self.state["exp_queue"][:max_exp_queue_agents]]
-                vehicle["agents_in_vehicle"] = expedited_agents_to_load
-                self.state["exp_queue"] = self.state["exp_queue"][max_exp_queue_agents:]
+            # load expedited queue agents
+            expedited_agents_to_load = self.pop_agents(self.state["exp_queue"], max_exp_queue_agents)
+            vehicle["agents_in_vehicle"] = expedited_agents_to_load
 
-                # load queue agents
-                agents_to_load = [agent_id for agent_id in self.state["queue"][:max_queue_agents]]
-                vehicle["agents_in_vehicle"].extend(agents_to_load)
-                self.state["queue"] = self.state["queue"][max_queue_agents:]
+            # load queue agents
+            agents_to_load = self.pop_agents(self.state["queue"], max_queue_agents)
+            vehicle["agents_in_vehicle"].extend(agents_to_load)
 
-                loaded_agents.extend(vehicle["agents_in_vehicle"])
+            loaded_agents.extend(vehicle["agents_in_vehicle"])
 
         return exiting_agents, loaded_agents
 
-    def pass_time(self):
-        """ Pass 1 minute of time """
+    def next_dispatch_time(self):
+        """ Returns the minute of the next vehicle dispatch """
 
-        for vehicle in self.state["vehicles"]:
-            vehicle["run_time_remaining"] -= 1
+        return self.dispatch_calendar[0][0]
 
     def store_history(self, time):
         """ Stores metrics """
 
-        self.history["queue_length"].update(
-            {
-                time: len(self.state["queue"])
-            }
-        )
-        self.history["queue_wait_time"].update(
-            {
-                time: self.get_wait_time()
-            }
-        )
-        self.history["exp_queue_length"].update(
-            {
-                time: len(self.state["exp_queue"])
-            }
-        )
-        self.history["exp_queue_wait_time"].update(
-            {
-                time: self.get_exp_wait_time()
-            }
-        )
-        self.history["exp_return_time"].update(
-            {
-                time: self.get_exp_return_time()
-            }
-        )
+        self.history["queue_length"][time] = self.queue_length()
+        self.history["queue_wait_time"][time] = self.get_wait_time()
+        self.history["exp_queue_length"][time] = self.exp_queue_length()
+        self.history["exp_queue_wait_time"][time] = self.get_exp_wait_time()
+        self.history["exp_return_time"][time] = self.get_exp_return_time()
+
+    def invalidate_exp_return_window(self):
+        """ Marks the cached expedited return window stale, called whenever the number of unredeemed passes changes """
+
+        self.exp_return_valid_until = -1
 
     def update_exp_return_window(self, time, close):
         """
         Update the expedited queue return window based on the number of total passes accounted for.
+        The window is only recomputed when it could have changed: after a pass was distributed, returned or redeemed
+        (see invalidate_exp_return_window), when the queue ratio or close time changed, or once time reaches
+        exp_return_valid_until, the first minute the window or pass status could move with the unredeemed passes
+        unchanged. Until then the result of a recomputation would equal the cached window.
         Inputs:
             :time - current park time (in minutes)
             :close - park close time (in minutes from park open)
         """
-        # TODO: Do this after each agent obtains a pass.
-        # TODO: Add handling of failed attempt to get pass?  Would the above warrant this?
-        # TODO: Update this to be based on current time and num passes not yet redeemed.
+        # TODO: Add handling of failed attempt to get pass?
         if not self.expedited_queue:
             raise ValueError(f"ERROR: Attraction {self.name} asked to update exp return window when not active.")
+        if time < self.exp_return_valid_until and self.exp_return_inputs == (self.exp_queue_ratio, close):
+            return
+        self.exp_return_inputs = (self.exp_queue_ratio, close)
         unredeemed_passes = self.state["exp_queue_passes_distributed"] - self.state["exp_queue_passes_redeemed"] - \
             self.state["exp_queue_passes_skipped"]
         minutes_to_process_unredeemed = unredeemed_passes / (self.theoretical_capacity * self.exp_queue_ratio)
@@ -214,17 +246,31 @@ class Attraction:
         else:
             self.state["exp_return_time"] = int(est_time_to_redeem_all + (5 - est_time_to_redeem_all % 5))
 
-    def update_wait_times(self):
+        if self.exp_pass_status == "closed":
+            # the window only moves later and the status never reopens
+            self.exp_return_valid_until = math.inf
+        elif self.state["exp_return_time"] > max_post_time:
+            # the posted window itself closes passes at the next update
+            self.exp_return_valid_until = time + 1
+        else:
+            # the return window is a multiple of 5 minutes and only moves when time reaches the next multiple of 5 or
+            # the estimated redemption time crosses one, one minute is taken off the latter to absorb float rounding
+            next_crossing = math.ceil(5 * (est_time_to_redeem_all // 5 + 1) - minutes_to_process_unredeemed) - 1
+            self.exp_return_valid_until = max(time + 1, min(time + (5 - time % 5), next_crossing))
+
+    def update_wait_times(self, time):
         """
         Updates the expected queue wait time according to new equation.  We will update estimated wait times based on the
         assumption that all queues will remain saturated during an agent's time in the queue, and that the ride will
         operate at its theoretical capacity.
+        Inputs:
+            :time - current park time (in minutes)
         """
-        minutes_to_next_dispatch = min([vehicle["run_time_remaining"] for vehicle in self.state["vehicles"]])
+        minutes_to_next_dispatch = self.next_dispatch_time() - time
         if self.expedited_queue:
-            self.wait_time = (len(self.state["queue"]) // (
+            self.wait_time = (self.queue_length() // (
                         self.theoretical_capacity * (1 - self.exp_queue_ratio))) + minutes_to_next_dispatch
-            self.exp_wait_time = (len(self.state["exp_queue"]) // (
+            self.exp_wait_time = (self.exp_queue_length() // (
                         self.theoretical_capacity * self.exp_queue_ratio)) + minutes_to_next_dispatch
         else:
-            self.wait_time = (len(self.state["queue"]) // self.theoretical_capacity) + minutes_to_next_dispatch
+            self.wait_time = (self.queue_length() // self.theoretical_capacity) + minutes_to_next_dispatch
@@ -0,0 +1,277 @@
+import sys
+import json
+import time
+import platform
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows, peak RSS is then not reported
+    resource = None
+
+from agent import softmax
+from ensemble import build_park
+from park import Park
+from sim_tests import sim_config
+
+
+BENCHMARK_FORMAT_VERSION = 1
+RANDOM_SEED = 5
+# daily agents of the fixed seed scenarios, 38047 is the actual average noted in sim_tests
+SCENARIOS = {"5k": 5000, "38k": 38047, "100k": 100000}
+MICRO_BENCHMARKS = ("Attraction.step", "Activity.step", "select_attraction_decision", "softmax", "generate_agents")
+
+
+def peak_rss_mb():
+    """ Returns the peak resident set size of this process in MB, None where the resource module is unavailable """
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(total_daily_agents, random_seed=RANDOM_SEED, park_options=None):
+    """ Runs one fixed seed day of the sim_tests park and returns its timings:
+        setup_seconds: building the park, arrival schedule, agents, attractions and activities
+        wall_seconds: stepping through the day
+        steps_per_second: minutes simulated per second of wall time
+        phase_seconds: wall time per Park.step phase (see StepProfiler), with the time outside of Park.step under
+            "other"
+        profile: the park's StepProfiler summary, with per attraction and activity times and event counters
+        peak_rss_mb: peak resident set size of the process
+    """
+
+    config = sim_config(total_daily_agents=total_daily_agents)
+    config["park_options"] = dict(park_options or {}, profile_steps=True)
+
+    start = time.perf_counter()
+    park = build_park(config=config, random_seed=random_seed)
+    setup_seconds = time.perf_counter() - start
+
+    steps = len(config["arrival_seed"]) * 60
+    start = time.perf_counter()
+    for _ in range(steps):
+        park.step()
+    wall_seconds = time.perf_counter() - start
+    phase_seconds = dict(park.profiler.phase_seconds)
+    phase_seconds["other"] = max(wall_seconds - sum(phase_seconds.values()), 0.0)
+
+    return {
+        "total_daily_agents": total_daily_agents,
+        "random_seed": random_seed,
+        "steps": steps,
+        "setup_seconds": setup_seconds,
+        "wall_seconds": wall_seconds,
+        "steps_per_second": steps / wall_seconds,
+        "phase_seconds": phase_seconds,
+        "profile": park.profiler.summary(),
+        "peak_rss_mb": peak_rss_mb(),
+        "left_agents": park.left_agents,
+    }
+
+
+def run_isolated_scenario(total_daily_agents, random_seed=RANDOM_SEED, park_options=None):
+    """ Runs a scenario in a fresh process, so its peak RSS is not inflated by earlier scenarios """
+
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(run_scenario, total_daily_agents, random_seed, park_options).result()
+
+
+def measure(function, calls):
+    """ Calls function(call) for call in range(calls) and returns the total and per call wall time """
+
+    start = time.perf_counter()
+    for call in range(calls):
+        function(call)
+    seconds = time.perf_counter() - start
+    return {"calls": calls, "seconds": seconds, "seconds_per_call": seconds / calls}
+
+
+def run_micro_benchmarks(total_daily_agents=5000, warm_minutes=240, calls=2000, random_seed=RANDOM_SEED,
+                         benchmarks=MICRO_BENCHMARKS):
+    """ Times the simulation hot paths in isolation on a park stepped to warm_minutes, so queues, activities and
+    agent histories are populated. Returns benchmark -> {"calls", "seconds", "seconds_per_call"}. """
+
+    config = sim_config(total_daily_agents=total_daily_agents)
+    park = build_park(config=config, random_seed=random_seed)
+    for _ in range(warm_minutes):
+        park.step()
+    results = {}
+
+    if "select_attraction_decision" in benchmarks:
+        agents = [
+            agent for agent in park.agents.values()
+            if agent.state["arrival_time"] is not None and agent.state["exit_time"] is None
+        ]
+        attraction_names = list(park.attractions)
+
+        def select(call):
+            agent = agents[call % len(agents)]
+            agent.select_attraction_decision(
+                valid_attractions=list(attraction_names),
+                attractions_dict=park.attractions,
+                park_map=park.park_map,
+                time=park.time,
+                wait_snapshot=park.wait_snapshot
+            )
+
+        results["select_attraction_decision"] = measure(select, calls)
+
+    if "softmax" in benchmarks:
+        utilities = np.random.default_rng(random_seed).uniform(0, 20, size=(calls, len(park.attractions)))
+        utility_dicts = [dict(zip(park.attractions, row)) for row in utilities]
+        results["softmax"] = measure(lambda call: softmax(utility_dicts[call]), calls)
+
+    # stepping attractions and activities on their own moves them past the park's minute, so these run last
+    if "Attraction.step" in benchmarks:
+        attractions = list(park.attractions.values())
+        results["Attraction.step"] = measure(
+            lambda call: attractions[call % len(attractions)].step(
+                time=park.time + call // len(attractions), park_close=park.park_close
+            ),
+            calls
+        )
+
+    if "Activity.step" in benchmarks:
+        activities = list(park.activities.values())
+        results["Activity.step"] = measure(
+            lambda call: activities[call % len(activities)].step(time=park.time + call // len(activities)), calls
+        )
+
+    if "generate_agents" in benchmarks:
+        park = Park(
+            attraction_list=config["attraction_list"],
+            activity_list=config["activity_list"],
+            park_map=config["park_map"],
+            entrance_park_area=config["entrance_park_area"],
+            plot_range=config["plot_range"],
+            random_seed=random_seed,
+            agent_logging=False
+        )
+        park.generate_arrival_schedule(
+            arrival_seed=config["arrival_seed"],
+            total_daily_agents=config["total_daily_agents"],
+            perfect_arrivals=config["perfect_arrivals"]
+        )
+        results["generate_agents"] = measure(
+            lambda call: park.generate_agents(
+                behavior_archetype_distribution=config["behavior_archetype_distribution"],
+                exp_ability_pct=config["exp_ability_pct"],
+                exp_wait_threshold=config["exp_wait_threshold"],
+                exp_limit=config["exp_limit"]
+            ),
+            1
+        )
+        results["generate_agents"]["agents"] = total_daily_agents
+
+    return results
+
+
+def run_benchmarks(scenarios=tuple(SCENARIOS), micro=True, park_options=None, isolate=True):
+    """ Runs the selected scenarios (keys of SCENARIOS) and the micro-benchmarks and returns the results with the
+    environment they ran in, ready to be saved as JSON """
+
+    run = run_isolated_scenario if isolate else run_scenario
+    results = {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "park_options": park_options or {},
+        "scenarios": {
+            name: run(total_daily_agents=SCENARIOS[name], park_options=park_options) for name in scenarios
+        },
+        "micro": run_micro_benchmarks() if micro else {},
+    }
+    return results
+
+
+def compare_results(results, baseline, tolerance=0.10, min_phase_seconds=0.05):
+    """ Compares benchmark results against a saved baseline. Returns a list of regressions, each a dictionary with
+    the benchmark, the measurement and the baseline and current values, for every scenario wall time, phase time,
+    peak RSS or micro-benchmark time per call that grew by more than tolerance (a fraction of the baseline). Phases
+    that took less than min_phase_seconds in the baseline are too noisy to compare and are skipped. """
+
+    measurements = []
+    for name, scenario in results["scenarios"].items():
+        if name not in baseline["scenarios"]:
+            continue
+        saved = baseline["scenarios"][name]
+        measurements.append((name, "wall_seconds", saved["wall_seconds"], scenario["wall_seconds"]))
+        measurements.append((name, "peak_rss_mb", saved["peak_rss_mb"], scenario["peak_rss_mb"]))
+        for phase, seconds in scenario["phase_seconds"].items():
+            if saved["phase_seconds"].get(phase, 0) < min_phase_seconds:
+                continue
+            measurements.append((name, f"phase_seconds:{phase}", saved["phase_seconds"].get(phase), seconds))
+    for name, benchmark in results["micro"].items():
+        if name in baseline["micro"]:
+            measurements.append(
+                (name, "seconds_per_call", baseline["micro"][name]["seconds_per_call"], benchmark["seconds_per_call"])
+            )
+
+    regressions = []
+    for name, measurement, saved, current in measurements:
+        if saved is None or current is None or saved <= 0:
+            continue
+        change = current / saved - 1
+        if change > tolerance:
+            regressions.append(
+                {"benchmark": name, "measurement": measurement, "baseline": saved, "current": current, "change": change}
+            )
+    return regressions
+
+
+def print_results(results, regressions=None):
+    """ Prints benchmark results and any regressions against a baseline """
+
+    for name, scenario in results["scenarios"].items():
+        rss = "n/a" if scenario["peak_rss_mb"] is None else f"{scenario['peak_rss_mb']:.0f} MB"
+        print(
+            f"{name}: {scenario['wall_seconds']:.2f} s ({scenario['steps_per_second']:.1f} steps/s), "
+            f"setup {scenario['setup_seconds']:.2f} s, peak RSS {rss}"
+        )
+        for phase, seconds in sorted(scenario["phase_seconds"].items(), key=lambda item: -item[1]):
+            print(f"    {phase:<16}{seconds:9.3f} s  {100 * seconds / scenario['wall_seconds']:5.1f}%")
+    for name, benchmark in results["micro"].items():
+        print(f"{name}: {1e6 * benchmark['seconds_per_call']:.2f} us per call ({benchmark['calls']} calls)")
+    if regressions is not None:
+        if not regressions:
+            print("No regressions against the baseline")
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['benchmark']} {regression['measurement']}: {regression['baseline']:.4g} -> "
+                f"{regression['current']:.4g} (+{100 * regression['change']:.0f}%)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the park simulation")
+    parser.add_argument("--scenarios", nargs="*", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--no-micro", action="store_true", help="skip the micro-benchmarks")
+    parser.add_argument("--decision-mode", default="agent", choices=["agent", "batch"])
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument("--baseline", help="JSON file of saved results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown before flagging a regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(scenarios=args.scenarios, micro=not args.no_micro, park_options={"decision_mode": args.decision_mode})
+    regressions = None
+    if args.baseline:
+        with open(args.baseline, "rt") as file_reader:
+            regressions = compare_results(results=results, baseline=json.load(file_reader), tolerance=args.tolerance)
+    print_results(results=results, regressions=regressions)
+    if args.output:
+        with open(args.output, "wt") as file_writer:
+            json.dump(results, file_writer, indent=2)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+
+    main()
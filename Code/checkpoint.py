@@ -0,0 +1,500 @@
+import gc
+import heapq
+import json
+from contextlib import contextmanager
+
+import numpy as np
+
+from agent import Agent
+from event_log import EVENT_DTYPE
+from outcome_archive import OutcomeArchive
+from park_model import AttractionHistoryView, ActivityHistoryView
+from population import Population
+from wait_snapshot import Overposting
+
+
+CHECKPOINT_VERSION = 9
+
+# agent state fields by how they are stored
+NAME_FIELDS = ("current_location", "current_park_area", "current_action", "destination", "age_class")
+OPTIONAL_NUMBER_FIELDS = ("arrival_time", "exit_time")  # None is stored as a mask
+NUMBER_FIELDS = (
+    "within_park", "time_spent_at_current_location", "time_to_destination", "anticipated_wait_time",
+    "expedited_pass_ability", "exp_wait_threshold", "exp_limit", "passes_redeemed", "decisions", "activity_visits"
+)
+LIST_FIELDS = ("expedited_pass", "expedited_return_time")  # ragged, stored as flat values plus row offsets
+BEHAVIOR_FIELDS = ("allow_repeats", "attraction_preference", "wait_threshold", "wait_discount_beta")
+
+
+def scalar(value):
+    """ Converts NumPy scalars to python scalars so they can be written to the JSON header """
+
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def ragged_to_arrays(rows):
+    """ Flattens a list of lists into (values, offsets), row i is values[offsets[i]:offsets[i + 1]] """
+
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in rows], out=offsets[1:])
+    values = [value for row in rows for value in row]
+    return values, offsets
+
+
+def arrays_to_ragged(values, offsets):
+    """ Inverse of ragged_to_arrays """
+
+    values = values.tolist() if isinstance(values, np.ndarray) else values
+    offsets = offsets.tolist()
+    return [values[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+
+
+class NameTable:
+    """ Interns the strings of a checkpoint into integer codes, None is code -1 """
+
+    def __init__(self, names=()):
+        self.names = list(names)
+        self.codes = {name: code for code, name in enumerate(self.names)}
+
+    def encode(self, values):
+        codes = np.empty(len(values), dtype=np.int32)
+        for ind, name in enumerate(values):
+            if name is None:
+                codes[ind] = -1
+                continue
+            code = self.codes.get(name)
+            if code is None:
+                code = len(self.names)
+                self.names.append(name)
+                self.codes[name] = code
+            codes[ind] = code
+        return codes
+
+    def decode(self, codes):
+        lookup = np.array([None] + self.names, dtype=object)
+        return lookup[np.asarray(codes, dtype=np.int64) + 1].tolist()
+
+
+def agent_columns(park, agent_ids, names):
+    """ Returns a dictionary of per agent arrays for every state field """
+
+    agents = [park.agents[agent_id] for agent_id in agent_ids]
+    columns = {}
+
+    def values(field):
+        return [agent.state[field] for agent in agents]
+
+    for field in NAME_FIELDS:
+        columns[field] = names.encode(values(field))
+    for field in OPTIONAL_NUMBER_FIELDS:
+        field_values = values(field)
+        columns[f"{field}_missing"] = np.array([value is None for value in field_values], dtype=bool)
+        columns[field] = np.asarray([0 if value is None else value for value in field_values])
+    for field in NUMBER_FIELDS:
+        columns[field] = np.asarray(values(field))
+    for field in LIST_FIELDS:
+        flat, offsets = ragged_to_arrays(values(field))
+        columns[f"{field}_offsets"] = offsets
+        columns[field] = names.encode(flat) if field == "expedited_pass" else np.asarray(flat, dtype=np.int64)
+
+    return columns
+
+
+@contextmanager
+def paused_gc():
+    """ Pauses the cyclic garbage collector. Restoring creates millions of small long-lived containers, collecting
+    them mid-way only costs time. """
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def save_checkpoint(park, path):
+    """ Writes the complete state of a park between two steps to a versioned .npz file: agents, attraction vehicles and
+    queues, activity visits, arrivals, indexes, event log and history. Random draws are keyed by (seed, purpose,
+    agent, index) and the agents' decision and visit indices are saved with their state, so the seed is the whole
+    random number state. The header is JSON and every array is a plain NumPy
+    array, nothing is pickled. """
+
+    with paused_gc():
+        write_checkpoint(park=park, path=path)
+
+
+def write_checkpoint(park, path):
+    """ Does the work of save_checkpoint """
+
+    if park.posting_policy is not None and type(park.posting_policy) is not Overposting:
+        raise ValueError("Only Overposting posting policies can be saved in a checkpoint")
+    names = NameTable()
+    agent_ids = np.array(sorted(park.agents), dtype=np.int64)
+    arrays = {}
+
+    # agents
+    columns = agent_columns(park=park, agent_ids=agent_ids, names=names)
+    arrays.update({f"agent_{field}": values for field, values in columns.items()})
+    arrays["agent_ids"] = agent_ids
+    arrays["agent_model_row"] = np.array([park.agents[agent_id].model_row for agent_id in agent_ids.tolist()],
+                                         dtype=np.int64)
+    archetypes = sorted({park.agents[agent_id].behavior["archetype"] for agent_id in agent_ids.tolist()})
+    archetype_codes = {archetype: code for code, archetype in enumerate(archetypes)}
+    arrays["agent_archetype"] = np.array(
+        [archetype_codes[park.agents[agent_id].behavior["archetype"]] for agent_id in agent_ids.tolist()],
+        dtype=np.int16
+    )
+    arrays["agent_stay_time_preference"] = np.array(
+        [park.agents[agent_id].behavior["stay_time_preference"] for agent_id in agent_ids.tolist()], dtype=np.int64
+    )
+    behaviors = {}
+    for agent_id in agent_ids.tolist():
+        behavior = park.agents[agent_id].behavior
+        if behavior["archetype"] not in behaviors:
+            behaviors[behavior["archetype"]] = {field: scalar(behavior[field]) for field in BEHAVIOR_FIELDS}
+
+    # population, the traits of agents that have not arrived yet
+    population_header = None
+    if park.population is not None:
+        population = park.population
+        arrays["population_archetype"] = population.archetype
+        arrays["population_age_class"] = population.age_class
+        arrays["population_exp_ability"] = population.exp_ability
+        arrays["population_stay_time_preference"] = population.stay_time_preference
+        population_header = {
+            "archetypes": population.archetypes,
+            "exp_wait_threshold": population.exp_wait_threshold,
+            "exp_limit": population.exp_limit,
+            "behavior_archetype_distribution": park.behavior_archetype_distribution,
+        }
+
+    # ride and visit counts of every agent row, by attraction and activity id
+    model = park.model
+    arrays["model_ride_counts"] = model.ride_counts
+    arrays["model_visit_counts"] = model.visit_counts
+    arrays["model_activity_minutes"] = model.activity_minutes
+    model_header = {
+        "attractions": model.attraction_names,
+        "activities": model.activity_names,
+        "next_row": model.next_row,
+        "free_rows": model.free_rows,
+    }
+
+    # departed agents compacted into the outcome archive
+    archive_header = None
+    if park.outcome_archive is not None:
+        arrays["archive_records"] = park.outcome_archive.outcomes()
+        archive_header = {"archetypes": park.outcome_archive.archetypes}
+
+    # attractions
+    attraction_headers = []
+    for ind, attraction in enumerate(park.attractions.values()):
+        vehicles = attraction.state["vehicles"]
+        arrays[f"attraction_{ind}_queue"] = np.array(attraction.state["queue"], dtype=np.int64)
+        arrays[f"attraction_{ind}_exp_queue"] = np.array(attraction.state["exp_queue"], dtype=np.int64)
+        arrays[f"attraction_{ind}_dispatch_time"] = np.array([vehicle["dispatch_time"] for vehicle in vehicles],
+                                                              dtype=np.int64)
+        riders, offsets = ragged_to_arrays([vehicle["agents_in_vehicle"] for vehicle in vehicles])
+        arrays[f"attraction_{ind}_riders"] = np.array(riders, dtype=np.int64)
+        arrays[f"attraction_{ind}_riders_offsets"] = offsets
+        attraction_headers.append(
+            {
+                "name": attraction.name,
+                "exp_pass_status": attraction.exp_pass_status,
+                "exp_queue_passes": scalar(attraction.exp_queue_passes),
+                "wait_time": scalar(attraction.wait_time),
+                "exp_wait_time": scalar(attraction.exp_wait_time),
+                "state": {
+                    key: scalar(attraction.state[key]) for key in (
+                        "exp_queue_passes_distributed", "exp_queue_passes_skipped", "exp_queue_passes_redeemed",
+                        "exp_return_time"
+                    )
+                },
+            }
+        )
+
+    # activities, only live visits are kept
+    activity_headers = []
+    for ind, activity in enumerate(park.activities.values()):
+        live = [
+            (agent_id, -neg_visit, exit_time) for exit_time, neg_visit, agent_id in activity.state["exit_schedule"]
+            if activity.state["visitors"].get(agent_id) == -neg_visit
+        ]
+        live.sort(key=lambda visit: visit[1])
+        arrays[f"activity_{ind}_visits"] = np.array(live, dtype=np.int64).reshape(len(live), 3)
+        activity_headers.append({"name": activity.name, "visit_counter": activity.visit_counter})
+
+    # history
+    history_store = park.history_store
+    for metric in history_store.values:
+        arrays[f"history_{metric}_values"] = history_store.values[metric]
+        arrays[f"history_{metric}_written"] = history_store.written[metric]
+
+    # event log
+    arrays["events"] = park.event_log.records()
+
+    # arrivals and indexes
+    schedule_minutes = sorted(park.schedule)
+    arrays["schedule_minutes"] = np.array(schedule_minutes, dtype=np.int64)
+    arrays["schedule_arrivals"] = np.array([park.schedule[minute] for minute in schedule_minutes], dtype=np.int64)
+    agent_index = park.agent_index
+    arrays["index_idle_agent_ids"] = np.array(sorted(agent_index.idle_agent_ids), dtype=np.int64)
+    destination_ids = sorted(agent_index.destination_time)
+    arrays["index_destination_ids"] = np.array(destination_ids, dtype=np.int64)
+    arrays["index_destination_time"] = np.array(
+        [agent_index.destination_time[agent_id] for agent_id in destination_ids], dtype=np.int64
+    )
+
+    selection_stats = None
+    if park.selection_stats is not None:
+        stats = park.selection_stats
+        selection_stats = {
+            "decisions": stats.decisions,
+            "candidates": stats.candidates,
+            "rejected": stats.rejected,
+            "expected_retries": stats.expected_retries,
+            "max_rejected_candidates": stats.max_rejected_candidates,
+            "rejected_histogram": [[rejected, count] for rejected, count in stats.rejected_histogram.items()],
+        }
+
+    header = {
+        "checkpoint_version": CHECKPOINT_VERSION,
+        "config": {
+            "attraction_list": park.attraction_list,
+            "activity_list": park.activity_list,
+            "park_map": park.park_map,
+            "entrance_park_area": park.entrance_park_area,
+            "plot_range": park.plot_range,
+            "version": park.version,
+            "random_seed": park.random_seed,
+            "verbosity": park.verbosity,
+            "decision_mode": park.decision_mode,
+            "track_selection_stats": park.selection_stats is not None,
+            "agent_logging": park.event_log.enabled,
+            "profile_steps": park.profiler is not None,
+            "archive_departed": park.outcome_archive is not None,
+            "posting_policy": vars(park.posting_policy) if park.posting_policy is not None else None,
+        },
+        "park": {
+            "time": park.time,
+            "arrival_index": park.arrival_index,
+            "active_agents": park.active_agents,
+            "left_agents": park.left_agents,
+            "park_close": park.park_close,
+            "distributed_passes": park.history["distributed_passes"],
+            "redeemed_passes": park.history["redeemed_passes"],
+            "index_active_agents": agent_index.active_agents,
+        },
+        "names": names.names,
+        "agents": {
+            "archetypes": archetypes,
+            "behaviors": behaviors,
+            "dtypes": {field: str(columns[field].dtype) for field in OPTIONAL_NUMBER_FIELDS + NUMBER_FIELDS},
+        },
+        "population": population_header,
+        "model": model_header,
+        "outcome_archive": archive_header,
+        "attractions": attraction_headers,
+        "activities": activity_headers,
+        "history": {"horizon": history_store.horizon, "names": history_store.names},
+        "event_log": {"locations": park.event_log.location_names},
+        "selection_stats": selection_stats,
+    }
+    arrays["header"] = np.frombuffer(json.dumps(header, default=scalar).encode("utf-8"), dtype=np.uint8)
+
+    with open(path, "wb") as file_writer:
+        np.savez(file_writer, **arrays)
+
+
+def load_checkpoint(path, park_class):
+    """ Rebuilds a park from a checkpoint written by save_checkpoint. The returned park continues exactly where the
+    saved one stopped. """
+
+    with paused_gc():
+        return restore_park(path=path, park_class=park_class)
+
+
+def restore_park(path, park_class):
+    """ Does the work of load_checkpoint """
+
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+    header = json.loads(arrays.pop("header").tobytes().decode("utf-8"))
+    if header["checkpoint_version"] != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version: {header['checkpoint_version']}")
+
+    config = dict(header["config"])
+    if config.get("posting_policy") is not None:
+        config["posting_policy"] = Overposting(**config["posting_policy"])
+    park = park_class(**config)
+    for key, value in header["park"].items():
+        if key in {"distributed_passes", "redeemed_passes"}:
+            park.history[key] = value
+        elif key != "index_active_agents":
+            setattr(park, key, value)
+    park.schedule = dict(zip(arrays["schedule_minutes"].tolist(), arrays["schedule_arrivals"].tolist()))
+    park.generate_attractions()
+    park.generate_activities()
+    names = NameTable(header["names"])
+
+    model = park.model
+    if model.attraction_names != header["model"]["attractions"] or model.activity_names != header["model"]["activities"]:
+        raise ValueError("Checkpoint attraction and activity ids do not match the park's")
+    model.total_agents = len(arrays["model_ride_counts"])
+    model.ride_counts = arrays["model_ride_counts"]
+    model.visit_counts = arrays["model_visit_counts"]
+    model.activity_minutes = arrays["model_activity_minutes"]
+    model.next_row = header["model"]["next_row"]
+    model.free_rows = list(header["model"]["free_rows"])
+
+    population_header = header["population"]
+    if population_header is not None:
+        park.population = Population(
+            archetypes=population_header["archetypes"],
+            archetype=arrays["population_archetype"],
+            age_class=arrays["population_age_class"],
+            exp_ability=arrays["population_exp_ability"],
+            stay_time_preference=arrays["population_stay_time_preference"],
+            exp_wait_threshold=population_header["exp_wait_threshold"],
+            exp_limit=population_header["exp_limit"]
+        )
+        park.behavior_archetype_distribution = population_header["behavior_archetype_distribution"]
+
+    restore_agents(park=park, arrays=arrays, header=header, names=names)
+    park.in_park_agents = {agent_id: agent for agent_id, agent in park.agents.items() if agent.state["within_park"]}
+
+    archive_header = header["outcome_archive"]
+    if archive_header is not None:
+        archive = OutcomeArchive(
+            attraction_names=model.attraction_names,
+            activity_names=model.activity_names,
+            capacity=len(arrays["archive_records"])
+        )
+        archive.size = len(arrays["archive_records"])
+        archive.records[:archive.size] = arrays["archive_records"]
+        archive.archetypes = list(archive_header["archetypes"])
+        archive.archetype_codes = {archetype: code for code, archetype in enumerate(archive.archetypes)}
+        park.outcome_archive = archive
+
+    # attractions
+    for ind, (attraction, attraction_header) in enumerate(zip(park.attractions.values(), header["attractions"])):
+        if attraction.name != attraction_header["name"]:
+            raise ValueError(f"Checkpoint attraction {attraction_header['name']} does not match {attraction.name}")
+        attraction.exp_pass_status = attraction_header["exp_pass_status"]
+        attraction.exp_queue_passes = attraction_header["exp_queue_passes"]
+        attraction.wait_time = attraction_header["wait_time"]
+        attraction.exp_wait_time = attraction_header["exp_wait_time"]
+        attraction.state.update(attraction_header["state"])
+        attraction.state["queue"].extend(arrays[f"attraction_{ind}_queue"].tolist())
+        attraction.state["exp_queue"].extend(arrays[f"attraction_{ind}_exp_queue"].tolist())
+        riders = arrays_to_ragged(arrays[f"attraction_{ind}_riders"], arrays[f"attraction_{ind}_riders_offsets"])
+        for vehicle, dispatch_time, agents_in_vehicle in zip(
+                attraction.state["vehicles"], arrays[f"attraction_{ind}_dispatch_time"].tolist(), riders
+        ):
+            vehicle["dispatch_time"] = dispatch_time
+            vehicle["agents_in_vehicle"] = agents_in_vehicle
+        attraction.dispatch_calendar = [
+            (vehicle["dispatch_time"], vehicle_ind) for vehicle_ind, vehicle in enumerate(attraction.state["vehicles"])
+        ]
+        heapq.heapify(attraction.dispatch_calendar)
+
+    # activities
+    for ind, (activity, activity_header) in enumerate(zip(park.activities.values(), header["activities"])):
+        if activity.name != activity_header["name"]:
+            raise ValueError(f"Checkpoint activity {activity_header['name']} does not match {activity.name}")
+        activity.visit_counter = activity_header["visit_counter"]
+        visits = arrays[f"activity_{ind}_visits"].tolist()
+        activity.state["visitors"] = {agent_id: visit for agent_id, visit, _ in visits}
+        activity.state["exit_schedule"] = [(exit_time, -visit, agent_id) for agent_id, visit, exit_time in visits]
+        heapq.heapify(activity.state["exit_schedule"])
+
+    # history
+    history_store = park.history_store
+    if history_store.names != header["history"]["names"]:
+        raise ValueError("Checkpoint history does not match the park's attractions and activities")
+    history_store.horizon = header["history"]["horizon"]
+    for metric in history_store.values:
+        history_store.values[metric] = arrays[f"history_{metric}_values"]
+        history_store.written[metric] = arrays[f"history_{metric}_written"]
+
+    # event log
+    event_log = park.event_log
+    events = arrays["events"].astype(EVENT_DTYPE)
+    event_log.buffer = np.concatenate([events, np.zeros(max(len(events), 1), dtype=EVENT_DTYPE)])
+    event_log.size = len(events)
+    event_log.location_names = list(header["event_log"]["locations"])
+    event_log.location_ids = {name: location_id for location_id, name in enumerate(event_log.location_names)}
+
+    # indexes
+    agent_index = park.agent_index
+    agent_index.time = park.time
+    agent_index.active_agents = header["park"]["index_active_agents"]
+    agent_index.idle_agent_ids = set(arrays["index_idle_agent_ids"].tolist())
+    agent_index.destination_time = dict(
+        zip(arrays["index_destination_ids"].tolist(), arrays["index_destination_time"].tolist())
+    )
+    agent_index.destination_buckets = {}
+    for agent_id, minute in agent_index.destination_time.items():
+        agent_index.destination_buckets.setdefault(minute, []).append(agent_id)
+
+    if park.selection_stats is not None:
+        stats = dict(header["selection_stats"])
+        stats["rejected_histogram"] = {rejected: count for rejected, count in stats["rejected_histogram"]}
+        park.selection_stats.__dict__.update(stats)
+
+    return park
+
+
+def restore_agents(park, arrays, header, names):
+    """ Recreates every arrived agent of a checkpoint """
+
+    agent_header = header["agents"]
+    agent_ids = arrays["agent_ids"].tolist()
+    columns = {key[len("agent_"):]: value for key, value in arrays.items() if key.startswith("agent_")}
+    dtypes = agent_header["dtypes"]
+
+    fields = {}
+    for field in NAME_FIELDS:
+        fields[field] = names.decode(columns[field])
+    for field in OPTIONAL_NUMBER_FIELDS:
+        values = columns[field].astype(dtypes[field]).tolist()
+        fields[field] = [None if missing else value for value, missing in zip(values, columns[f"{field}_missing"])]
+    for field in NUMBER_FIELDS:
+        fields[field] = columns[field].astype(dtypes[field]).tolist()
+    for field in LIST_FIELDS:
+        values = names.decode(columns[field]) if field == "expedited_pass" else columns[field]
+        fields[field] = arrays_to_ragged(values, columns[f"{field}_offsets"])
+
+    state_fields = NAME_FIELDS + OPTIONAL_NUMBER_FIELDS + NUMBER_FIELDS + LIST_FIELDS
+
+    archetypes = agent_header["archetypes"]
+    behaviors = agent_header["behaviors"]
+    archetype_codes = columns["archetype"].tolist()
+    stay_time_preferences = columns["stay_time_preference"].tolist()
+    model_rows = columns["model_row"].tolist()
+
+    states = [dict(zip(state_fields, values)) for values in zip(*[fields[field] for field in state_fields])]
+
+    park.agents = {}
+    for row, agent_id in enumerate(agent_ids):
+        agent = Agent(
+            random_seed=park.random_seed,
+            index=park.agent_index,
+            selection_stats=park.selection_stats,
+            rng=park.rng,
+            event_log=park.event_log,
+            model=park.model
+        )
+        agent.agent_id = agent_id
+        agent.model_row = model_rows[row]
+        state = states[row]
+        state["attractions"] = AttractionHistoryView(model=park.model, row=agent.model_row)
+        state["activities"] = ActivityHistoryView(model=park.model, row=agent.model_row)
+        agent.state = state
+        archetype = archetypes[archetype_codes[row]]
+        agent.behavior = {"archetype": archetype, "stay_time_preference": stay_time_preferences[row]}
+        agent.behavior.update(behaviors[archetype])
+        park.agents[agent_id] = agent
+
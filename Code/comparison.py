@@ -0,0 +1,180 @@
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from ensemble import ensemble_seeds, run_summary
+
+
+DEFAULT_METRICS = ["queue_wait_time", "exp_queue_wait_time"]
+
+# two-sided Student t critical values by degrees of freedom, degrees of freedom missing from the table use the next
+# smaller entry (a slightly wider, conservative interval)
+T_CRITICAL_VALUES = {
+    0.90: {
+        1: 6.314, 2: 2.920, 3: 2.353, 4: 2.132, 5: 2.015, 6: 1.943, 7: 1.895, 8: 1.860, 9: 1.833, 10: 1.812,
+        11: 1.796, 12: 1.782, 13: 1.771, 14: 1.761, 15: 1.753, 16: 1.746, 17: 1.740, 18: 1.734, 19: 1.729, 20: 1.725,
+        25: 1.708, 30: 1.697, 40: 1.684, 60: 1.671, 120: 1.658, math.inf: 1.645,
+    },
+    0.95: {
+        1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228,
+        11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110, 18: 2.101, 19: 2.093, 20: 2.086,
+        25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980, math.inf: 1.960,
+    },
+    0.99: {
+        1: 63.657, 2: 9.925, 3: 5.841, 4: 4.604, 5: 4.032, 6: 3.707, 7: 3.499, 8: 3.355, 9: 3.250, 10: 3.169,
+        11: 3.106, 12: 3.055, 13: 3.012, 14: 2.977, 15: 2.947, 16: 2.921, 17: 2.898, 18: 2.878, 19: 2.861, 20: 2.845,
+        25: 2.787, 30: 2.750, 40: 2.704, 60: 2.660, 120: 2.617, math.inf: 2.576,
+    },
+}
+
+
+def t_critical_value(confidence, degrees_of_freedom):
+    """ Returns the two-sided Student t critical value for a confidence level in T_CRITICAL_VALUES """
+
+    if confidence not in T_CRITICAL_VALUES:
+        raise ValueError(f"Unsupported confidence level: {confidence}, use one of {list(T_CRITICAL_VALUES)}")
+    table = T_CRITICAL_VALUES[confidence]
+    return table[max(df for df in table if df <= degrees_of_freedom)]
+
+
+def summary_outcomes(summary):
+    """ Reduces a run summary to scalar outcomes: the park totals and the daily mean of every summarized metric for
+    each entity, named "<metric>:<entity>" """
+
+    outcomes = {total: float(value) for total, value in summary["totals"].items()}
+    for metric, history in summary["history"].items():
+        daily_means = history["values"].mean(axis=0, dtype=np.float64) if len(history["minutes"]) else None
+        for ind, entity in enumerate(history["entities"]):
+            outcomes[f"{metric}:{entity}"] = np.nan if daily_means is None else float(daily_means[ind])
+    return outcomes
+
+
+def paired_statistics(baseline, candidate, confidence=0.95):
+    """ Returns the paired-difference statistics of two equally long arrays of per seed outcomes: the mean difference
+    (candidate - baseline), its standard error and confidence interval, the interval the same runs would give if the
+    two scenarios had been run with independent seeds (unpaired_ci_low, unpaired_ci_high), and the variance reduction,
+    the ratio of the variance the difference would have with independent seeds to its variance with common random
+    numbers. The variance reduction is roughly the factor by which pairing cuts the number of replications needed. """
+
+    baseline = np.asarray(baseline, dtype=float)
+    candidate = np.asarray(candidate, dtype=float)
+    runs = len(baseline)
+    differences = candidate - baseline
+    mean_difference = differences.mean()
+    if runs < 2:
+        return {"baseline_mean": baseline.mean(), "candidate_mean": candidate.mean(),
+                "mean_difference": mean_difference, "standard_error": np.nan, "ci_low": np.nan, "ci_high": np.nan,
+                "unpaired_ci_low": np.nan, "unpaired_ci_high": np.nan, "variance_reduction": np.nan}
+
+    paired_variance = differences.var(ddof=1)
+    independent_variance = baseline.var(ddof=1) + candidate.var(ddof=1)
+    standard_error = math.sqrt(paired_variance / runs)
+    half_width = t_critical_value(confidence=confidence, degrees_of_freedom=runs - 1) * standard_error
+    unpaired_half_width = t_critical_value(confidence=confidence, degrees_of_freedom=2 * (runs - 1)) * math.sqrt(
+        independent_variance / runs
+    )
+    return {
+        "baseline_mean": baseline.mean(),
+        "candidate_mean": candidate.mean(),
+        "mean_difference": mean_difference,
+        "standard_error": standard_error,
+        "ci_low": mean_difference - half_width,
+        "ci_high": mean_difference + half_width,
+        "unpaired_ci_low": mean_difference - unpaired_half_width,
+        "unpaired_ci_high": mean_difference + unpaired_half_width,
+        "variance_reduction": (
+            independent_variance / paired_variance if paired_variance > 0 else np.inf if independent_variance > 0
+            else np.nan
+        ),
+    }
+
+
+def scenario_entities(config):
+    """ Returns the names of the attractions and activities of a park configuration """
+
+    attractions = {attraction["name"] for attraction in config["attraction_list"]}
+    return attractions | {activity["name"] for activity in config["activity_list"]}
+
+
+def compare_scenarios(baseline, candidate, runs, seed=0, workers=None, metrics=None, confidence=0.95):
+    """ Compares two park configurations with common random numbers. Both scenarios are run with the same runs park
+    seeds, and because every random draw is keyed by seed, purpose and agent, each pair shares its arrival schedule,
+    agent population and every agent's exogenous draws. Decision and stay time draws are keyed by the agent's
+    decision and visit index rather than by minute, so the n-th decision of an agent draws the same numbers in both
+    scenarios even once their timelines have drifted apart. Differences within a pair then come mostly from the
+    change between the configurations (for example an expedited_queue_ratio or exp_ability_pct), so the paired
+    differences have much less noise than two independent ensembles.
+
+    Required Inputs:
+        baseline: park configuration, see ensemble.build_park
+        candidate: park configuration to compare against the baseline, with the same arrival_seed and
+            total_daily_agents so that the populations pair up, and the same attractions and activities so that
+            every outcome pairs up
+        runs: number of seeds (pairs) to run
+    Optional Inputs:
+        seed: comparison seed, the park seeds are derived from it as for an ensemble (see ensemble.ensemble_seeds)
+        workers: number of processes, defaults to the number of CPUs
+        metrics: history metrics compared by their daily mean per entity, defaults to DEFAULT_METRICS
+        confidence: confidence level of the intervals, one of T_CRITICAL_VALUES
+    Returns a dictionary with:
+        seeds: the park seed of each pair
+        outcomes: outcome -> {"baseline": per seed values, "candidate": per seed values}
+        statistics: outcome -> paired_statistics result
+    """
+
+    if confidence not in T_CRITICAL_VALUES:
+        raise ValueError(f"Unsupported confidence level: {confidence}, use one of {list(T_CRITICAL_VALUES)}")
+    only_baseline = sorted(scenario_entities(baseline) - scenario_entities(candidate))
+    only_candidate = sorted(scenario_entities(candidate) - scenario_entities(baseline))
+    if only_baseline or only_candidate:
+        raise ValueError(
+            f"Scenarios must have the same attractions and activities, only in baseline: {only_baseline}, "
+            f"only in candidate: {only_candidate}"
+        )
+    metrics = DEFAULT_METRICS if metrics is None else metrics
+    configs = {"baseline": baseline, "candidate": candidate}
+    seeds = ensemble_seeds(seed=seed, runs=runs)
+    tasks = [(scenario, run, random_seed) for run, random_seed in enumerate(seeds) for scenario in configs]
+
+    summaries = {scenario: [None] * runs for scenario in configs}
+    workers = min(workers or os.cpu_count() or 1, max(len(tasks), 1))
+    if workers <= 1:
+        for scenario, run, random_seed in tasks:
+            summaries[scenario][run] = run_summary(config=configs[scenario], random_seed=random_seed, metrics=metrics)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(run_summary, configs[scenario], random_seed, metrics): (scenario, run)
+                for scenario, run, random_seed in tasks
+            }
+            for future in as_completed(futures):
+                scenario, run = futures[future]
+                summaries[scenario][run] = future.result()
+
+    outcomes = {}
+    for scenario in configs:
+        for summary in summaries[scenario]:
+            for outcome, value in summary_outcomes(summary).items():
+                outcomes.setdefault(outcome, {"baseline": [], "candidate": []})[scenario].append(value)
+
+    statistics = {
+        outcome: paired_statistics(values["baseline"], values["candidate"], confidence=confidence)
+        for outcome, values in outcomes.items()
+    }
+    return {
+        "seeds": seeds,
+        "outcomes": {outcome: {scenario: np.array(values[scenario]) for scenario in configs}
+                     for outcome, values in outcomes.items()},
+        "statistics": statistics,
+    }
+
+
+def comparison_frame(result):
+    """ Returns the paired statistics of a compare_scenarios result as a DataFrame with a row per outcome """
+
+    frame = pd.DataFrame.from_dict(result["statistics"], orient="index")
+    frame.index.name = "Outcome"
+    return frame.reset_index()
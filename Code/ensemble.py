@@ -0,0 +1,173 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from park import Park
+
+
+def build_park(config, random_seed):
+    """ Builds a park ready to step from a configuration dictionary, following the same steps as sim_tests.main.
+
+    Required keys:
+        attraction_list, activity_list, park_map, entrance_park_area: as for Park
+        arrival_seed, total_daily_agents: as for Park.generate_arrival_schedule
+        behavior_archetype_distribution, exp_ability_pct, exp_wait_threshold, exp_limit: as for Park.generate_agents
+    Optional keys:
+        perfect_arrivals: defaults to True
+        plot_range, version: as for Park
+        park_options: further Park keyword arguments (decision_mode, agent_logging, ...), agent logging is off and
+            departed agents are archived unless set otherwise here
+    """
+
+    park_options = {"agent_logging": False, "archive_departed": True}
+    park_options.update(config.get("park_options", {}))
+    park = Park(
+        attraction_list=config["attraction_list"],
+        activity_list=config["activity_list"],
+        park_map=config["park_map"],
+        entrance_park_area=config["entrance_park_area"],
+        plot_range=config.get("plot_range", {}),
+        version=config.get("version", 1.0),
+        random_seed=random_seed,
+        **park_options
+    )
+    park.generate_arrival_schedule(
+        arrival_seed=config["arrival_seed"],
+        total_daily_agents=config["total_daily_agents"],
+        perfect_arrivals=config.get("perfect_arrivals", True),
+    )
+    park.generate_agents(
+        behavior_archetype_distribution=config["behavior_archetype_distribution"],
+        exp_ability_pct=config["exp_ability_pct"],
+        exp_wait_threshold=config["exp_wait_threshold"],
+        exp_limit=config["exp_limit"]
+    )
+    park.generate_attractions()
+    park.generate_activities()
+    return park
+
+
+def run_park(config, random_seed):
+    """ Builds a park from a configuration and steps it through the whole day """
+
+    park = build_park(config=config, random_seed=random_seed)
+    for _ in range(len(config["arrival_seed"]) * 60):
+        park.step()
+    return park
+
+
+def summarize_park(park, metrics=None):
+    """ Returns a compact summary of a finished park: the per minute history of the selected metrics (all by default)
+    as float32 (minutes x entities) arrays and the park totals """
+
+    history_store = park.history_store
+    metrics = list(history_store.values) if metrics is None else metrics
+    history = {}
+    for metric in metrics:
+        minutes = history_store.recorded_minutes(metric)
+        history[metric] = {
+            "minutes": minutes.astype(np.int32),
+            "values": history_store.values[metric][minutes].astype(np.float32),
+            "entities": list(history_store.names[metric]),
+        }
+    return {
+        "random_seed": park.random_seed,
+        "history": history,
+        "totals": {
+            "distributed_passes": park.history["distributed_passes"],
+            "redeemed_passes": park.history["redeemed_passes"],
+            "left_agents": park.left_agents,
+        },
+    }
+
+
+def run_summary(config, random_seed, metrics=None):
+    """ Runs one member of an ensemble and returns only its summary, so whole parks never leave the worker """
+
+    return summarize_park(park=run_park(config=config, random_seed=random_seed), metrics=metrics)
+
+
+def ensemble_seeds(seed, runs):
+    """ Returns one independent 64 bit park seed per run, derived deterministically from the ensemble seed """
+
+    return [int(child.generate_state(1, dtype=np.uint64)[0]) for child in np.random.SeedSequence(seed).spawn(runs)]
+
+
+def iter_ensemble(config, runs, seed=0, workers=None, metrics=None):
+    """ Runs an ensemble and yields (run index, summary) as each run finishes. Runs are spread over a
+    ProcessPoolExecutor with one process per CPU by default, workers=1 runs them in process. """
+
+    seeds = ensemble_seeds(seed=seed, runs=runs)
+    workers = min(workers or os.cpu_count() or 1, max(runs, 1))
+    if workers <= 1:
+        for run, random_seed in enumerate(seeds):
+            yield run, run_summary(config=config, random_seed=random_seed, metrics=metrics)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_summary, config, random_seed, metrics): run for run, random_seed in enumerate(seeds)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def aggregate_summaries(summaries, percentiles=(5, 50, 95)):
+    """ Combines run summaries into mean and percentile bands. Returns a dictionary with:
+        bands: metric -> {"minutes", "entities", "mean", "p<q>" for each percentile}, each a (minutes x entities) array
+        totals: total -> {"runs": per run values, "mean", "p<q>" for each percentile}
+    """
+
+    bands = {}
+    for metric, first in summaries[0]["history"].items():
+        values = np.stack([summary["history"][metric]["values"] for summary in summaries])
+        band = {"minutes": first["minutes"], "entities": first["entities"], "mean": values.mean(axis=0)}
+        for q, band_values in zip(percentiles, np.percentile(values, percentiles, axis=0)):
+            band[f"p{q}"] = band_values
+        bands[metric] = band
+
+    totals = {}
+    for total in summaries[0]["totals"]:
+        values = np.array([summary["totals"][total] for summary in summaries], dtype=float)
+        totals[total] = {"runs": values, "mean": values.mean()}
+        totals[total].update({f"p{q}": value for q, value in zip(percentiles, np.percentile(values, percentiles))})
+
+    return {"bands": bands, "totals": totals}
+
+
+def run_ensemble(config, runs, seed=0, workers=None, metrics=None, percentiles=(5, 50, 95)):
+    """ Runs the same park configuration with runs independent seeds in parallel and aggregates the results.
+
+    Required Inputs:
+        config: park configuration, see build_park
+        runs: number of seeds to run
+    Optional Inputs:
+        seed: ensemble seed, every run's park seed is derived from it deterministically (see ensemble_seeds)
+        workers: number of processes, defaults to the number of CPUs
+        metrics: history metrics to keep (for example ["queue_wait_time"]), all by default
+        percentiles: percentile bands to compute
+    Returns the aggregate_summaries result plus "seeds" and the per run "summaries" in run order.
+    """
+
+    summaries = [None] * runs
+    for run, summary in iter_ensemble(config=config, runs=runs, seed=seed, workers=workers, metrics=metrics):
+        summaries[run] = summary
+
+    result = aggregate_summaries(summaries=summaries, percentiles=percentiles)
+    result["seeds"] = [summary["random_seed"] for summary in summaries]
+    result["summaries"] = summaries
+    return result
+
+
+def band_frame(result, metric):
+    """ Returns the bands of one metric as a long-format DataFrame with a row per (Time, entity) """
+
+    band = result["bands"][metric]
+    stats = [key for key in band if key not in {"minutes", "entities"}]
+    minutes = np.repeat(band["minutes"], len(band["entities"]))
+    frame = pd.DataFrame({"Time": minutes, "Entity": np.tile(band["entities"], len(band["minutes"]))})
+    for stat in stats:
+        frame[stat] = band[stat].ravel()
+    return frame
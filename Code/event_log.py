@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+
+# event codes
+ARRIVED = 0
+BALKED = 1
+LEFT_PARK = 2
+ENTERED_QUEUE = 3
+ENTERED_EXP_QUEUE = 4
+VISITED_ACTIVITY = 5
+GOT_PASS = 6
+ASSIGNED_RETURN_TIME = 7
+EXITED_ATTRACTION = 8
+BOARDED = 9
+BOARDED_WITH_PASS = 10
+EXITED_ACTIVITY = 11
+
+EVENT_NAMES = {
+    ARRIVED: "arrived",
+    BALKED: "balked",
+    LEFT_PARK: "left park",
+    ENTERED_QUEUE: "entered queue",
+    ENTERED_EXP_QUEUE: "entered exp queue",
+    VISITED_ACTIVITY: "visited activity",
+    GOT_PASS: "got pass",
+    ASSIGNED_RETURN_TIME: "assigned return time",
+    EXITED_ATTRACTION: "exited attraction",
+    BOARDED: "boarded",
+    BOARDED_WITH_PASS: "boarded with pass",
+    EXITED_ACTIVITY: "exited activity",
+}
+
+# text rendering of each event, matches the original agent log strings
+EVENT_TEMPLATES = {
+    ARRIVED: "Agent arrived at park at time {minute}. ",
+    BALKED: "Agent balked at {location} at time {minute} due to +{extra} minute posted wait. ",
+    LEFT_PARK: "Agent left park at {minute}. ",
+    ENTERED_QUEUE: "Agent entered queue for {location} at time {minute}. ",
+    ENTERED_EXP_QUEUE: "Agent entered exp queue for {location} at time {minute}. ",
+    VISITED_ACTIVITY: "Agent visited the activity {location} at time {minute}. ",
+    GOT_PASS: "Agent picked up an expedited pass for {location} at time {minute}. ",
+    ASSIGNED_RETURN_TIME: "The expedited queue return time is in {extra} minutes. ",
+    EXITED_ATTRACTION: "Agent exited {location} at time {minute}. ",
+    BOARDED: "Agent boarded {location} at time {minute}. ",
+    BOARDED_WITH_PASS: "Agent boarded {location} and redeemed their expedited queue pass at time {minute}. ",
+    EXITED_ACTIVITY: "Agent exited the activity {location} at time {minute}. ",
+}
+
+EVENT_DTYPE = np.dtype(
+    [
+        ("agent_id", np.int32),
+        ("minute", np.int32),
+        ("event_code", np.int8),
+        ("location_id", np.int16),
+        ("extra", np.int32),
+    ]
+)
+
+
+class EventLog:
+    """ Shared, array backed log of agent events. Each event is a typed (agent_id, minute, event_code, location_id,
+    extra) record, location names are interned into small integer ids, and text is only rendered on request (see
+    Agent.log and Park.print_logs). A disabled log drops every record, for throughput runs. The records of released
+    agents (archived ones, see OutcomeArchive) are dropped the next time the buffer fills up, before it would grow. """
+
+    def __init__(self, enabled=True, capacity=1024):
+        """
+        Optional Inputs:
+            enabled: when False, events are not recorded at all
+            capacity: initial number of records to allocate, the buffer doubles whenever it fills up
+        """
+
+        self.enabled = enabled
+        self.buffer = np.zeros(max(capacity, 1), dtype=EVENT_DTYPE)
+        self.size = 0
+        self.released = set()  # agents whose records are dropped at the next compaction
+
+        # None is always location id -1, other names are assigned ids as they are seen
+        self.location_names = []
+        self.location_ids = {}
+
+    def location_id(self, name):
+        """ Returns the integer id of a location name, assigning a new id if it has not been seen before """
+
+        if name is None:
+            return -1
+        location_id = self.location_ids.get(name)
+        if location_id is None:
+            location_id = len(self.location_names)
+            self.location_names.append(name)
+            self.location_ids[name] = location_id
+        return location_id
+
+    def location_name(self, location_id):
+        """ Returns the location name of an integer id """
+
+        return None if location_id < 0 else self.location_names[location_id]
+
+    def record(self, agent_id, minute, event_code, location=None, extra=0):
+        """ Appends an event record """
+
+        if not self.enabled:
+            return
+        if self.size == len(self.buffer):
+            self.compact()
+            # grow only if compacting freed less than half of the buffer, so compactions stay amortized
+            if 2 * self.size >= len(self.buffer):
+                self.buffer = np.concatenate([self.buffer, np.zeros(len(self.buffer), dtype=EVENT_DTYPE)])
+        self.buffer[self.size] = (agent_id, minute, event_code, self.location_id(location), extra)
+        self.size += 1
+
+    def release(self, agent_id):
+        """ Marks an agent's records to be dropped, called once the agent is archived """
+
+        if self.enabled:
+            self.released.add(agent_id)
+
+    def compact(self):
+        """ Drops the records of released agents, keeping the order of the others """
+
+        if not self.released:
+            return
+        records = self.buffer[:self.size]
+        kept = records[~np.isin(records["agent_id"], np.fromiter(self.released, dtype=np.int64))]
+        self.buffer[:len(kept)] = kept
+        self.size = len(kept)
+        self.released.clear()
+
+    def __len__(self):
+        self.compact()
+        return self.size
+
+    def records(self, agent_id=None):
+        """ Returns the recorded events as a structured array, optionally only those of one agent """
+
+        self.compact()
+        records = self.buffer[:self.size]
+        if agent_id is not None:
+            records = records[records["agent_id"] == agent_id]
+        return records
+
+    def render(self, agent_id):
+        """ Returns an agent's events as text, in the format of the original agent log """
+
+        return "".join(
+            EVENT_TEMPLATES[int(event["event_code"])].format(
+                minute=int(event["minute"]),
+                location=self.location_name(int(event["location_id"])),
+                extra=int(event["extra"])
+            ) for event in self.records(agent_id=agent_id)
+        )
+
+    def to_frame(self):
+        """ Returns all events as a DataFrame with event and location names decoded """
+
+        records = self.records()
+        locations = np.array([None] + self.location_names, dtype=object)
+        return pd.DataFrame(
+            {
+                "agent_id": records["agent_id"],
+                "minute": records["minute"],
+                "event": [EVENT_NAMES[code] for code in records["event_code"].tolist()],
+                "location": locations[records["location_id"].astype(np.int64) + 1],
+                "extra": records["extra"],
+            }
+        )
@@ -0,0 +1,121 @@
+from collections.abc import MutableMapping
+
+import numpy as np
+import pandas as pd
+
+
+class TimeSeries(MutableMapping):
+    """ Dict-like {time: value} view of one entity's column of a HistoryStore metric, so code written against the
+    original history dictionaries keeps working. Values are returned as python scalars. """
+
+    def __init__(self, store, metric, column):
+        self.store = store
+        self.metric = metric
+        self.column = column
+
+    def _written(self):
+        return self.store.written[self.metric][:, self.column]
+
+    def __getitem__(self, time):
+        if not 0 <= time < self.store.horizon or not self.store.written[self.metric][time, self.column]:
+            raise KeyError(time)
+        return self.store.values[self.metric][time, self.column].item()
+
+    def __setitem__(self, time, value):
+        self.store.write(metric=self.metric, column=self.column, time=time, value=value)
+
+    def __delitem__(self, time):
+        if time not in self:
+            raise KeyError(time)
+        self.store.written[self.metric][time, self.column] = False
+
+    def __contains__(self, time):
+        return 0 <= time < self.store.horizon and bool(self.store.written[self.metric][time, self.column])
+
+    def __iter__(self):
+        return iter(np.flatnonzero(self._written()).tolist())
+
+    def __len__(self):
+        return int(self._written().sum())
+
+    def keys(self):
+        return np.flatnonzero(self._written()).tolist()
+
+    def values(self):
+        return self.store.values[self.metric][self._written(), self.column].tolist()
+
+    def items(self):
+        return list(zip(self.keys(), self.values()))
+
+    def to_array(self):
+        """ Returns (times, values) arrays of the recorded minutes """
+
+        written = self._written()
+        return np.flatnonzero(written), self.store.values[self.metric][written, self.column]
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class HistoryStore:
+    """ Preallocated per minute history. Each metric is a (minutes x entities) array, for example the queue length
+    of every attraction, that each step writes one row of, with a matching mask of the minutes that were recorded.
+    The minute axis is sized for the park's operating hours once they are known (see Park.generate_arrival_schedule)
+    and doubles if a run goes past it. Entities read and write their column through a TimeSeries view. """
+
+    def __init__(self, horizon=0):
+        """
+        Optional Inputs:
+            horizon: number of minutes to allocate up front
+        """
+
+        self.horizon = horizon
+        self.values = {}  # metric -> (minutes x entities) array
+        self.written = {}  # metric -> (minutes x entities) mask of recorded minutes
+        self.names = {}  # metric -> entity name of each column
+
+    def add_column(self, metric, name, dtype=np.int64):
+        """ Adds an entity column to a metric, creating the metric if needed. Returns its TimeSeries view. """
+
+        if metric not in self.values:
+            self.values[metric] = np.zeros((self.horizon, 0), dtype=dtype)
+            self.written[metric] = np.zeros((self.horizon, 0), dtype=bool)
+            self.names[metric] = []
+        elif self.values[metric].dtype != np.dtype(dtype):
+            raise ValueError(f"History metric {metric} is {self.values[metric].dtype}, not {np.dtype(dtype)}")
+
+        self.values[metric] = np.concatenate([self.values[metric], np.zeros((self.horizon, 1), dtype=dtype)], axis=1)
+        self.written[metric] = np.concatenate([self.written[metric], np.zeros((self.horizon, 1), dtype=bool)], axis=1)
+        self.names[metric].append(name)
+        return TimeSeries(store=self, metric=metric, column=len(self.names[metric]) - 1)
+
+    def reserve(self, horizon):
+        """ Grows the minute axis of every metric to at least horizon minutes """
+
+        if horizon <= self.horizon:
+            return
+        extra = horizon - self.horizon
+        for metric, values in self.values.items():
+            self.values[metric] = np.concatenate([values, np.zeros((extra, values.shape[1]), dtype=values.dtype)])
+            self.written[metric] = np.concatenate([self.written[metric], np.zeros((extra, values.shape[1]), dtype=bool)])
+        self.horizon = horizon
+
+    def write(self, metric, column, time, value):
+        """ Records an entity's value of a metric at a minute """
+
+        if time >= self.horizon:
+            self.reserve(max(time + 1, 2 * self.horizon))
+        self.values[metric][time, column] = value
+        self.written[metric][time, column] = True
+
+    def recorded_minutes(self, metric):
+        """ Returns the minutes at which any entity recorded the metric """
+
+        return np.flatnonzero(self.written[metric].any(axis=1))
+
+    def to_frame(self, metric):
+        """ Returns a (minutes x entities) DataFrame of a metric over the recorded minutes """
+
+        minutes = self.recorded_minutes(metric)
+        return pd.DataFrame(self.values[metric][minutes], index=pd.Index(minutes, name="time"),
+                            columns=self.names[metric])
@@ -0,0 +1,110 @@
+import numpy as np
+
+from population import AGE_CLASSES
+
+
+def outcome_dtype(attraction_count, activity_count):
+    """ Record layout of a departed agent. rides holds the rides completed by attraction id, visits and
+    activity_minutes the visits and minutes spent by activity id. """
+
+    return np.dtype(
+        [
+            ("agent_id", np.int32),
+            ("archetype", np.int16),
+            ("age_class", np.int8),
+            ("stay_time_preference", np.int32),
+            ("arrival_time", np.int32),
+            ("exit_time", np.int32),
+            ("passes_redeemed", np.int32),
+            ("rides", np.uint16, (attraction_count,)),
+            ("visits", np.uint16, (activity_count,)),
+            ("activity_minutes", np.int32, (activity_count,)),
+        ]
+    )
+
+
+class OutcomeArchive:
+    """ Columnar archive of the agents who left the park, enabled with Park(archive_departed=True). When an agent
+    departs its state is compacted into one fixed width outcome record (archetype, age class, arrival and exit time,
+    passes redeemed, rides completed per attraction, visits and minutes per activity). The park then drops the Agent
+    object, hands the agent's ParkModel row to later arrivals and releases its event log entries, so everything but
+    the record follows the peak number of agents in the park.
+
+    What stays sized by the day's attendance is the outcome record itself and the Population arrays, the day's plan
+    of traits drawn before anyone arrives (12 bytes per agent). """
+
+    def __init__(self, attraction_names=(), activity_names=(), capacity=1024):
+        """
+        Optional Inputs:
+            attraction_names: attraction names in attraction id order, the columns of each record's rides
+            activity_names: activity names in activity id order, the columns of each record's visits and minutes
+            capacity: initial number of records to allocate, the buffer doubles whenever it fills up
+        """
+
+        self.attraction_names = list(attraction_names)
+        self.activity_names = list(activity_names)
+        self.records = np.zeros(
+            max(capacity, 1), dtype=outcome_dtype(len(self.attraction_names), len(self.activity_names))
+        )
+        self.size = 0
+
+        # archetype names are interned into small integer codes as they are seen
+        self.archetypes = []
+        self.archetype_codes = {}
+
+    def archetype_code(self, archetype):
+        """ Returns the code of an archetype name, assigning the next code to new names """
+
+        code = self.archetype_codes.get(archetype)
+        if code is None:
+            code = len(self.archetypes)
+            self.archetypes.append(archetype)
+            self.archetype_codes[archetype] = code
+        return code
+
+    def set_entities(self, attraction_names, activity_names):
+        """ Sets the attractions and activities whose counts are recorded, in id order. Only possible before the first
+        record, since the records are fixed width. """
+
+        if self.size:
+            raise ValueError("Cannot change the archived attractions and activities after agents have been archived")
+        self.attraction_names = list(attraction_names)
+        self.activity_names = list(activity_names)
+        self.records = np.zeros(
+            len(self.records), dtype=outcome_dtype(len(self.attraction_names), len(self.activity_names))
+        )
+
+    def record(self, agent):
+        """ Appends the outcome record of a departed agent """
+
+        if self.size == len(self.records):
+            self.records = np.concatenate([self.records, np.zeros(len(self.records), dtype=self.records.dtype)])
+        state = agent.state
+        self.records[self.size] = (
+            agent.agent_id,
+            self.archetype_code(agent.behavior["archetype"]),
+            AGE_CLASSES.index(state["age_class"]),
+            agent.behavior["stay_time_preference"],
+            state["arrival_time"],
+            state["exit_time"],
+            state["passes_redeemed"],
+            agent.model.ride_counts[agent.model_row],
+            agent.model.visit_counts[agent.model_row],
+            agent.model.activity_minutes[agent.model_row],
+        )
+        self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    def agent_ids(self):
+        """ Returns the ids of the archived agents, in departure order """
+
+        return self.records["agent_id"][:self.size]
+
+    def outcomes(self):
+        """ Returns the archived records as a structured array, in departure order. The rides field is a
+        (records x attractions) matrix with columns in the order of attraction_names, visits and activity_minutes are
+        (records x activities) matrices in the order of activity_names. """
+
+        return self.records[:self.size]
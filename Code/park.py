@@ -1,23 +1,58 @@
 import random
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import seaborn as sns
+import matplotlib
 import matplotlib.pyplot as plt
 
 from tabulate import tabulate
 
-from agent import Agent
+from agent import Agent, SelectionStats, calculate_utility_matrix, sample_masked_softmax
+from agent_index import AgentIndex
 from attraction import Attraction
+from checkpoint import save_checkpoint, load_checkpoint
+from event_log import EventLog
+from history import HistoryStore
+from outcome_archive import OutcomeArchive
+from park_model import ParkModel
+from population import Population
+from profiler import StepProfiler
+from results import agent_outcomes, export_results
+from scenarios import fork_variants
+from rng import RandomStreams, ARRIVALS, PERFECT_ARRIVALS, ATTRACTION_CHOICE
+from wait_snapshot import WaitSnapshot
 from activity import Activity
 
 
+# figures rendered by Park.make_plots, in rendering order
+PLOT_FIGURES = (
+    "Attraction Queue Length",
+    "Attraction Wait Time",
+    "Attraction Expedited Queue Length",
+    "Attraction Expedited Wait Time",
+    "Attraction Expedited Queue Return Times",
+    "Activity Vistors",
+    "Approximate Agent Distribution (General)",
+    "Approximate Agent Distribution (Specific)",
+    "Agent Arrivals and Departures",
+    "Attraction Average Wait Times",
+    "Agent Attractions Histogram",
+    "Attraction Total Visits",
+    "Expedited Pass Distribution",
+    "Age Class Distribution",
+)
+
+
 class Park:
     """ Park simulation class """
 
     def __init__(self, attraction_list, activity_list, park_map, entrance_park_area, plot_range, version=1.0,
-                 random_seed=0, verbosity=0):
+                 random_seed=0, verbosity=0, decision_mode="agent",
+                 track_selection_stats=False, agent_logging=True, profile_steps=False, archive_departed=False,
+                 posting_policy=None):
         """ 
         Required Inputs:
             attraction_list: list of attractions dictionaries
@@ -27,8 +62,27 @@ class Park:
             random_seed: seeds random number generation for reproduction
             version: specify the version
             verbosity: display metrics
+            decision_mode: "agent" lets each idle agent select an attraction on its own, "batch" evaluates the
+                utility of every attraction for all idle agents in one NumPy pass and samples all choices at once
+                (same choice distributions; both modes use the same keyed random draws, so they make the same
+                decisions for a given seed up to floating point rounding)
+            track_selection_stats: record how many candidates each attraction selection masked out and the analytic
+                expected number of retries the old sample-and-reject loop would have needed (see SelectionStats)
+            agent_logging: record every agent's history in the shared event log, turn off for throughput runs
+            profile_steps: accumulate wall time per step phase and per attraction and activity, and count decisions,
+                balks and other events (see StepProfiler)
+            archive_departed: compact agents who leave the park into fixed width outcome records and release their
+                Agent objects, count matrix rows and event log records (see OutcomeArchive), so memory follows the
+                peak number of agents in the park. Off by default because departed agents then stop being
+                inspectable (Park.agents, Agent.log, print_logs); ensemble.build_park, which the ensemble, sweep,
+                comparison and benchmark runners use, turns it on.
+            posting_policy: callable that turns the estimated standby waits into the waits posted to the agents, for
+                example Overposting(factor=1.2), posted waits equal the estimates if not given (see WaitSnapshot)
         """
 
+        if decision_mode not in {"agent", "batch"}:
+            raise ValueError(f"Unknown decision_mode: {decision_mode}")
+
         # static
         self.attraction_list = attraction_list
         self.activity_list = activity_list
@@ -38,13 +92,31 @@ class Park:
         self.random_seed = random_seed
         self.version = version
         self.verbosity = verbosity
+        self.decision_mode = decision_mode
+
+        # integer ids, park area distance matrix and per agent ride and visit counts
+        self.model = ParkModel(park_map=self.park_map)
 
         # dynamic
         self.schedule = {}
-        self.agents = {}
+        self.agents = {}  # agents that have arrived and are not archived, by agent_id
+        self.in_park_agents = {}  # agents within the park, the only agents per step work touches
+        self.population = None  # traits of every agent of the day
+        self.behavior_archetype_distribution = None
+        self.agent_index = AgentIndex()
+        self.rng = RandomStreams(self.random_seed)
+        self.selection_stats = SelectionStats() if track_selection_stats else None
+        self.profiler = StepProfiler() if profile_steps else None
+        self.event_log = EventLog(enabled=agent_logging)
+        self.outcome_archive = OutcomeArchive() if archive_departed else None
+        self.posting_policy = posting_policy
+        self.wait_snapshot = None  # posted waits of the current step, published by publish_wait_snapshot
         self.attractions = {}
         self.activities = {}
-        self.history = {"total_active_agents": {}, "total_left_agents": {}, "distributed_passes": 0,
+        self.history_store = HistoryStore()  # per minute metrics of the park, attractions and activities
+        self.history = {"total_active_agents": self.history_store.add_column("total_active_agents", "park"),
+                        "total_left_agents": self.history_store.add_column("total_left_agents", "park"),
+                        "distributed_passes": 0,
                         "redeemed_passes": 0}
         self.time = 0
         self.arrival_index = 0
@@ -81,6 +153,7 @@ class Park:
             raise AssertionError(f"Arrival Schedule suggests closing hour has nonzero arrivals: {last_hour_arrivals}")
 
         self.park_close = (len(arrival_seed) - 1) * 60  # last hour entry is closing time, don't count it
+        self.history_store.reserve(len(arrival_seed) * 60)
 
         # generate arrivals per minute by drawing from poisson distribution
         for hour, key in zip(range(operating_hours), arrival_seed):
@@ -90,7 +163,7 @@ class Park:
             expected_minute_agents = total_hour_agents/60
 
             # enforces randomness across hours but retains reproducibility
-            rng = np.random.default_rng(self.random_seed+hour) 
+            rng = self.rng.generator(ARRIVALS, stream=hour)
             minute_arrivals = list(rng.poisson(lam=expected_minute_agents, size=60))
 
             for minute, arrivals in zip(range(60), minute_arrivals):
@@ -98,23 +171,26 @@ class Park:
                 self.schedule.update({exact_minute: arrivals})
         
         # enforce perfect arrivals
-        random.seed(self.random_seed)
+        rng = self.rng.generator(PERFECT_ARRIVALS)
         if perfect_arrivals:
             actual_total_daily_agents = sum(self.schedule.values())
             dif = actual_total_daily_agents - total_daily_agents
             if dif > 0:
                 for _ in range(dif):
-                    rng_key = random.choice(list(key for key, val in self.schedule.items() if val>0))
+                    keys = [key for key, val in self.schedule.items() if val>0]
+                    rng_key = keys[rng.integers(len(keys))]
                     self.schedule[rng_key] -= 1
             if dif < 0:
                 for _ in range(dif*-1):
-                    rng_key = random.choice(list(key for key, val in self.schedule.items() if val>0))
+                    keys = [key for key, val in self.schedule.items() if val>0]
+                    rng_key = keys[rng.integers(len(keys))]
                     self.schedule[rng_key] += 1
                     
             assert sum(self.schedule.values()) == total_daily_agents
 
     def generate_agents(self, behavior_archetype_distribution, exp_ability_pct, exp_wait_threshold, exp_limit):
-        """ Take a dictionary of agent behavior archetype distributions. Initializes agents. """
+        """ Take a dictionary of agent behavior archetype distributions. Draws the traits of every agent of the day in
+        bulk (see Population), the Agent objects themselves are created as the agents arrive. """
 
         if sum(behavior_archetype_distribution.values()) != 100:
             raise AssertionError(
@@ -122,21 +198,40 @@ class Park:
             )
 
         total_agents = sum(self.schedule.values())
-        for agent_id in range(total_agents):
-            random.seed(self.random_seed + agent_id)
-            exp_ability = random.uniform(0, 1) < exp_ability_pct
-
-            agent = Agent(random_seed=self.random_seed)
-            agent.initialize_agent(
-                agent_id=agent_id,
-                behavior_archetype_distribution=behavior_archetype_distribution,
-                exp_ability=exp_ability,
-                exp_wait_threshold=exp_wait_threshold,
-                exp_limit=exp_limit,
-                attraction_names=[attraction["name"] for attraction in self.attraction_list], 
-                activity_names=[activity["name"] for activity in self.activity_list], 
-            ) 
-            self.agents.update({agent_id: agent})
+        self.behavior_archetype_distribution = behavior_archetype_distribution
+        if self.outcome_archive is None:
+            # every agent keeps its count matrix row, allocate them all at once
+            self.model.allocate_agents(total_agents)
+        self.population = Population.generate(
+            rng=self.rng,
+            total_agents=total_agents,
+            behavior_archetype_distribution=behavior_archetype_distribution,
+            exp_ability_pct=exp_ability_pct,
+            exp_wait_threshold=exp_wait_threshold,
+            exp_limit=exp_limit
+        )
+
+    def materialize_agent(self, agent_id):
+        """ Creates an agent from its row of the population, agents only become objects when they arrive """
+
+        agent = Agent(
+            random_seed=self.random_seed,
+            index=self.agent_index,
+            selection_stats=self.selection_stats,
+            rng=self.rng,
+            event_log=self.event_log,
+            model=self.model
+        )
+        agent.initialize_agent(
+            agent_id=agent_id,
+            behavior_archetype_distribution=self.behavior_archetype_distribution,
+            attraction_names=self.model.attraction_names,
+            activity_names=self.model.activity_names,
+            **self.population.traits(agent_id)
+        )
+        self.agents[agent_id] = agent
+        self.in_park_agents[agent_id] = agent
+        return agent
 
     def generate_attractions(self):
         """ Initializes attractions """
@@ -145,9 +240,12 @@ class Park:
         for attraction in self.attraction_list:
             self.attractions.update(
                 {
-                    attraction["name"]: Attraction(attraction_characteristics=attraction)
+                    attraction["name"]: Attraction(attraction_characteristics=attraction, history_store=self.history_store)
                 }
             )
+        self.model.set_attractions(self.attractions)
+        if self.outcome_archive is not None:
+            self.outcome_archive.set_entities(self.model.attraction_names, self.model.activity_names)
     
     def generate_activities(self):
         """ Initializes activities """
@@ -156,69 +254,303 @@ class Park:
         for activity in self.activity_list:
             self.activities.update(
                 {
-                    activity["name"]: Activity(activity_characteristics=activity, random_seed=self.random_seed)
+                    activity["name"]: Activity(
+                        activity_characteristics=activity,
+                        random_seed=self.random_seed,
+                        rng=self.rng,
+                        history_store=self.history_store
+                    )
                 }
             )
+        self.model.set_activities(self.activities)
+        if self.outcome_archive is not None:
+            self.outcome_archive.set_entities(self.model.attraction_names, self.model.activity_names)
 
     def step(self):
         """ A minute of time passes, update all agents and attractions. """
 
-        if self.time < self.park_close:
-            # allow new arrivals to enter
-            total_arrivals = self.schedule[self.time]
-            for new_arrival_index in range(total_arrivals):
-                agent_index = self.arrival_index + new_arrival_index
-                self.agents[agent_index].arrive_at_park(time=self.time, park_area=self.entrance_park_area)
+        profiler = self.profiler
+        if profiler is not None:
+            start = profiler.start()
+            profiler.count("steps")
 
-            self.arrival_index += total_arrivals
+        self.agent_index.time = self.time
+        self.process_arrivals()
+        if profiler is not None:
+            start = profiler.lap("arrivals", start)
 
         # get idle agents and agents en route to a destination
         idle_agent_ids = self.get_idle_agent_ids()
 
         # update attraction posted wait times and expedited queue return times
         for attraction_name, attraction in self.attractions.items():
-            attraction.update_wait_times()
+            attraction.update_wait_times(time=self.time)
             if attraction.expedited_queue:
                 attraction.update_exp_return_window(time=self.time, close=self.park_close)
+        self.publish_wait_snapshot()
+        if profiler is not None:
+            start = profiler.lap("wait times", start)
+
+        self.process_idle_agents(idle_agent_ids=idle_agent_ids)
+        if profiler is not None:
+            start = profiler.lap("decisions", start)
+        self.process_reached_destinations()
+        if profiler is not None:
+            start = profiler.lap("destinations", start)
+
+        self.process_attractions()
+        if profiler is not None:
+            start = profiler.lap("attractions", start)
+        self.process_activities()
+        if profiler is not None:
+            start = profiler.lap("activities", start)
+
+        # update time counters and history
+        self.pass_agent_time()
+        if profiler is not None:
+            start = profiler.lap("agent timers", start)
+        for attraction in self.attractions.values():
+            attraction.store_history(time=self.time)
+        for activity in self.activities.values():
+            activity.store_history(time=self.time)
+
+        # update own history
+        self.calculate_total_active_agents()
+        self.history["total_left_agents"][self.time] = self.left_agents
+        if profiler is not None:
+            profiler.lap("history", start)
+
+        if self.verbosity == 1 and self.time % 60 == 0:
+            self.print_metrics()
+        if self.verbosity == 2:
+            self.print_metrics()
+
+        self.time += 1
+
+    def publish_wait_snapshot(self):
+        """ Publishes the posted waits, return times and pass status every decision of this step reads """
+
+        self.wait_snapshot = WaitSnapshot.from_attractions(
+            attractions=self.attractions,
+            time=self.time,
+            posting_policy=self.posting_policy
+        )
+        return self.wait_snapshot
+
+    def pass_agent_time(self):
+        """ Passes a minute of time for every agent within the park """
+
+        for agent in self.in_park_agents.values():
+            agent.pass_time()
+
+    def process_arrivals(self):
+        """ Allows new arrivals to enter """
+
+        if self.time < self.park_close:
+            total_arrivals = self.schedule[self.time]
+            for new_arrival_index in range(total_arrivals):
+                agent_index = self.arrival_index + new_arrival_index
+                self.materialize_agent(agent_index).arrive_at_park(time=self.time, park_area=self.entrance_park_area)
+
+            self.arrival_index += total_arrivals
+            if self.profiler is not None:
+                self.profiler.count("arrivals", int(total_arrivals))
+
+    def process_idle_agents(self, idle_agent_ids):
+        """ Idle agents decide what to do next and set off towards their destination """
+
+        if self.profiler is not None:
+            self.profiler.count("decisions", len(idle_agent_ids))
+        if self.decision_mode == "batch":
+            decisions = self.make_batch_decisions(agent_ids=idle_agent_ids)
 
-        # get idle activity action
         for agent_id in idle_agent_ids:
             # does the park object really need these action/location values? or is it just an orchestrator that should
             # let the agents sort out their own internal state...?
             agent = self.agents[agent_id]
-            action, location = agent.make_state_change_decision(
-                attractions_dict=self.attractions,
-                activities_dict=self.activities,
-                time=self.time,
-                park_map=self.park_map,
-                park_closed=self.park_close <= self.time
-            )
+            if self.decision_mode == "batch":
+                action, location = decisions[agent_id]
+            else:
+                action, location = agent.make_state_change_decision(
+                    attractions_dict=self.attractions,
+                    activities_dict=self.activities,
+                    time=self.time,
+                    park_map=self.park_map,
+                    park_closed=self.park_close <= self.time,
+                    wait_snapshot=self.wait_snapshot
+                )
             # determine travel time to new destination
-            current_park_area = agent.state["current_park_area"]
+            model = self.model
+            area_distances = model.distances[model.park_area_ids[agent.state["current_park_area"]]]
             anticipated_wait_time = 0
-            if location in self.attractions:
-                destination_park_area = self.attractions[location].park_area
-                anticipated_wait_time = self.attractions[location].get_wait_time()
-            elif location in self.activities:
-                destination_park_area = self.activities[location].park_area
+            if location in model.attraction_ids:
+                travel_time = area_distances[model.attraction_areas[model.attraction_ids[location]]]
+                anticipated_wait_time = self.wait_snapshot.wait_time(location)
+            elif location in model.activity_ids:
+                travel_time = area_distances[model.activity_areas[model.activity_ids[location]]]
             elif location == 'gate':
-                destination_park_area = self.entrance_park_area
+                travel_time = area_distances[model.park_area_ids[self.entrance_park_area]]
             else:
                 raise ValueError(f"Agent cannot travel to location {location}.  Unknown park area mapping.")
-            travel_time = self.park_map[current_park_area][destination_park_area]
             agent.set_destination(action, location, travel_time, anticipated_wait_time)
 
-        # all agents that are now ready to take a delayed action should now be processed.
-        # either: (a) agent is not at their next location and we (later) subtract 1 min from time_to_destination, or
-        # (b) they reached destination and we will now process them exactly as we would have before.
+    def make_batch_decisions(self, agent_ids):
+        """ Batched version of Agent.make_state_change_decision for a list of idle agents. Each agent still decides
+        on its own whether to leave, redeem a pass, or visit an attraction or activity; the attraction selection for
+        all agents that want one is then done in one NumPy pass by batch_select_attractions. Returns a dictionary of
+        agent_id: (action, location). """
+
+        decisions = {}
+        attraction_agents = []
+        valid_attraction_lists = []
+        park_closed = self.park_close <= self.time
+        for agent_id in agent_ids:
+            agent = self.agents[agent_id]
+            if park_closed:
+                action, location = "leaving", "gate"
+            else:
+                action, location = agent.decide_to_leave_park(time=self.time)
+            if not action:
+                action, location = agent.decide_to_redeem_pass()
+            if not action:
+                desired_decision_type, valid_attractions = agent.decide_attraction_or_activity(
+                    attractions_dict=self.attractions
+                )
+                if desired_decision_type == "activity":
+                    action, location = "traveling", agent.select_activity_decision(
+                        activities_dict=self.activities
+                    )
+                else:
+                    attraction_agents.append(agent)
+                    valid_attraction_lists.append(valid_attractions)
+                    continue
+            decisions[agent_id] = (action, location)
+
+        if attraction_agents:
+            selections = self.batch_select_attractions(
+                agents=attraction_agents,
+                valid_attraction_lists=valid_attraction_lists
+            )
+            for agent, (action, location) in zip(attraction_agents, selections):
+                # only default to activity if all wait times are too long for agent and no exp passes are available
+                if not action:
+                    action, location = "traveling", agent.select_activity_decision(
+                        activities_dict=self.activities
+                    )
+                decisions[agent.agent_id] = (action, location)
+
+        return decisions
+
+    def batch_attraction_utilities(self, agents):
+        """ Computes the (agents x attractions) utility matrix in one NumPy pass from the posted wait time vector, the
+        park area distance matrix, attraction popularity, each agent's past rides and held passes, and each
+        agent's wait_discount_beta. Columns follow the order of self.attractions. """
+
+        model = self.model
+        wait_times = self.wait_snapshot.wait_times
+        popularity = np.array([attraction.popularity for attraction in self.attractions.values()], dtype=float)
+        attraction_areas = np.array(model.attraction_areas, dtype=np.int64)
+        agent_areas = np.array([model.park_area_ids[agent.state["current_park_area"]] for agent in agents],
+                               dtype=np.int64)
+
+        n_past = model.ride_counts[[agent.model_row for agent in agents]].astype(float)
+        n_future = np.zeros_like(n_past)
+        for row, agent in enumerate(agents):
+            for attraction_name in agent.state["expedited_pass"]:
+                n_future[row, model.attraction_ids[attraction_name]] = 1
+
+        return calculate_utility_matrix(
+            w_0=10,
+            popularity=popularity,
+            w_1=1,
+            n_past=n_past,
+            n_future=n_future,
+            w_2=[agent.behavior["wait_discount_beta"] for agent in agents],
+            wait_time=wait_times,
+            w_3=3,
+            distance=model.distance_matrix[agent_areas[:, None], attraction_areas[None, :]]
+        )
+
+    def batch_select_attractions(self, agents, valid_attraction_lists):
+        """ Selects an attraction for many agents at once. The rules Agent.select_attraction_decision applies while
+        sampling (get a pass if the wait is too long, reject waits beyond the agent's threshold, reject rides that
+        would clash with a held return time) only depend on the agent and the attraction, so they are applied as an
+        up front mask followed by a single masked softmax draw per agent, which gives the same choice distribution.
+        Returns a list of (action, location), (None, None) when an agent has no acceptable attraction. """
+
+        attraction_names = self.model.attraction_names
+        attraction_ids = self.model.attraction_ids
+        attractions = list(self.attractions.values())
+        utilities = self.batch_attraction_utilities(agents=agents)
+
+        wait_times = self.wait_snapshot.wait_times
+        popularity = np.array([attraction.popularity for attraction in attractions], dtype=float)
+        run_times = np.array([attraction.run_time for attraction in attractions], dtype=float)
+        pass_open = self.wait_snapshot.passes_open
+
+        valid = np.zeros(utilities.shape, dtype=bool)
+        for row, valid_attractions in enumerate(valid_attraction_lists):
+            valid[row, [attraction_ids[name] for name in valid_attractions]] = True
+        valid &= utilities > 0
+
+        can_get_pass = np.array([
+            agent.state["expedited_pass_ability"] and len(agent.state["expedited_pass"]) < agent.state["exp_limit"]
+            for agent in agents
+        ])
+        exp_wait_threshold = np.array([agent.state["exp_wait_threshold"] for agent in agents], dtype=float)
+        wait_threshold = np.array([agent.behavior["wait_threshold"] for agent in agents], dtype=float)
+        earliest_return_time = np.array(
+            [min(agent.state["expedited_return_time"], default=np.inf) for agent in agents], dtype=float
+        )
+
+        get_pass = (wait_times[None, :] > exp_wait_threshold[:, None]) & can_get_pass[:, None] & pass_open[None, :]
+        too_long = wait_times[None, :] > (wait_threshold[:, None] + popularity[None, :] * 6)
+        return_clash = earliest_return_time[:, None] < (wait_times + run_times)[None, :]
+        accepted = valid & (get_pass | (~too_long & ~return_clash))
+
+        if self.selection_stats is not None:
+            for row in range(len(agents)):
+                self.selection_stats.record(utilities=utilities[row, valid[row]], accepted=accepted[row, valid[row]])
+
+        selected = sample_masked_softmax(
+            utilities=utilities,
+            mask=accepted,
+            uniforms=self.rng.uniform(
+                ATTRACTION_CHOICE,
+                agent_id=np.array([agent.agent_id for agent in agents]),
+                index=np.array([agent.state["decisions"] for agent in agents])
+            )
+        )
+
+        selections = []
+        for row, column in enumerate(selected):
+            if column < 0:
+                selections.append((None, None))
+            elif get_pass[row, column]:
+                selections.append(("get pass", attraction_names[column]))
+            else:
+                selections.append(("traveling", attraction_names[column]))
+
+        return selections
+
+    def process_reached_destinations(self):
+        """ All agents that are now ready to take a delayed action are processed.
+        Either: (a) agent is not at their next location and we (later) subtract 1 min from time_to_destination, or
+        (b) they reached destination and we will now process them exactly as we would have before. """
+
         reached_destination_agent_ids = self.get_reached_destination_agent_ids()
         for agent_id in reached_destination_agent_ids:
             self.update_park_state(
                 agent=self.agents[agent_id],
                 time=self.time
             )
-            
-        # process attractions
+
+    def process_attractions(self):
+        """ Dispatches attraction vehicles, unloading and loading agents """
+
+        profiler = self.profiler
+        if profiler is not None:
+            start = profiler.start()
         for attraction_name, attraction in self.attractions.items():
             exiting_agents, loaded_agents = attraction.step(time=self.time, park_close=self.park_close)
             for agent_id in exiting_agents:
@@ -235,43 +567,26 @@ class Park:
                 if redeem:
                     self.history["redeemed_passes"] += 1
                     attraction.redeem_pass()
+            if profiler is not None:
+                start = profiler.lap_entity("attraction", attraction_name, start)
+
+    def process_activities(self):
+        """ Lets agents who spent all their time at an activity exit it """
 
-        # process activities
+        profiler = self.profiler
+        if profiler is not None:
+            start = profiler.start()
         for activity_name, activity in self.activities.items():
             exiting_agents = activity.step(time=self.time)
             for agent_id in exiting_agents:
                 self.agents[agent_id].agent_exited_activity(name=activity_name, time=self.time)
-
-        # update time counters and history
-        for agent in self.agents.values():
-            agent.pass_time()
-        for attraction in self.attractions.values():
-            attraction.pass_time()
-            attraction.store_history(time=self.time)
-        for activity in self.activities.values():
-            activity.pass_time()
-            activity.store_history(time=self.time)
-
-        # update own history
-        self.calculate_total_active_agents()
-        self.history["total_left_agents"].update({self.time: self.left_agents})
-
-        if self.verbosity == 1 and self.time % 60 == 0:
-            self.print_metrics()
-        if self.verbosity == 2:
-            self.print_metrics()
-
-        self.time += 1
+            if profiler is not None:
+                start = profiler.lap_entity("activity", activity_name, start)
 
     def get_idle_agent_ids(self):
         """ Identifies agents within park who have just arrived, who have exited a ride or who have left an activity """
 
-        idle_agent_ids = [
-            agent_id for agent_id, agent_dict in self.agents.items()
-            if agent_dict.state["within_park"] and agent_dict.state["current_action"] == "idling"
-        ]
-
-        return idle_agent_ids
+        return self.agent_index.get_idle_agent_ids()
 
     def get_reached_destination_agent_ids(self):
         """ Identifies agents within park who have reached their destination where they will take an action that they
@@ -280,16 +595,11 @@ class Park:
             - traveling (either to attraction or activity)
             - redeeming exp pass
             - get pass
+        Agents are bucketed by the minute they will arrive when they set their destination, so only this minute's
+        bucket is inspected.
         """
 
-        reached_destination_agent_ids = [
-            agent_id for agent_id, agent_dict in self.agents.items()
-            if agent_dict.state["within_park"]
-            and agent_dict.state["current_action"] in ["leaving", "traveling", "redeeming exp pass", "get pass"]
-            and agent_dict.state["time_to_destination"] == 0
-        ]
-
-        return reached_destination_agent_ids
+        return self.agent_index.pop_reached_destination_agent_ids(time=self.time)
     
     def update_park_state(self, agent, time):
         """ Updates the agent state, attraction state and activity state based on the action """
@@ -307,27 +617,38 @@ class Park:
             #        self.attractions[attraction].return_pass(agent.agent_id)
             #        agent.return_exp_pass(attraction=attraction)
             agent.leave_park(time=time)
+            self.depart_agent(agent=agent)
             self.left_agents += 1
+            if self.profiler is not None:
+                self.profiler.count("departures")
 
         if action == "traveling":
             if location in self.attractions:
                 park_area = self.attractions[location].park_area
                 anticipated_wait_time = agent.state["anticipated_wait_time"]
-                current_posted_wait_time = self.attractions[location].get_wait_time()
+                current_posted_wait_time = self.wait_snapshot.wait_time(location)
                 if current_posted_wait_time >= anticipated_wait_time + 15:
                     agent.balk(time=time, expected_wait_time=anticipated_wait_time,
                                actual_wait_time=current_posted_wait_time)
+                    if self.profiler is not None:
+                        self.profiler.count("balks")
                 else:
                     agent.enter_queue(attraction=location, park_area=park_area, time=time)
                     self.attractions[location].add_to_queue(agent_id=agent.agent_id)
+                    if self.profiler is not None:
+                        self.profiler.count("queue entries")
 
             if location in self.activities:
                 park_area = self.activities[location].park_area
                 agent.begin_activity(activity=location, park_area=park_area, time=time)
                 self.activities[location].add_to_activity(
                     agent_id=agent.agent_id,
-                    expedited_return_time=agent.state["expedited_return_time"]
+                    expedited_return_time=agent.state["expedited_return_time"],
+                    time=time,
+                    visit=agent.state["activity_visits"]
                 )
+                if self.profiler is not None:
+                    self.profiler.count("activity visits")
 
         if action == "redeeming exp pass":
             if location not in self.attractions:
@@ -335,22 +656,37 @@ class Park:
             park_area = self.attractions[location].park_area
             agent.enter_exp_queue(attraction=location, park_area=park_area, time=time)
             self.attractions[location].add_to_exp_queue(agent_id=agent.agent_id)
+            if self.profiler is not None:
+                self.profiler.count("expedited queue entries")
 
         # TODO: Figure out what to do with this part... where should they go? set park entrance area?
         if action == "get pass":
             park_area = self.attractions[location].park_area
             agent.get_pass(attraction=location, park_area=park_area, time=time)
             self.attractions[location].remove_pass()
-            expedited_return_time = self.attractions[location].get_exp_return_time()
+            expedited_return_time = self.wait_snapshot.exp_return_time(location)
             agent.assign_expedited_return_time(expedited_return_time=expedited_return_time, current_time=time)
             self.history["distributed_passes"] += 1
+            if self.profiler is not None:
+                self.profiler.count("passes distributed")
+
+    def depart_agent(self, agent):
+        """ Moves an agent who left the park out of the in-park pool. With an outcome archive the agent is compacted into
+        its outcome record, and its Agent object, count matrix row and event log records are released. """
+
+        del self.in_park_agents[agent.agent_id]
+        if self.outcome_archive is not None:
+            self.outcome_archive.record(agent=agent)
+            self.model.release_row(agent.model_row)
+            self.event_log.release(agent.agent_id)
+            del self.agents[agent.agent_id]
 
     def calculate_total_active_agents(self):
         """ Counts how many agents are currently active within the park """
 
-        active_agents = len([agent_id for agent_id, agent in self.agents.items() if agent.state["within_park"]])
+        active_agents = self.agent_index.active_agents
         self.active_agents = active_agents
-        self.history["total_active_agents"].update({self.time: active_agents})
+        self.history["total_active_agents"][self.time] = active_agents
 
     def print_metrics(self):
         """ Prints park metrics """
@@ -363,12 +699,29 @@ class Park:
         print(f"Activity Visitor (Agents):")
         for activity_name, activity in self.activities.items():
             print(f"     {activity_name}: {activity.history['total_vistors'][self.time]}")
+        if self.selection_stats is not None and self.selection_stats.decisions:
+            stats = self.selection_stats.summary()
+            print(f"Attraction Selection: {stats['decisions']} decisions, {stats['mean_rejected']:.2f} candidates "
+                  f"masked and {stats['expected_old_path_retries']:.2f} expected (analytic) old path retries per "
+                  f"decision")
+        if self.profiler is not None:
+            print(self.profiler.report())
         print(f"{'-'*50}\n")
 
     @staticmethod
-    def make_lineplot(dict_list, x, y, hue, title, location, show=False, y_max=None):
-        """ Create a hued lineplot derived from a list of dictionaries """
-        
+    def save_figure(location, formats=("png",), transparent=True):
+        """ Saves the current figure once per file format, plus a transparent copy of each if requested """
+
+        for file_format in formats:
+            plt.savefig(f"{location}.{file_format}", transparent=False, facecolor="white", bbox_inches="tight")
+            if transparent:
+                plt.savefig(f"{location} Transparent.{file_format}", transparent=True, bbox_inches="tight")
+
+    @staticmethod
+    def make_lineplot(dict_list, x, y, hue, title, location, show=False, y_max=None, formats=("png",),
+                      transparent=True):
+        """ Create a hued lineplot derived from a list of dictionaries or a long-format DataFrame """
+
         df = pd.DataFrame(dict_list)
         l = [time for ind, time in enumerate(list(df['Time'].unique())) if ind % 60 == 0]
         plt.figure(figsize=(15,8))
@@ -382,42 +735,42 @@ class Park:
                 ax.set(ylim=(0, auto_y_max))
             else:
                 ax.set(ylim=(0, y_max))
-        plt.savefig(location, transparent=False, facecolor="white", bbox_inches="tight")
-        plt.savefig(f"{location} Transparent", transparent=True, bbox_inches="tight")
-        plt.show()
-        if not show:
+        Park.save_figure(location=location, formats=formats, transparent=transparent)
+        if show:
+            plt.show()
+        else:
             plt.close()
-    
+
     @staticmethod
-    def make_histogram(dict_list, x, title, location, show=False):
-        """ Create a histogram derived from a list of dictionaries """
-        
+    def make_histogram(dict_list, x, title, location, show=False, formats=("png",), transparent=True):
+        """ Create a histogram derived from a list of dictionaries or a long-format DataFrame """
+
         df = pd.DataFrame(dict_list)
         l = sorted(list(set(val for val in df[x])))
         plt.figure(figsize=(15, 8))
         ax = sns.histplot(data=df, x=x, stat="percent", bins=np.arange(-0.5, len(l)))  # weird trick to align labels
         ax.set(title=title, xticks=l, xticklabels=l)
-        plt.savefig(location, transparent=False, facecolor="white", bbox_inches="tight")
-        plt.savefig(f"{location} Transparent", transparent=True, bbox_inches="tight")
-        plt.show()
+        Park.save_figure(location=location, formats=formats, transparent=transparent)
         if show:
+            plt.show()
             disp_df = pd.DataFrame(df[x].describe()).reset_index()
             disp_df.columns = ["Metric", x]
             print(
                 tabulate(
-                    disp_df, 
-                    headers='keys', 
-                    tablefmt='psql', 
+                    disp_df,
+                    headers='keys',
+                    tablefmt='psql',
                     showindex=False,
                     floatfmt='.2f'
                 )
             )
-        if not show:
+        else:
             plt.close()
-    
+
     @staticmethod
-    def make_barplot(dict_list, x, y, hue, y_max, title, location, estimator=None, show=False):
-        """ Create a hued barplot derived from a list of dictionaries """
+    def make_barplot(dict_list, x, y, hue, y_max, title, location, estimator=None, show=False, formats=("png",),
+                     transparent=True):
+        """ Create a hued barplot derived from a list of dictionaries or a long-format DataFrame """
 
         df = pd.DataFrame(dict_list)
         plt.figure(figsize=(15, 8))
@@ -434,15 +787,17 @@ class Park:
                     ax.set(ylim=(0, auto_y_max))
             else:
                 ax.set(ylim=(0, y_max))
-        plt.savefig(location, transparent=False, facecolor="white", bbox_inches="tight")
-        plt.savefig(f"{location} Transparent", transparent=True, bbox_inches="tight")
-        plt.show()
+        Park.save_figure(location=location, formats=formats, transparent=transparent)
+        if show:
+            plt.show()
+        else:
+            plt.close()
         if show and not estimator:
             print(
                 tabulate(
-                    df.sort_values(hue), 
-                    headers='keys', 
-                    tablefmt='psql', 
+                    df.sort_values(hue),
+                    headers='keys',
+                    tablefmt='psql',
                     showindex=False,
                     floatfmt='.2f'
                 )
@@ -451,342 +806,224 @@ class Park:
             print(
                 tabulate(
                     df.groupby(x).sum().reset_index(),
-                    headers='keys', 
-                    tablefmt='psql', 
+                    headers='keys',
+                    tablefmt='psql',
                     showindex=False,
                 )
             )
-        if not show:
-            plt.close()
 
-    def make_plots(self, show=False):
-        """ Plots key park information, save to version folder """
+    def history_frame(self, metric, entity_label, value_label):
+        """ Returns a long-format (Time, entity, value) DataFrame of a history metric for every entity """
 
-        version_path = os.path.join(f"{self.version}")
-        if not os.path.exists(version_path):
-            os.mkdir(version_path)
+        return self.history_store.to_frame(metric).rename_axis(index="Time", columns=entity_label).melt(
+            ignore_index=False, value_name=value_label
+        ).reset_index()[["Time", value_label, entity_label]]
 
-        # Attractions
-        queue_length = []
-        queue_wait_time = []
-        exp_queue_length = []
-        exp_queue_wait_time = []
-        exp_queue_return_time = []
-        for attraction_name, attraction in self.attractions.items():
-            for time, val in attraction.history["queue_length"].items():
-                queue_length.append({"Time": time, "Agents": val, "Attraction": attraction_name})
-            for time, val in attraction.history["queue_wait_time"].items():
-                queue_wait_time.append({"Time": time, "Minutes": val, "Attraction": attraction_name})
-            for time, val in attraction.history["exp_queue_length"].items():
-                exp_queue_length.append({"Time": time, "Agents": val, "Attraction": attraction_name})
-            for time, val in attraction.history["exp_queue_wait_time"].items():
-                exp_queue_wait_time.append({"Time": time, "Minutes": val, "Attraction": attraction_name})
-            for time, val in attraction.history["exp_return_time"].items():
-                exp_queue_return_time.append({"Time": time, "Expedited Queue Return Time": val,
-                                              "Attraction": attraction_name})
-        
-        avg_queue_wait_time = []
-        for attraction_name, attraction in self.attractions.items():
-            queue_wait_list = [
-                val for time, val in attraction.history["queue_wait_time"].items()
-                if time <= self.park_close
-            ]
-            exp_queue_wait_list = [
-                val for time, val in attraction.history["exp_queue_wait_time"].items()
-                if time <= self.park_close
-            ]
-            avg_queue_wait_time.append(
-                {
-                    "Attraction": attraction_name,
-                    "Average Wait Time": sum(queue_wait_list)/len(queue_wait_list),
-                    "Queue Type": "Standby"
-                }
-            )
-            avg_queue_wait_time.append(
-                {
-                    "Attraction": attraction_name,
-                    "Average Wait Time": sum(exp_queue_wait_list)/len(exp_queue_wait_list),
-                    "Queue Type": "Expedited"
-                }
-            )
+    def plot_specs(self):
+        """ Builds the long-format DataFrame and plotting arguments of every figure, keyed by figure title. The frames
+        are built from the history arrays in whole-column operations rather than per minute dictionaries. """
 
-        # Activities
-        total_vistors = []
-        for activity_name, activity in self.activities.items():
-            for time, val in activity.history["total_vistors"].items():
-                total_vistors.append({"Time": time, "Agents": val, "Activity": activity_name})
+        specs = {}
 
-        # Agent Distribution
-        broad_agent_distribution = []
-        specific_agent_distribution = []
-        park_population = []
-        for time, total_agents in self.history["total_active_agents"].items():
-            broad_agent_distribution.append(
-                {
-                    "Time": time,
-                    "Approximate Percent": sum(
-                        [attraction.history["queue_length"][time] for attraction in self.attractions.values()]
-                    )/total_agents if total_agents > 0 else 0,
-                    "Type": "Attractions"
-                }
-            )
-            broad_agent_distribution.append(
-                {
-                    "Time": time,
-                    "Approximate Percent": sum(
-                        [activity.history["total_vistors"][time] for activity in self.activities.values()]
-                    )/total_agents if total_agents > 0 else 0,
-                    "Type": "Activities"
-                }
-            )
-            park_population.append(
-                {
-                    "Time": time,
-                    "Agents": total_agents,
-                    "Type": "In Park"
-                }
-            )
-            park_population.append(
-                {
-                    "Time": time,
-                    "Agents": self.history["total_left_agents"][time],
-                    "Type": "Left Park"
-                }
-            )
-            park_population.append(
-                {
-                    "Time": time,
-                    "Agents": total_agents + self.history["total_left_agents"][time],
-                    "Type": "Total"
-                }
-            )
-            # Specific agent distribution
-            for attraction_name, attraction in self.attractions.items():
-                specific_agent_distribution.append(
-                    {
-                        "Time": time,
-                        "Approximate Percent": attraction.history["queue_length"][time]/total_agents if total_agents > 0 else 0,
-                        "Type": attraction_name
-                    }
-                )
-            for activity_name, activity in self.activities.items():
-                specific_agent_distribution.append(
-                    {
-                        "Time": time,
-                        "Approximate Percent": activity.history["total_vistors"][time]/total_agents if total_agents > 0 else 0,
-                        "Type": activity_name
-                    }
-                )
+        def add_spec(kind, title, df, **kwargs):
+            if kind != "histogram":
+                kwargs["y_max"] = self.plot_range.get(title)
+            specs[title] = dict(kind=kind, dict_list=df, title=title, location=f"{self.version}/{title}", **kwargs)
 
-        attraction_counter = []
-        attraction_density = []
-        for agent_id, agent in self.agents.items():
-            attraction_counter.append(
-                {
-                    "Agent": agent_id,
-                    "Behavior": agent.behavior["archetype"],
-                    "Total Attractions Visited": sum(
-                        attraction['times_completed'] for attraction in agent.state["attractions"].values()
-                    )
-                }
-            )
-            for attraction, attraction_dict in agent.state["attractions"].items():
-                attraction_density.append(
-                    {
-                        "Attraction": attraction,
-                        "Visits": attraction_dict["times_completed"]
-                    }
-                )
-
-        self.make_lineplot(
-            dict_list=queue_length, 
-            x="Time", 
-            y="Agents", 
-            hue="Attraction",
-            y_max=self.plot_range["Attraction Queue Length"], 
-            title="Attraction Queue Length",
-            location=f"{self.version}/Attraction Queue Length",
-            show=show,
-        )
-
-        self.make_lineplot(
-            dict_list=queue_wait_time, 
-            x="Time", 
-            y="Minutes", 
-            hue="Attraction",
-            y_max=self.plot_range["Attraction Wait Time"],  
-            title="Attraction Wait Time",
-            location=f"{self.version}/Attraction Wait Time",
-            show=show,
-        )
-
-        self.make_lineplot(
-            dict_list=exp_queue_length, 
-            x="Time", 
-            y="Agents", 
-            hue="Attraction",
-            y_max=self.plot_range["Attraction Expedited Queue Length"],  
-            title="Attraction Expedited Queue Length",
-            location=f"{self.version}/Attraction Expedited Queue Length",
-            show=show,
-        )
-
-        self.make_lineplot(
-            dict_list=exp_queue_wait_time, 
-            x="Time", 
-            y="Minutes", 
-            hue="Attraction",
-            y_max=self.plot_range["Attraction Expedited Wait Time"],  
-            title="Attraction Expedited Wait Time",
-            location=f"{self.version}/Attraction Expedited Wait Time",
-            show=show,
+        # Attractions
+        attraction_names = list(self.attractions.keys())
+        add_spec("line", "Attraction Queue Length", self.history_frame("queue_length", "Attraction", "Agents"),
+                 x="Time", y="Agents", hue="Attraction")
+        add_spec("line", "Attraction Wait Time", self.history_frame("queue_wait_time", "Attraction", "Minutes"),
+                 x="Time", y="Minutes", hue="Attraction")
+        add_spec("line", "Attraction Expedited Queue Length",
+                 self.history_frame("exp_queue_length", "Attraction", "Agents"),
+                 x="Time", y="Agents", hue="Attraction")
+        add_spec("line", "Attraction Expedited Wait Time",
+                 self.history_frame("exp_queue_wait_time", "Attraction", "Minutes"),
+                 x="Time", y="Minutes", hue="Attraction")
+        add_spec("line", "Attraction Expedited Queue Return Times",
+                 self.history_frame("exp_return_time", "Attraction", "Expedited Queue Return Time"),
+                 x="Time", y="Expedited Queue Return Time", hue="Attraction")
+
+        queue_wait_time = self.history_store.to_frame("queue_wait_time")
+        exp_queue_wait_time = self.history_store.to_frame("exp_queue_wait_time")
+        open_minutes = queue_wait_time.index <= self.park_close
+        avg_queue_wait_time = pd.DataFrame(
+            {
+                "Attraction": np.repeat(attraction_names, 2),
+                "Average Wait Time": np.column_stack(
+                    [
+                        queue_wait_time[open_minutes].mean().to_numpy(),
+                        exp_queue_wait_time[open_minutes].mean().to_numpy()
+                    ]
+                ).ravel(),
+                "Queue Type": ["Standby", "Expedited"] * len(attraction_names)
+            }
         )
 
-        self.make_lineplot(
-            dict_list=exp_queue_return_time,
-            x="Time",
-            y="Expedited Queue Return Time",
-            hue="Attraction",
-            y_max=self.plot_range["Attraction Expedited Queue Return Times"],
-            title="Attraction Expedited Queue Return Times",
-            location=f"{self.version}/Attraction Expedited Queue Return Times",
-            show=show,
-        )
+        # Activities
+        add_spec("line", "Activity Vistors", self.history_frame("total_vistors", "Activity", "Agents"),
+                 x="Time", y="Agents", hue="Activity")
 
-        self.make_lineplot(
-            dict_list=total_vistors, 
-            x="Time", 
-            y="Agents", 
-            hue="Activity",
-            y_max=self.plot_range["Activity Vistors"],  
-            title="Activity Vistors",
-            location=f"{self.version}/Activity Vistors",
-            show=show,
+        # Agent Distribution
+        total_agents = self.history_store.to_frame("total_active_agents")["park"]
+        left_agents = self.history_store.to_frame("total_left_agents")["park"]
+        queue_length = self.history_store.to_frame("queue_length").loc[total_agents.index]
+        total_vistors = self.history_store.to_frame("total_vistors").loc[total_agents.index]
+        # share of agents in park, 0 while the park is empty
+        divisor = total_agents.where(total_agents > 0)
+
+        broad_agent_distribution = pd.DataFrame(
+            {
+                "Attractions": queue_length.sum(axis=1).div(divisor).fillna(0),
+                "Activities": total_vistors.sum(axis=1).div(divisor).fillna(0),
+            }
         )
-
-        self.make_lineplot(
-            dict_list=broad_agent_distribution, 
-            x="Time", 
-            y="Approximate Percent", 
-            hue="Type",
-            y_max=self.plot_range["Approximate Agent Distribution (General)"],  
-            title="Approximate Agent Distribution (General)",
-            location=f"{self.version}/Approximate Agent Distribution (General)",
-            show=show,
+        specific_agent_distribution = pd.concat([queue_length, total_vistors], axis=1).div(divisor, axis=0).fillna(0)
+        park_population = pd.DataFrame(
+            {"In Park": total_agents, "Left Park": left_agents, "Total": total_agents + left_agents}
         )
-
-        self.make_lineplot(
-            dict_list=specific_agent_distribution, 
-            x="Time", 
-            y="Approximate Percent", 
-            hue="Type",
-            y_max=self.plot_range["Approximate Agent Distribution (Specific)"],  
-            title="Approximate Agent Distribution (Specific)",
-            location=f"{self.version}/Approximate Agent Distribution (Specific)",
-            show=show,
+        for title, df, y in (
+            ("Approximate Agent Distribution (General)", broad_agent_distribution, "Approximate Percent"),
+            ("Approximate Agent Distribution (Specific)", specific_agent_distribution, "Approximate Percent"),
+            ("Agent Arrivals and Departures", park_population, "Agents"),
+        ):
+            long_df = df.rename_axis(index="Time", columns="Type").melt(ignore_index=False, value_name=y).reset_index()
+            add_spec("line", title, long_df[["Time", y, "Type"]], x="Time", y=y, hue="Type")
+
+        add_spec("bar", "Attraction Average Wait Times", avg_queue_wait_time,
+                 x="Attraction", y="Average Wait Time", hue="Queue Type")
+
+        # Agent outcomes, of the agents that have arrived
+        outcomes, categories, times_completed = agent_outcomes(self)
+        arrived = outcomes["arrival_time"] >= 0
+        times_completed = times_completed[arrived].astype(np.int64)
+        add_spec("histogram", "Agent Attractions Histogram",
+                 pd.DataFrame(
+                     {
+                         "Agent": outcomes["agent_id"][arrived].tolist(),
+                         "Behavior": np.array(categories["archetype"], dtype=object)[outcomes["archetype"][arrived]],
+                         "Total Attractions Visited": times_completed.sum(axis=1)
+                     }
+                 ),
+                 x="Total Attractions Visited")
+        # one row per attraction, the summing estimator draws the same bars as one row per agent and attraction
+        add_spec("bar", "Attraction Total Visits",
+                 pd.DataFrame({"Attraction": attraction_names, "Visits": times_completed.sum(axis=0)}),
+                 x="Attraction", y="Visits", hue=None, estimator=sum)
+
+        add_spec("bar", "Expedited Pass Distribution",
+                 pd.DataFrame(
+                     {
+                         "Expedited Passes": [" ", " "],
+                         "Total Passes": [self.history["distributed_passes"], self.history["redeemed_passes"]],
+                         "Type": ["Distributed", "Redeemed"]
+                     }
+                 ),
+                 x="Expedited Passes", y="Total Passes", hue="Type")
+        age_classes = pd.Series(
+            np.array(categories["age_class"], dtype=object)[outcomes["age_class"][arrived]], dtype=object
         )
+        add_spec("bar", "Age Class Distribution",
+                 pd.DataFrame(
+                     {
+                         "Age Class": [" ", " ", " "],
+                         "Agents": [
+                             int((age_classes == age_class).sum())
+                             for age_class in ("no_child_rides", "no_adult_rides", "no_preference")
+                         ],
+                         "Type": ["No Child Rides", "No Adult Rides", "No Preference"]
+                     }
+                 ),
+                 x="Age Class", y="Agents", hue="Type")
+
+        return specs
+
+    def make_plots(self, show=False, figures=None, formats=("png",), transparent=True, workers=None):
+        """ Plots key park information, save to version folder
 
-        self.make_lineplot(
-            dict_list=park_population,
-            x="Time",
-            y="Agents",
-            hue="Type",
-            y_max=self.plot_range["Agent Arrivals and Departures"],
-            title="Agent Arrivals and Departures",
-            location=f"{self.version}/Agent Arrivals and Departures",
-            show=show
-        )
+        Optional Inputs:
+            show: display each figure and print its summary table, figures are then rendered one at a time
+            figures: titles of the figures to render (see PLOT_FIGURES), all figures if not given
+            formats: file formats to save each figure in, for example ("png", "svg")
+            transparent: also save a transparent copy of each figure
+            workers: number of processes that render figures concurrently when not showing them, defaults to the
+                number of CPUs
+        """
 
-        self.make_barplot(
-            dict_list=avg_queue_wait_time,
-            x="Attraction",
-            y="Average Wait Time",
-            hue="Queue Type",
-            y_max=self.plot_range["Attraction Average Wait Times"],
-            title="Attraction Average Wait Times",
-            location=f"{self.version}/Attraction Average Wait Times",
-            show=show
-        )
+        if figures is None:
+            figures = PLOT_FIGURES
+        unknown_figures = set(figures) - set(PLOT_FIGURES)
+        if unknown_figures:
+            raise ValueError(f"Unknown figures: {sorted(unknown_figures)}")
 
-        self.make_histogram(
-            dict_list=attraction_counter, 
-            x="Total Attractions Visited",
-            title="Agent Attractions Histogram",
-            location=f"{self.version}/Agent Attractions Histogram",
-            show=show
-        )
+        version_path = os.path.join(f"{self.version}")
+        if not os.path.exists(version_path):
+            os.mkdir(version_path)
 
-        self.make_barplot(
-            dict_list=attraction_density,
-            x="Attraction",
-            y="Visits",
-            hue=None,
-            y_max=self.plot_range["Attraction Total Visits"],
-            estimator=sum,
-            title="Attraction Total Visits",
-            location=f"{self.version}/Attraction Total Visits",
-            show=show
-        )
+        specs = self.plot_specs()
+        jobs = [dict(specs[title], show=show, formats=tuple(formats), transparent=transparent) for title in figures]
 
-        self.make_barplot(
-            dict_list=[
-                {   
-                    "Expedited Passes": " ",
-                    "Total Passes": self.history["distributed_passes"],
-                    "Type": "Distributed"
-                },
-                {
-                    "Expedited Passes": " ",
-                    "Total Passes": self.history["redeemed_passes"],
-                    "Type": "Redeemed"
-                }
-            ], 
-            x="Expedited Passes", 
-            y="Total Passes",
-            hue="Type", 
-            y_max=self.plot_range["Expedited Pass Distribution"],
-            title="Expedited Pass Distribution", 
-            location=f"{self.version}/Expedited Pass Distribution", 
-            show=show
-        )
-        self.make_barplot(
-            dict_list= [
-                {   
-                    "Age Class": " ",
-                    "Agents": len([agent_id for agent_id, agent in self.agents.items() if agent.state["age_class"] == "no_child_rides"]),
-                    "Type": "No Child Rides"
-                },
-                {
-                    "Age Class": " ",
-                    "Agents": len([agent_id for agent_id, agent in self.agents.items() if agent.state["age_class"] == "no_adult_rides"]),
-                    "Type": "No Adult Rides"
-                },
-                {
-                    "Age Class": " ",
-                    "Agents": len([agent_id for agent_id, agent in self.agents.items() if agent.state["age_class"] == "no_preference"]),
-                    "Type": "No Preference"
-                },
-            ], 
-            x="Age Class", 
-            y="Agents",
-            hue="Type", 
-            y_max=self.plot_range["Age Class Distribution"],
-            title="Age Class Distribution", 
-            location=f"{self.version}/Age Class Distribution", 
-            show=show
-        )
+        workers = workers or os.cpu_count() or 1
+        if show:
+            for job in jobs:
+                render_figure(job)
+        elif workers <= 1 or len(jobs) <= 1:
+            # render with the same non-interactive backend as the rendering processes, then restore the caller's
+            backend = matplotlib.get_backend()
+            use_headless_backend()
+            try:
+                for job in jobs:
+                    render_figure(job)
+            finally:
+                matplotlib.use(backend)
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=use_headless_backend) as pool:
+                list(pool.map(render_figure, jobs))
 
     def print_logs(self, N=None, selected_agent_ids=None):
-        """ Prints the logs of random agents or a list of agents """
+        """ Prints the logs of random agents or a list of agents. With an outcome archive only the agents that have not
+        been archived still have their logs, random agents are drawn from them. """
 
         if N:
             all_agent_ids = list(self.agents.keys())
             random.seed(self.random_seed)
             selected_agent_ids = random.sample(all_agent_ids, N)
         for agent_id in selected_agent_ids:
+            if agent_id in self.agents:
+                archetype = self.agents[agent_id].behavior["archetype"]
+            else:
+                archetype = self.population.traits(agent_id)["behavior_archetype"]
             print(f"Agent ID: {agent_id}")
-            print(f"Agent Archetype: {self.agents[agent_id].behavior['archetype']}")
-            print(f"{self.agents[agent_id].log}\n")
+            print(f"Agent Archetype: {archetype}")
+            print(f"{self.event_log.render(agent_id=agent_id)}\n")
+
+    def checkpoint(self, path):
+        """ Saves the complete park state between two steps to a versioned binary file (see checkpoint.py). A park
+        restored from it continues bit-identically. """
+
+        save_checkpoint(park=self, path=path)
+
+    @classmethod
+    def restore(cls, path):
+        """ Returns a park rebuilt from a file written by Park.checkpoint, ready to continue stepping """
+
+        return load_checkpoint(path=path, park_class=cls)
+
+    def fork(self, variants, until=None, workers=None):
+        """ Branches scenario variants from the park's current state and runs each to minute until (the end of the
+        day by default), so the shared prefix is simulated once. variants maps a name to a function that changes the
+        branched park (or None). The park itself is left untouched. Returns each variant's history store and totals,
+        see scenarios.fork_variants. """
+
+        return fork_variants(park=self, variants=variants, until=until, workers=workers)
+
+    def export_results(self, output_path, file_format="npy"):
+        """ Writes the per minute histories, per agent outcomes and event log in a columnar format that
+        results.load_results memory-maps back. file_format is "npy", "parquet" or "arrow" (the last two need pyarrow). """
+
+        export_results(park=self, output_path=output_path, file_format=file_format)
 
     @staticmethod
     def write_data_to_file(data, output_file_path, output_file_format):
@@ -809,4 +1046,18 @@ class Park:
             "json": lambda file_writer: json.dump(data, file_writer, indent=2),
         }
         writers[output_file_format](file_writer)
-        file_writer.close()
\ No newline at end of file
+        file_writer.close()
+
+
+def use_headless_backend():
+    """ Switches matplotlib to the non-interactive Agg backend, used whenever make_plots renders without showing """
+
+    matplotlib.use("Agg")
+
+
+def render_figure(job):
+    """ Renders one figure built by Park.plot_specs. Module level so it can run in a rendering process. """
+
+    job = dict(job)
+    plot_functions = {"line": Park.make_lineplot, "bar": Park.make_barplot, "histogram": Park.make_histogram}
+    plot_functions[job.pop("kind")](**job)
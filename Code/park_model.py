@@ -0,0 +1,165 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+
+class ParkModel:
+    """ Compiled form of the park's layout and of every agent's ride and visit history. Park areas, attractions and
+    activities are assigned dense integer ids (park areas in park_map order, attractions and activities in the order
+    the park generates them), distances become a matrix indexed by park area id, and per agent counts live in shared
+    (rows x attractions) and (rows x activities) matrices. Each agent holds a row from when it arrives until it is
+    archived, rows of archived agents are zeroed and handed to later arrivals, so with an outcome archive the matrices
+    follow the peak number of agents in the park. Names are only used to look ids up at the edges, the hot paths index
+    by id. """
+
+    def __init__(self, park_map):
+        """
+        Required Inputs:
+            park_map: dictionary of source -> destination park area distances (minutes)
+        """
+
+        self.park_area_names = list(park_map.keys())
+        self.park_area_ids = {park_area: ind for ind, park_area in enumerate(self.park_area_names)}
+        self.distance_matrix = np.array(
+            [[park_map[source][destination] for destination in self.park_area_names] for source in self.park_area_names]
+        ).reshape(len(self.park_area_names), len(self.park_area_names))
+        # nested lists of the same distances for scalar lookups, indexing a list is cheaper than indexing an array
+        self.distances = self.distance_matrix.tolist()
+
+        self.attraction_names = []
+        self.attraction_ids = {}
+        self.attraction_areas = []  # park area id of each attraction
+        self.activity_names = []
+        self.activity_ids = {}
+        self.activity_areas = []  # park area id of each activity
+
+        self.total_agents = 0  # allocated rows
+        self.next_row = 0  # rows below next_row have been handed out
+        self.free_rows = []  # released rows, handed out again before new ones
+        self.ride_counts = np.zeros((0, 0), dtype=np.uint16)  # rides completed, rows x attractions
+        self.visit_counts = np.zeros((0, 0), dtype=np.uint16)  # visits, rows x activities
+        self.activity_minutes = np.zeros((0, 0), dtype=np.int32)  # minutes spent, rows x activities
+
+    @classmethod
+    def for_names(cls, attraction_names, activity_names, total_agents=1):
+        """ Builds a model without a park layout, for agents that are used outside of a park """
+
+        model = cls(park_map={})
+        model.attraction_names = list(attraction_names)
+        model.attraction_ids = {name: ind for ind, name in enumerate(model.attraction_names)}
+        model.activity_names = list(activity_names)
+        model.activity_ids = {name: ind for ind, name in enumerate(model.activity_names)}
+        model.allocate_agents(total_agents)
+        return model
+
+    def set_attractions(self, attractions):
+        """ Assigns attraction ids in the order of the attractions dictionary (name -> Attraction) """
+
+        self.attraction_names = list(attractions.keys())
+        self.attraction_ids = {name: ind for ind, name in enumerate(self.attraction_names)}
+        self.attraction_areas = [self.park_area_ids[attraction.park_area] for attraction in attractions.values()]
+        self.allocate_agents(self.total_agents)
+
+    def set_activities(self, activities):
+        """ Assigns activity ids in the order of the activities dictionary (name -> Activity) """
+
+        self.activity_names = list(activities.keys())
+        self.activity_ids = {name: ind for ind, name in enumerate(self.activity_names)}
+        self.activity_areas = [self.park_area_ids[activity.park_area] for activity in activities.values()]
+        self.allocate_agents(self.total_agents)
+
+    def allocate_agents(self, total_agents):
+        """ Sizes the count matrices to total_agents rows. Counts already recorded are kept, so this can be called again
+        when attractions, activities or agents are added. """
+
+        def resize(matrix, columns):
+            resized = np.zeros((total_agents, columns), dtype=matrix.dtype)
+            if matrix.shape[1] == columns:
+                rows = min(len(matrix), total_agents)
+                resized[:rows] = matrix[:rows]
+            return resized
+
+        self.total_agents = total_agents
+        self.ride_counts = resize(self.ride_counts, len(self.attraction_names))
+        self.visit_counts = resize(self.visit_counts, len(self.activity_names))
+        self.activity_minutes = resize(self.activity_minutes, len(self.activity_names))
+
+    def acquire_row(self):
+        """ Hands out a row of zero counts to an arriving agent, a released row if there is one, otherwise a new row
+        (doubling the matrices when they are full) """
+
+        if self.free_rows:
+            return self.free_rows.pop()
+        row = self.next_row
+        self.next_row += 1
+        if row >= self.total_agents:
+            self.allocate_agents(max(row + 1, 2 * self.total_agents))
+        return row
+
+    def release_row(self, row):
+        """ Zeroes the row of an archived agent and makes it available to later arrivals """
+
+        self.ride_counts[row] = 0
+        self.visit_counts[row] = 0
+        self.activity_minutes[row] = 0
+        self.free_rows.append(row)
+
+    def travel_time(self, source_park_area, destination_park_area):
+        """ Distance (minutes) between two park areas, by name """
+
+        return self.distances[self.park_area_ids[source_park_area]][self.park_area_ids[destination_park_area]]
+
+    def rides_completed(self, row):
+        """ Returns attraction name -> rides completed by the agent holding a row """
+
+        return dict(zip(self.attraction_names, self.ride_counts[row].tolist()))
+
+    def activity_history(self, row):
+        """ Returns activity name -> {"times_visited", "time_spent"} of the agent holding a row """
+
+        return {
+            name: {"times_visited": visited, "time_spent": spent}
+            for name, visited, spent in zip(
+                self.activity_names, self.visit_counts[row].tolist(), self.activity_minutes[row].tolist()
+            )
+        }
+
+
+class AttractionHistoryView(Mapping):
+    """ Read-only view of one agent's row of the ride count matrix, kept under Agent.state["attractions"] so the agent's
+    history still reads as attraction name -> {"times_completed": n}. Counts are only written through the model. """
+
+    def __init__(self, model, row):
+        self.model = model
+        self.row = row
+
+    def __getitem__(self, attraction):
+        return {"times_completed": int(self.model.ride_counts[self.row, self.model.attraction_ids[attraction]])}
+
+    def __iter__(self):
+        return iter(self.model.attraction_names)
+
+    def __len__(self):
+        return len(self.model.attraction_names)
+
+
+class ActivityHistoryView(Mapping):
+    """ Read-only view of one agent's rows of the activity matrices, kept under Agent.state["activities"] as activity
+    name -> {"times_visited": n, "time_spent": minutes} """
+
+    def __init__(self, model, row):
+        self.model = model
+        self.row = row
+
+    def __getitem__(self, activity):
+        activity_id = self.model.activity_ids[activity]
+        return {
+            "times_visited": int(self.model.visit_counts[self.row, activity_id]),
+            "time_spent": int(self.model.activity_minutes[self.row, activity_id]),
+        }
+
+    def __iter__(self):
+        return iter(self.model.activity_names)
+
+    def __len__(self):
+        return len(self.model.activity_names)
@@ -0,0 +1,126 @@
+import numpy as np
+
+from behavior_reference import BEHAVIOR_ARCHETYPE_PARAMETERS
+from rng import EXP_ABILITY, BEHAVIOR_ARCHETYPE, AGE_CLASS, STAY_TIME_PREFERENCE
+
+
+AGE_CLASSES = ("no_child_rides", "no_adult_rides", "no_preference")
+
+
+def validate_behavior_archetypes(behavior_archetype_parameters=None):
+    """ Checks that the age class percentages of every behavior archetype add up to 1 """
+
+    behavior_archetype_parameters = behavior_archetype_parameters or BEHAVIOR_ARCHETYPE_PARAMETERS
+    for behavior_type, behavior_dict in behavior_archetype_parameters.items():
+        age_class_sum = behavior_dict["percent_no_child_rides"] + behavior_dict["percent_no_adult_rides"] + \
+                        behavior_dict["percent_no_preference"]
+        # deal with fuzzy float addition
+        if not 0.98 <= age_class_sum <= 1.0:
+            raise AssertionError(
+                f"Behavior Archetype {behavior_type} characteristics percent_no_child_rides, percent_no_adult_rides,"
+                "and percent_no_preference, must add up to 1"
+            )
+
+
+def select_weighted(uniforms, cumulative_weights):
+    """ Vectorized form of the agents' weighted selections: scales each uniform by the total weight of its row and
+    returns the index of the first cumulative weight above it. cumulative_weights is one row of cumulative weights or
+    one row per uniform. """
+
+    cumulative_weights = np.atleast_2d(cumulative_weights)
+    targets = uniforms * cumulative_weights[:, -1]
+    selected = (cumulative_weights <= targets[:, None]).sum(axis=1)
+    return np.minimum(selected, cumulative_weights.shape[1] - 1)
+
+
+def cumulative(weights):
+    """ Running sums of weights, accumulated left to right like the agents' selection loops """
+
+    total = 0.0
+    sums = []
+    for weight in weights:
+        total += weight
+        sums.append(total)
+    return sums
+
+
+class Population:
+    """ The traits of every agent of the day, drawn in bulk as NumPy arrays: behavior archetype, age class, expedited
+    pass ability and stay time preference. Draws are keyed by agent id with the same purposes and distributions as
+    Agent.initialize_agent, so an agent created from its row is the agent initialize_agent would have drawn. """
+
+    def __init__(self, archetypes, archetype, age_class, exp_ability, stay_time_preference, exp_wait_threshold,
+                 exp_limit):
+        """
+        Required Inputs:
+            archetypes: names of the archetype codes
+            archetype: (agents,) archetype codes
+            age_class: (agents,) codes of AGE_CLASSES
+            exp_ability: (agents,) expedited pass ability flags
+            stay_time_preference: (agents,) stay time preferences (minutes)
+            exp_wait_threshold: expedited wait threshold shared by all agents
+            exp_limit: expedited pass limit shared by all agents
+        """
+
+        self.archetypes = list(archetypes)
+        self.archetype = archetype
+        self.age_class = age_class
+        self.exp_ability = exp_ability
+        self.stay_time_preference = stay_time_preference
+        self.exp_wait_threshold = exp_wait_threshold
+        self.exp_limit = exp_limit
+
+    @classmethod
+    def generate(cls, rng, total_agents, behavior_archetype_distribution, exp_ability_pct, exp_wait_threshold,
+                 exp_limit):
+        """ Draws the traits of total_agents agents from the park's RandomStreams in one pass per trait """
+
+        validate_behavior_archetypes()
+        agent_ids = np.arange(total_agents, dtype=np.int64)
+        archetypes = list(behavior_archetype_distribution)
+
+        archetype = select_weighted(
+            uniforms=rng.uniform(BEHAVIOR_ARCHETYPE, agent_id=agent_ids),
+            cumulative_weights=cumulative(behavior_archetype_distribution.values())
+        ).astype(np.int16)
+
+        parameters = [BEHAVIOR_ARCHETYPE_PARAMETERS[name] for name in archetypes]
+        age_class_weights = np.array(
+            [cumulative(behavior[f"percent_{age_class}"] for age_class in AGE_CLASSES) for behavior in parameters]
+        )
+        age_class = select_weighted(
+            uniforms=rng.uniform(AGE_CLASS, agent_id=agent_ids),
+            cumulative_weights=age_class_weights[archetype]
+        ).astype(np.int8)
+
+        mean_stay = np.array([behavior["stay_time_preference"] for behavior in parameters], dtype=float)[archetype]
+        stay_time_preference = np.maximum(
+            rng.normal(STAY_TIME_PREFERENCE, agent_id=agent_ids, mean=mean_stay, std=mean_stay / 4), 0
+        ).astype(np.int64)
+
+        exp_ability = rng.uniform(EXP_ABILITY, agent_id=agent_ids) < exp_ability_pct
+
+        return cls(
+            archetypes=archetypes,
+            archetype=archetype,
+            age_class=age_class,
+            exp_ability=exp_ability,
+            stay_time_preference=stay_time_preference,
+            exp_wait_threshold=exp_wait_threshold,
+            exp_limit=exp_limit
+        )
+
+    def __len__(self):
+        return len(self.archetype)
+
+    def traits(self, agent_id):
+        """ Returns the keyword arguments Agent.initialize_agent takes for one agent's drawn traits """
+
+        return {
+            "behavior_archetype": self.archetypes[self.archetype[agent_id]],
+            "age_class": AGE_CLASSES[self.age_class[agent_id]],
+            "exp_ability": bool(self.exp_ability[agent_id]),
+            "stay_time_preference": int(self.stay_time_preference[agent_id]),
+            "exp_wait_threshold": self.exp_wait_threshold,
+            "exp_limit": self.exp_limit,
+        }
@@ -0,0 +1,112 @@
+import time
+
+import pandas as pd
+from tabulate import tabulate
+
+
+# phases of Park.step, in the order they run
+STEP_PHASES = (
+    "arrivals",
+    "wait times",
+    "decisions",
+    "destinations",
+    "attractions",
+    "activities",
+    "agent timers",
+    "history",
+)
+COUNTERS = (
+    "steps",
+    "arrivals",
+    "decisions",
+    "balks",
+    "queue entries",
+    "expedited queue entries",
+    "passes distributed",
+    "activity visits",
+    "departures",
+)
+
+
+class StepProfiler:
+    """ Instrumentation for Park.step, enabled with Park(profile_steps=True). Accumulates wall time and calls per step
+    phase and per attraction and activity, and counts events such as decisions and balks. When profiling is off the
+    park holds no profiler and every hook is a single `is not None` check. """
+
+    def __init__(self):
+        self.phase_seconds = {phase: 0.0 for phase in STEP_PHASES}
+        self.phase_calls = {phase: 0 for phase in STEP_PHASES}
+        self.entity_seconds = {"attraction": {}, "activity": {}}
+        self.entity_calls = {"attraction": {}, "activity": {}}
+        self.counters = {counter: 0 for counter in COUNTERS}
+
+    @staticmethod
+    def start():
+        """ Returns the current time, to pass to lap or lap_entity """
+
+        return time.perf_counter()
+
+    def lap(self, phase, start):
+        """ Adds the time since start to a phase and returns the current time, so consecutive phases chain """
+
+        now = time.perf_counter()
+        self.phase_seconds[phase] += now - start
+        self.phase_calls[phase] += 1
+        return now
+
+    def lap_entity(self, kind, name, start):
+        """ Adds the time since start to an attraction or activity (kind) and returns the current time """
+
+        now = time.perf_counter()
+        self.entity_seconds[kind][name] = self.entity_seconds[kind].get(name, 0.0) + now - start
+        self.entity_calls[kind][name] = self.entity_calls[kind].get(name, 0) + 1
+        return now
+
+    def count(self, counter, amount=1):
+        """ Increments a counter """
+
+        self.counters[counter] += amount
+
+    def summary(self):
+        """ Returns the collected measurements as a JSON serializable dictionary """
+
+        return {
+            "total_seconds": sum(self.phase_seconds.values()),
+            "phases": {
+                phase: {"seconds": self.phase_seconds[phase], "calls": self.phase_calls[phase]} for phase in STEP_PHASES
+            },
+            "entities": {
+                kind: {
+                    name: {"seconds": seconds, "calls": self.entity_calls[kind][name]}
+                    for name, seconds in entity_seconds.items()
+                } for kind, entity_seconds in self.entity_seconds.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+    def to_frame(self):
+        """ Returns the phase, attraction and activity timings as a DataFrame with a row per timed section """
+
+        rows = [
+            {"Kind": "phase", "Name": phase, "Seconds": self.phase_seconds[phase], "Calls": self.phase_calls[phase]}
+            for phase in STEP_PHASES
+        ]
+        for kind, entity_seconds in self.entity_seconds.items():
+            rows.extend(
+                {"Kind": kind, "Name": name, "Seconds": seconds, "Calls": self.entity_calls[kind][name]}
+                for name, seconds in entity_seconds.items()
+            )
+        df = pd.DataFrame(rows, columns=["Kind", "Name", "Seconds", "Calls"])
+        total_seconds = sum(self.phase_seconds.values())
+        df["Percent"] = 100 * df["Seconds"] / total_seconds if total_seconds else 0.0
+        return df
+
+    def report(self):
+        """ Returns the timings and counters as printable tables """
+
+        df = self.to_frame()
+        counters = pd.DataFrame({"Counter": list(self.counters), "Count": list(self.counters.values())})
+        return "\n".join([
+            tabulate(df, headers="keys", tablefmt="psql", showindex=False, floatfmt=".3f"),
+            tabulate(counters, headers="keys", tablefmt="psql", showindex=False),
+        ])
@@ -0,0 +1,176 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from agent import Agent
+from comparison import compare_scenarios
+from ensemble import build_park
+from park import Park
+from results import load_results
+from sim_tests import sim_config
+from sweep import expand_grid
+
+
+CHECK_AGENTS = 300  # small enough that every check runs in seconds
+CHECK_SEED = 5
+# the park as sim_tests.main runs it, every mode checked here must reproduce its results exactly
+DEFAULT_OPTIONS = {"decision_mode": "agent", "agent_logging": True, "archive_departed": False}
+
+
+def run_check_day(park_options=None, checkpoint_minute=None):
+    """ Runs a day of the sim_tests park with CHECK_AGENTS agents and the given Park options on top of DEFAULT_OPTIONS.
+    With a checkpoint_minute the park is checkpointed at that minute, restored, and the restored park finishes the
+    day. Returns the finished park. """
+
+    config = sim_config(total_daily_agents=CHECK_AGENTS)
+    config["park_options"] = dict(DEFAULT_OPTIONS, **(park_options or {}))
+    park = build_park(config=config, random_seed=CHECK_SEED)
+    minutes = len(config["arrival_seed"]) * 60
+    if checkpoint_minute is not None:
+        for _ in range(checkpoint_minute):
+            park.step()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "check.npz")
+            park.checkpoint(path)
+            park = Park.restore(path)
+        minutes -= checkpoint_minute
+    for _ in range(minutes):
+        park.step()
+    return park
+
+
+def assert_same_history(park, expected, label):
+    """ Asserts that two finished parks recorded the same per minute history and park totals """
+
+    store, expected_store = park.history_store, expected.history_store
+    assert sorted(store.values) == sorted(expected_store.values), f"{label}: recorded metrics differ"
+    for metric, values in expected_store.values.items():
+        assert store.names[metric] == expected_store.names[metric], f"{label}: {metric} entities differ"
+        assert np.array_equal(store.written[metric], expected_store.written[metric]), (
+            f"{label}: {metric} was recorded at different minutes"
+        )
+        assert np.array_equal(store.values[metric], values, equal_nan=True), f"{label}: {metric} history differs"
+    for total in ("distributed_passes", "redeemed_passes"):
+        assert park.history[total] == expected.history[total], f"{label}: {total} differs"
+    assert park.left_agents == expected.left_agents, f"{label}: left agents differ"
+
+
+def check_modes_match_default():
+    """ Every optional Park mode must reproduce the default run exactly: batched decisions, archiving departed agents
+    and turning agent logging off. """
+
+    expected = run_check_day()
+    variants = {
+        "decision_mode=batch": {"decision_mode": "batch"},
+        "archive_departed": {"archive_departed": True},
+        "agent_logging=False": {"agent_logging": False},
+    }
+    for label, park_options in variants.items():
+        assert_same_history(park=run_check_day(park_options=park_options), expected=expected, label=label)
+
+
+def check_checkpoint_resume(checkpoint_minute=400):
+    """ A park checkpointed mid-day, restored and run to the end of the day must match the uninterrupted run, in its
+    history and in its event log. """
+
+    expected = run_check_day()
+    park = run_check_day(checkpoint_minute=checkpoint_minute)
+    assert_same_history(park=park, expected=expected, label="checkpoint resume")
+    assert np.array_equal(park.event_log.records(), expected.event_log.records()), "checkpoint resume: event log differs"
+
+
+def check_population_matches_agents():
+    """ The traits drawn in bulk for the whole population must be the traits each agent would draw on its own """
+
+    config = sim_config(total_daily_agents=CHECK_AGENTS)
+    config["park_options"] = DEFAULT_OPTIONS
+    park = build_park(config=config, random_seed=CHECK_SEED)
+    for agent_id in range(len(park.population)):
+        traits = park.population.traits(agent_id)
+        agent = Agent(random_seed=CHECK_SEED, rng=park.rng)
+        agent.initialize_agent(
+            behavior_archetype_distribution=config["behavior_archetype_distribution"],
+            exp_ability=traits["exp_ability"],
+            exp_wait_threshold=traits["exp_wait_threshold"],
+            exp_limit=traits["exp_limit"],
+            agent_id=agent_id,
+            attraction_names=list(park.attractions),
+            activity_names=list(park.activities)
+        )
+        assert agent.behavior["archetype"] == traits["behavior_archetype"], f"agent {agent_id}: archetype differs"
+        assert agent.state["age_class"] == traits["age_class"], f"agent {agent_id}: age class differs"
+        assert agent.behavior["stay_time_preference"] == traits["stay_time_preference"], (
+            f"agent {agent_id}: stay time preference differs"
+        )
+
+
+def check_export_round_trip():
+    """ Exported results must load back unchanged: the history and event log of the run, and the same per agent outcomes
+    whether departed agents were kept or archived. """
+
+    parks = {"kept": run_check_day(), "archived": run_check_day(park_options={"archive_departed": True})}
+    loaded = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for label, park in parks.items():
+            path = os.path.join(directory, label)
+            park.export_results(path)
+            results = load_results(path, mmap=False)
+            loaded[label] = results
+            store = park.history_store
+            for metric, history in results["history"].items():
+                minutes = store.recorded_minutes(metric)
+                assert np.array_equal(history["minutes"], minutes), f"{label}: {metric} minutes differ"
+                assert np.array_equal(history["values"], store.values[metric][minutes], equal_nan=True), (
+                    f"{label}: {metric} history differs"
+                )
+            assert np.array_equal(results["events"], park.event_log.records()), f"{label}: event log differs"
+    for column, values in loaded["kept"]["agents"].items():
+        assert np.array_equal(loaded["archived"]["agents"][column], values), f"archived: agent {column} differs"
+
+
+def check_paired_comparison(runs=6):
+    """ Common random numbers must make paired comparisons tighter than independent ones. Compares the sim_tests park
+    against a copy with a less popular Kaveri Rapids and checks that the paired confidence interval of the daily mean
+    activity visitors is narrower than the interval the same runs give unpaired. """
+
+    baseline = sim_config(total_daily_agents=CHECK_AGENTS)
+    candidate = expand_grid(baseline, {("attraction", "Kaveri Rapids", "popularity"): [3]})[0]
+    result = compare_scenarios(baseline=baseline, candidate=candidate, runs=runs, workers=1, metrics=["total_vistors"])
+    for outcome, statistics in result["statistics"].items():
+        if not outcome.startswith("total_vistors:"):
+            continue
+        paired_width = statistics["ci_high"] - statistics["ci_low"]
+        unpaired_width = statistics["unpaired_ci_high"] - statistics["unpaired_ci_low"]
+        assert paired_width < unpaired_width, (
+            f"{outcome}: paired interval ({paired_width:.3f}) is not narrower than unpaired ({unpaired_width:.3f})"
+        )
+
+
+CHECKS = [
+    check_modes_match_default,
+    check_checkpoint_resume,
+    check_population_matches_agents,
+    check_export_round_trip,
+    check_paired_comparison,
+]
+
+
+def main():
+    failures = 0
+    for check in CHECKS:
+        try:
+            check()
+        except AssertionError as error:
+            failures += 1
+            print(f"FAIL {check.__name__}: {error}")
+        else:
+            print(f"ok   {check.__name__}")
+    return failures
+
+
+if __name__ == "__main__":
+
+    # Run every regression check, exits non-zero if any failed
+    sys.exit(1 if main() else 0)
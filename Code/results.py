@@ -0,0 +1,242 @@
+import os
+import json
+
+import numpy as np
+
+from event_log import EVENT_NAMES
+from population import AGE_CLASSES
+
+
+RESULTS_FORMAT_VERSION = 1
+FILE_FORMATS = ("npy", "parquet", "arrow")
+
+
+def agent_outcomes(park):
+    """ Returns a dictionary of per agent outcome columns (NumPy arrays indexed by agent_id), the category names of the
+    coded columns, and an (agents x attractions) matrix of completed rides. Agents of the population that have not
+    arrived yet have no Agent object and are filled in from their drawn traits, departed agents of parks with an
+    outcome archive from their archived records. """
+
+    agents = [park.agents[agent_id] for agent_id in sorted(park.agents)]
+    population = park.population
+
+    if population is not None:
+        total_agents = len(population)
+        rows = np.array([agent.agent_id for agent in agents], dtype=np.int64)
+        archetypes = sorted(population.archetypes)
+        archetype_codes = {archetype: code for code, archetype in enumerate(archetypes)}
+        archetype = np.array([archetype_codes[name] for name in population.archetypes], dtype=np.int8)[
+            population.archetype
+        ]
+        age_class = population.age_class.astype(np.int8)
+    else:
+        total_agents = len(agents)
+        rows = np.arange(total_agents)
+        archetypes = sorted({agent.behavior["archetype"] for agent in agents})
+        archetype_codes = {archetype: code for code, archetype in enumerate(archetypes)}
+        archetype = np.array([archetype_codes[agent.behavior["archetype"]] for agent in agents], dtype=np.int8)
+        age_class = np.array([AGE_CLASSES.index(agent.state["age_class"]) for agent in agents], dtype=np.int8)
+
+    # the rides of agents that have not been archived are their rows of the model's count matrix, archived agents have
+    # them in their records (columns by attraction id, in the order of park.attractions)
+    agent_rides = park.model.ride_counts[[agent.model_row for agent in agents]].astype(np.int32)
+    if population is not None:
+        times_completed = np.zeros((total_agents, len(park.model.attraction_names)), dtype=np.int32)
+        times_completed[rows] = agent_rides
+    else:
+        times_completed = agent_rides
+    # -1 for agents who never arrived or never left
+    arrival_time = np.full(total_agents, -1, dtype=np.int32)
+    arrival_time[rows] = [-1 if agent.state["arrival_time"] is None else agent.state["arrival_time"] for agent in agents]
+    exit_time = np.full(total_agents, -1, dtype=np.int32)
+    exit_time[rows] = [-1 if agent.state["exit_time"] is None else agent.state["exit_time"] for agent in agents]
+    passes_redeemed = np.zeros(total_agents, dtype=np.int32)
+    passes_redeemed[rows] = [agent.state["passes_redeemed"] for agent in agents]
+    if park.outcome_archive is not None and population is not None:
+        records = park.outcome_archive.outcomes()
+        archived_rows = records["agent_id"]
+        arrival_time[archived_rows] = records["arrival_time"]
+        exit_time[archived_rows] = records["exit_time"]
+        passes_redeemed[archived_rows] = records["passes_redeemed"]
+        times_completed[archived_rows] = records["rides"]
+
+    columns = {
+        "agent_id": np.arange(total_agents, dtype=np.int32) if population is not None
+        else np.array([agent.agent_id for agent in agents], dtype=np.int32),
+        "archetype": archetype,
+        "age_class": age_class,
+        "arrival_time": arrival_time,
+        "exit_time": exit_time,
+        "rides_completed": times_completed.sum(axis=1, dtype=np.int32),
+        "passes_redeemed": passes_redeemed,
+    }
+    categories = {"archetype": archetypes, "age_class": list(AGE_CLASSES)}
+
+    return columns, categories, times_completed
+
+
+def export_results(park, output_path, file_format="npy"):
+    """ Writes a finished park's results to a directory that load_results can memory-map back:
+        - history: every per minute metric of the park, attractions and activities, over the recorded minutes
+        - agents: per agent outcomes (archetype, age class, arrival and exit time, rides completed, passes redeemed)
+          and the (agents x attractions) matrix of completed rides
+        - events: the agent event log records
+        - manifest.json: entity, category and location names, park totals, the step profile (if profiled) and the
+          format of the files
+
+    Required Inputs:
+        park: Park that has been stepped through its day
+        output_path: directory to write to, created if needed
+    Optional Inputs:
+        file_format: "npy" writes one NumPy file per column (no extra dependencies), "parquet" or "arrow" write one
+            table per dataset and require pyarrow
+    """
+
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"Incompatible file format :{file_format}")
+    os.makedirs(os.path.join(output_path, "history"), exist_ok=True)
+
+    columns, categories, times_completed = agent_outcomes(park)
+    attraction_names = list(park.attractions.keys())
+    history_store = park.history_store
+    history = {}
+    for metric in history_store.values:
+        minutes = history_store.recorded_minutes(metric)
+        history[metric] = (minutes, history_store.values[metric][minutes])
+    events = park.event_log.records()
+
+    manifest = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "file_format": file_format,
+        "version": park.version,
+        "random_seed": park.random_seed,
+        "park_close": park.park_close,
+        "totals": {
+            "distributed_passes": park.history["distributed_passes"],
+            "redeemed_passes": park.history["redeemed_passes"],
+            "left_agents": park.left_agents,
+        },
+        # step timings and counters of parks run with profile_steps=True
+        "profile": None if park.profiler is None else park.profiler.summary(),
+        "history": {metric: list(history_store.names[metric]) for metric in history},
+        "agents": {"columns": list(columns), "categories": categories, "attractions": attraction_names},
+        "events": {
+            "columns": list(events.dtype.names),
+            "locations": list(park.event_log.location_names),
+            "event_names": {str(code): name for code, name in EVENT_NAMES.items()},
+        },
+    }
+
+    if file_format == "npy":
+        for metric, (minutes, values) in history.items():
+            np.save(os.path.join(output_path, "history", f"{metric}.minutes.npy"), minutes)
+            np.save(os.path.join(output_path, "history", f"{metric}.npy"), values)
+        os.makedirs(os.path.join(output_path, "agents"), exist_ok=True)
+        for column, values in columns.items():
+            np.save(os.path.join(output_path, "agents", f"{column}.npy"), values)
+        np.save(os.path.join(output_path, "agents", "times_completed.npy"), times_completed)
+        np.save(os.path.join(output_path, "events.npy"), events)
+    else:
+        write_table = table_writer(file_format)
+        import pyarrow as pa
+
+        for metric, (minutes, values) in history.items():
+            table = {"time": minutes}
+            table.update({name: values[:, ind] for ind, name in enumerate(history_store.names[metric])})
+            write_table(pa.table(table), os.path.join(output_path, "history", f"{metric}.{file_format}"))
+        agent_table = dict(columns)
+        agent_table.update(
+            {f"times_completed:{name}": times_completed[:, ind] for ind, name in enumerate(attraction_names)}
+        )
+        write_table(pa.table(agent_table), os.path.join(output_path, f"agents.{file_format}"))
+        write_table(
+            pa.table({name: np.ascontiguousarray(events[name]) for name in events.dtype.names}),
+            os.path.join(output_path, f"events.{file_format}")
+        )
+
+    with open(os.path.join(output_path, "manifest.json"), "wt") as file_writer:
+        json.dump(manifest, file_writer, indent=2)
+
+
+def table_writer(file_format):
+    """ Returns the pyarrow function that writes a table in the given file format """
+
+    try:
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError(f"Writing {file_format} results requires pyarrow (pip install pyarrow)") from error
+
+    if file_format == "parquet":
+        return pq.write_table
+    return lambda table, path: feather.write_feather(table, path, compression="uncompressed")
+
+
+def table_reader(file_format):
+    """ Returns a function that memory-maps a table written in the given file format as a dict of NumPy columns """
+
+    try:
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError(f"Reading {file_format} results requires pyarrow (pip install pyarrow)") from error
+
+    def read_table(path):
+        if file_format == "parquet":
+            table = pq.read_table(path, memory_map=True)
+        else:
+            table = feather.read_table(path, memory_map=True)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+    return read_table
+
+
+def load_results(output_path, mmap=True):
+    """ Loads results written by export_results. NumPy files are memory-mapped read-only, so only the columns that are
+    actually used are read from disk.
+
+    Returns a dictionary with:
+        manifest: the manifest written alongside the results
+        history: metric -> {"minutes": (minutes,) array, "values": (minutes x entities) array, "entities": names}
+        agents: column -> (agents,) array, plus "times_completed", the (agents x attractions) array
+        events: the event log records as a structured array (npy) or a dictionary of columns (parquet, arrow)
+    """
+
+    with open(os.path.join(output_path, "manifest.json"), "rt") as file_reader:
+        manifest = json.load(file_reader)
+    if manifest["format_version"] != RESULTS_FORMAT_VERSION:
+        raise ValueError(f"Unsupported results format version: {manifest['format_version']}")
+
+    file_format = manifest["file_format"]
+    mmap_mode = "r" if mmap else None
+    history = {}
+    if file_format == "npy":
+        def load(*path):
+            return np.load(os.path.join(output_path, *path), mmap_mode=mmap_mode)
+
+        for metric, entities in manifest["history"].items():
+            history[metric] = {
+                "minutes": load("history", f"{metric}.minutes.npy"),
+                "values": load("history", f"{metric}.npy"),
+                "entities": entities,
+            }
+        agents = {column: load("agents", f"{column}.npy") for column in manifest["agents"]["columns"]}
+        agents["times_completed"] = load("agents", "times_completed.npy")
+        events = load("events.npy")
+    else:
+        read_table = table_reader(file_format)
+        for metric, entities in manifest["history"].items():
+            table = read_table(os.path.join(output_path, "history", f"{metric}.{file_format}"))
+            history[metric] = {
+                "minutes": table["time"],
+                "values": np.column_stack([table[name] for name in entities]) if entities else None,
+                "entities": entities,
+            }
+        table = read_table(os.path.join(output_path, f"agents.{file_format}"))
+        agents = {column: table[column] for column in manifest["agents"]["columns"]}
+        agents["times_completed"] = np.column_stack(
+            [table[f"times_completed:{name}"] for name in manifest["agents"]["attractions"]]
+        )
+        events = read_table(os.path.join(output_path, f"events.{file_format}"))
+
+    return {"manifest": manifest, "history": history, "agents": agents, "events": events}
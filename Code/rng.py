@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+
+
+# purposes, each purpose draws from its own independent stream
+ARRIVALS = 1
+PERFECT_ARRIVALS = 2
+EXP_ABILITY = 3
+BEHAVIOR_ARCHETYPE = 4
+AGE_CLASS = 5
+STAY_TIME_PREFERENCE = 6
+LEAVE_PARK = 7
+ATTRACTION_OR_ACTIVITY = 8
+ATTRACTION_CHOICE = 9
+ACTIVITY_CHOICE = 10
+ACTIVITY_STAY = 11
+
+MASK32 = 0xFFFFFFFF
+NO_KEY = MASK32  # counter word used when a draw is not tied to an agent or an index
+
+# Philox4x32-10 constants (Salmon et al., "Parallel Random Numbers: As Easy as 1, 2, 3")
+PHILOX_M0 = 0xD2511F53
+PHILOX_M1 = 0xCD9E8D57
+PHILOX_W0 = 0x9E3779B9
+PHILOX_W1 = 0xBB67AE85
+PHILOX_ROUNDS = 10
+
+
+def philox4x32(counter, key):
+    """ Philox4x32-10 block function. counter is four 32 bit words, key is two 32 bit words. Words can be python
+    ints or NumPy uint64 arrays (every intermediate product fits in 64 bits), so the same code serves single draws
+    and batched draws. Returns the four 32 bit output words. """
+
+    c0, c1, c2, c3 = counter
+    k0, k1 = key
+    for round_ind in range(PHILOX_ROUNDS):
+        if round_ind > 0:
+            k0 = (k0 + PHILOX_W0) & MASK32
+            k1 = (k1 + PHILOX_W1) & MASK32
+        product0 = c0 * PHILOX_M0
+        product1 = c2 * PHILOX_M1
+        c0, c1, c2, c3 = (
+            ((product1 >> 32) ^ c1 ^ k0) & MASK32,
+            product1 & MASK32,
+            ((product0 >> 32) ^ c3 ^ k1) & MASK32,
+            product0 & MASK32,
+        )
+    return c0, c1, c2, c3
+
+
+def words_to_unit(high, low):
+    """ Combines two 32 bit words into a double in [0, 1) with 53 bits of randomness """
+
+    return ((high >> 5) * 67108864 + (low >> 6)) / 9007199254740992.0
+
+
+class RandomStreams:
+    """ Counter-based random number service. Every draw is a pure function of (seed, purpose, agent, index), computed
+    with the Philox4x32-10 block cipher, so draws are cheap (no generator is constructed per draw), streams for
+    different agents, indices and purposes are statistically independent, and results do not depend on the order in
+    which agents, activities or arrivals are processed. Passing arrays of agent ids draws a whole batch at once.
+
+    Agent draws are keyed by the agent's own event counters rather than by park minute: decisions by the agent's
+    decision index and activity stays by its visit index. The n-th decision of an agent therefore sees the same draws
+    in two scenarios of one seed even after their timelines drift apart, which keeps common random numbers aligned. """
+
+    def __init__(self, seed):
+        """
+        Required Inputs:
+            seed: non-negative integer seed, up to 64 bits
+        """
+
+        self.seed = int(seed)
+        self.key = (self.seed & MASK32, (self.seed >> 32) & MASK32)
+
+    def _block(self, purpose, agent_id, index):
+        """ Returns the four Philox output words for a (purpose, agent, index) counter """
+
+        agent_word = NO_KEY if agent_id is None else agent_id
+        index_word = NO_KEY if index is None else index
+        if isinstance(agent_word, np.ndarray) or isinstance(index_word, np.ndarray):
+            agent_word = np.asarray(agent_word, dtype=np.int64).astype(np.uint64) & np.uint64(MASK32)
+            index_word = np.asarray(index_word, dtype=np.int64).astype(np.uint64) & np.uint64(MASK32)
+            agent_word, index_word = np.broadcast_arrays(agent_word, index_word)
+            purpose_word = np.full(agent_word.shape, purpose, dtype=np.uint64)
+            zero_word = np.zeros(agent_word.shape, dtype=np.uint64)
+            return philox4x32(
+                counter=(agent_word, index_word, purpose_word, zero_word),
+                key=(np.uint64(self.key[0]), np.uint64(self.key[1]))
+            )
+        return philox4x32(counter=(int(agent_word) & MASK32, int(index_word) & MASK32, purpose, 0), key=self.key)
+
+    def uniform(self, purpose, agent_id=None, index=None):
+        """ Returns a U[0, 1) draw (or an array of draws if agent_id or index is an array) """
+
+        c0, c1, _, _ = self._block(purpose=purpose, agent_id=agent_id, index=index)
+        return words_to_unit(c0, c1)
+
+    def normal(self, purpose, agent_id=None, index=None, mean=0.0, std=1.0):
+        """ Returns a N(mean, std) draw (or an array of draws), using the Box-Muller transform on the two uniforms of
+        one Philox block """
+
+        c0, c1, c2, c3 = self._block(purpose=purpose, agent_id=agent_id, index=index)
+        u1 = 1.0 - words_to_unit(c0, c1)  # (0, 1], safe for log
+        u2 = words_to_unit(c2, c3)
+        if isinstance(u1, float):
+            return mean + std * math.sqrt(-2.0 * math.log(u1)) * math.cos(2.0 * math.pi * u2)
+        return mean + std * np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+    def generator(self, purpose, stream=0):
+        """ Returns a NumPy Generator on its own Philox stream for bulk draws (e.g. a whole hour of Poisson arrivals).
+        Meant to be constructed once per bulk draw, not once per value. """
+
+        c0, c1, c2, c3 = self._block(purpose=purpose, agent_id=None, index=stream)
+        return np.random.Generator(np.random.Philox(key=(c0 << 96) | (c1 << 64) | (c2 << 32) | c3))
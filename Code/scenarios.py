@@ -0,0 +1,81 @@
+import os
+import multiprocessing
+import tempfile
+
+
+# park, variants and end minute of the fork in progress, inherited by forked worker processes
+FORK_STATE = {}
+
+
+def variant_result(park):
+    """ Returns the comparable results of a finished variant: its history store and park totals """
+
+    return {
+        "history_store": park.history_store,
+        "time": park.time,
+        "distributed_passes": park.history["distributed_passes"],
+        "redeemed_passes": park.history["redeemed_passes"],
+        "left_agents": park.left_agents,
+    }
+
+
+def run_variant(park, variant, until):
+    """ Applies a variant to a park and steps it until the given minute """
+
+    if variant is not None:
+        variant(park)
+    while park.time < until:
+        park.step()
+    return variant_result(park)
+
+
+def run_forked_variant(name):
+    """ Runs one variant in a worker forked from the parent process. The park is the parent's copy-on-write memory
+    image, so only the pages the variant touches are copied. """
+
+    return name, run_variant(park=FORK_STATE["park"], variant=FORK_STATE["variants"][name], until=FORK_STATE["until"])
+
+
+def fork_variants(park, variants, until=None, workers=None):
+    """ Branches scenario variants from the current state of a park and runs each to the given minute. The park
+    itself is left untouched at its current minute, so the shared prefix of the day is only simulated once.
+
+    On platforms that can fork, each variant runs in a freshly forked child process that shares the parent's memory
+    copy-on-write. Elsewhere, or with workers=1, the park is checkpointed once and every variant runs in process on a
+    restored copy. Random draws are keyed by (seed, purpose, agent, index), with agent decisions and activity stays
+    indexed by the agent's own decision and visit counters, so variants see common random numbers and differ only
+    through their changes.
+
+    Required Inputs:
+        park: Park stepped through the shared prefix
+        variants: dictionary of variant name -> function that takes the branched park and changes it (for example
+            closing an attraction or raising its expedited_queue_ratio), None runs the park unchanged
+    Optional Inputs:
+        until: minute to run every variant to, defaults to the end of the park's history horizon
+        workers: maximum number of variants run at once, defaults to the number of CPUs
+    Returns a dictionary of variant name -> {"history_store", "time", "distributed_passes", "redeemed_passes",
+    "left_agents"}, in the order of variants.
+    """
+
+    until = park.history_store.horizon if until is None else until
+    if until < park.time:
+        raise ValueError(f"Cannot fork to minute {until}, the park is already at minute {park.time}")
+    workers = min(workers or os.cpu_count() or 1, max(len(variants), 1))
+
+    if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+        FORK_STATE.update(park=park, variants=variants, until=until)
+        try:
+            # one task per child so every variant starts from a fresh fork of the parent's state
+            with multiprocessing.get_context("fork").Pool(processes=workers, maxtasksperchild=1) as pool:
+                results = dict(pool.imap_unordered(run_forked_variant, list(variants)))
+        finally:
+            FORK_STATE.clear()
+        return {name: results[name] for name in variants}
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "prefix.npz")
+        park.checkpoint(path)
+        for name, variant in variants.items():
+            results[name] = run_variant(park=type(park).restore(path), variant=variant, until=until)
+    return results
@@ -2,13 +2,10 @@ from park import Park
 from behavior_reference import BEHAVIOR_ARCHETYPE_PARAMETERS
 
 
-def main():
-    VERSION = "sim_test"
-    VERBOSITY = 1
-    SHOW_PLOTS = True
-    RNG_SEED = 10
+def sim_config(total_daily_agents=5000):
+    """ Returns the Animal Kingdom test park as a configuration dictionary, in the format of ensemble.build_park """
 
-    TOTAL_DAILY_AGENTS = 5000  # 38047  # actual average
+    TOTAL_DAILY_AGENTS = total_daily_agents
     PERFECT_ARRIVALS = True
     HOURLY_PERCENT = {
         "10:00 AM": 10,
@@ -244,9 +241,6 @@ def main():
 
     ENTRANCE_PARK_AREA = "Oasis"
 
-    # Initialize Park
-    RNG_SEED = 5
-
     PLOT_RANGE = {
         "Attraction Queue Length": 'auto',
         "Attraction Wait Time": 'auto',
@@ -263,12 +257,38 @@ def main():
         "Age Class Distribution": 'auto',
     }
 
+    return {
+        "attraction_list": ATTRACTIONS,
+        "activity_list": ACTIVITIES,
+        "park_map": PARK_MAP,
+        "entrance_park_area": ENTRANCE_PARK_AREA,
+        "plot_range": PLOT_RANGE,
+        "arrival_seed": HOURLY_PERCENT,
+        "total_daily_agents": TOTAL_DAILY_AGENTS,
+        "perfect_arrivals": PERFECT_ARRIVALS,
+        "behavior_archetype_distribution": AGENT_ARCHETYPE_DISTRIBUTION,
+        "exp_ability_pct": EXP_ABILITY_PCT,
+        "exp_wait_threshold": EXP_THRESHOLD,
+        "exp_limit": EXP_LIMIT,
+    }
+
+
+def main():
+    VERSION = "sim_test"
+    VERBOSITY = 1
+    SHOW_PLOTS = True
+    RNG_SEED = 5
+
+    TOTAL_DAILY_AGENTS = 5000  # 38047  # actual average
+    config = sim_config(total_daily_agents=TOTAL_DAILY_AGENTS)
+
+    # Initialize Park
     park = Park(
-        attraction_list=ATTRACTIONS,
-        activity_list=ACTIVITIES,
-        park_map=PARK_MAP,
-        entrance_park_area=ENTRANCE_PARK_AREA,
-        plot_range=PLOT_RANGE,
+        attraction_list=config["attraction_list"],
+        activity_list=config["activity_list"],
+        park_map=config["park_map"],
+        entrance_park_area=config["entrance_park_area"],
+        plot_range=config["plot_range"],
         random_seed=RNG_SEED,
         version=VERSION,
         verbosity=VERBOSITY
@@ -277,17 +297,17 @@ def main():
     # Build Arrivals
 
     park.generate_arrival_schedule(
-        arrival_seed=HOURLY_PERCENT,
-        total_daily_agents=TOTAL_DAILY_AGENTS,
-        perfect_arrivals=PERFECT_ARRIVALS,
+        arrival_seed=config["arrival_seed"],
+        total_daily_agents=config["total_daily_agents"],
+        perfect_arrivals=config["perfect_arrivals"],
     )
 
     # Build Agents
     park.generate_agents(
-        behavior_archetype_distribution=AGENT_ARCHETYPE_DISTRIBUTION,
-        exp_ability_pct=EXP_ABILITY_PCT,
-        exp_wait_threshold=EXP_THRESHOLD,
-        exp_limit=EXP_LIMIT
+        behavior_archetype_distribution=config["behavior_archetype_distribution"],
+        exp_ability_pct=config["exp_ability_pct"],
+        exp_wait_threshold=config["exp_wait_threshold"],
+        exp_limit=config["exp_limit"]
     )
 
     # Build Attractions + Activities
@@ -295,7 +315,7 @@ def main():
     park.generate_activities()
 
     # Pass Time
-    for _ in range(len(HOURLY_PERCENT.keys()) * 60):
+    for _ in range(len(config["arrival_seed"].keys()) * 60):
         park.step()
 
     # Save Parameters of Current Run
@@ -305,14 +325,14 @@ def main():
         "SHOW_PLOTS": SHOW_PLOTS,
         "RNG_SEED": RNG_SEED,
         "TOTAL_DAILY_AGENTS": TOTAL_DAILY_AGENTS,
-        "PERFECT_ARRIVALS": PERFECT_ARRIVALS,
-        "HOURLY_PERCENT": HOURLY_PERCENT,
-        "EXP_ABILITY_PCT": EXP_ABILITY_PCT,
-        "EXP_THRESHOLD": EXP_THRESHOLD,
-        "EXP_LIMIT": EXP_LIMIT,
-        "AGENT_ARCHETYPE_DISTRIBUTION": AGENT_ARCHETYPE_DISTRIBUTION,
-        "ATTRACTIONS": ATTRACTIONS,
-        "ACTIVITIES": ACTIVITIES,
+        "PERFECT_ARRIVALS": config["perfect_arrivals"],
+        "HOURLY_PERCENT": config["arrival_seed"],
+        "EXP_ABILITY_PCT": config["exp_ability_pct"],
+        "EXP_THRESHOLD": config["exp_wait_threshold"],
+        "EXP_LIMIT": config["exp_limit"],
+        "AGENT_ARCHETYPE_DISTRIBUTION": config["behavior_archetype_distribution"],
+        "ATTRACTIONS": config["attraction_list"],
+        "ACTIVITIES": config["activity_list"],
         "BEHAVIOR_ARCHETYPE_PARAMETERS": BEHAVIOR_ARCHETYPE_PARAMETERS,
     }
     park.write_data_to_file(
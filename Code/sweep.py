@@ -0,0 +1,166 @@
+import os
+import copy
+import glob
+import json
+import hashlib
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from behavior_reference import BEHAVIOR_ARCHETYPE_PARAMETERS
+from ensemble import run_summary
+
+
+CACHE_FORMAT_VERSION = 1
+ENTITY_LISTS = {"attraction": "attraction_list", "activity": "activity_list"}
+
+_code_version = None
+
+
+def code_version():
+    """ Returns a hash of the simulation source files, so cached results are invalidated when the code changes """
+
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+            digest.update(os.path.basename(path).encode("utf-8"))
+            with open(path, "rb") as file_reader:
+                digest.update(file_reader.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def set_parameter(config, parameter, value):
+    """ Sets one parameter of a configuration in place. parameter is either a top level key (for example
+    "exp_ability_pct") or an ("attraction" | "activity", name, field) tuple, for example
+    ("attraction", "Kaveri River Rapids", "expedited_queue_ratio"). """
+
+    if isinstance(parameter, str):
+        config[parameter] = value
+        return
+    entity_type, name, field = parameter
+    for entity in config[ENTITY_LISTS[entity_type]]:
+        if entity["name"] == name:
+            entity[field] = value
+            return
+    raise ValueError(f"No {entity_type} named {name} in the configuration")
+
+
+def expand_grid(base_config, grid):
+    """ Returns one configuration per combination of the grid values, each a copy of base_config with the combination
+    applied (see set_parameter for the parameter names). Combinations are in itertools.product order of the grid. """
+
+    parameters = list(grid)
+    configs = []
+    for values in itertools.product(*[grid[parameter] for parameter in parameters]):
+        config = copy.deepcopy(base_config)
+        for parameter, value in zip(parameters, values):
+            set_parameter(config, parameter, value)
+        configs.append(config)
+    return configs
+
+
+def cache_key(config, random_seed, metrics=None):
+    """ Content address of one run: a hash of the configuration, the behavior archetype parameters, the seed, the
+    summarized metrics and the code version """
+
+    content = {
+        "cache_format_version": CACHE_FORMAT_VERSION,
+        "config": config,
+        "behavior_archetype_parameters": BEHAVIOR_ARCHETYPE_PARAMETERS,
+        "random_seed": random_seed,
+        "metrics": metrics,
+        "code_version": code_version(),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def save_summary(summary, path):
+    """ Writes a run summary to a .npz file (JSON header plus arrays, no pickle). The file is written under a temporary
+    name and renamed, so an interrupted sweep never leaves a partial result in the cache. """
+
+    header = {
+        "random_seed": summary["random_seed"],
+        "totals": summary["totals"],
+        "entities": {metric: history["entities"] for metric, history in summary["history"].items()},
+    }
+    arrays = {"header": np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8)}
+    for ind, (metric, history) in enumerate(summary["history"].items()):
+        arrays[f"metric_{ind}_minutes"] = history["minutes"]
+        arrays[f"metric_{ind}_values"] = history["values"]
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file_writer:
+        np.savez(file_writer, **arrays)
+    os.replace(temporary_path, path)
+
+
+def load_summary(path):
+    """ Reads a run summary written by save_summary """
+
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(data["header"].tobytes().decode("utf-8"))
+        history = {
+            metric: {
+                "minutes": data[f"metric_{ind}_minutes"],
+                "values": data[f"metric_{ind}_values"],
+                "entities": entities,
+            } for ind, (metric, entities) in enumerate(header["entities"].items())
+        }
+    return {"random_seed": header["random_seed"], "history": history, "totals": header["totals"]}
+
+
+def run_and_cache(config, random_seed, path, metrics=None):
+    """ Runs one configuration and seed, stores its summary in the cache and returns it """
+
+    summary = run_summary(config=config, random_seed=random_seed, metrics=metrics)
+    save_summary(summary=summary, path=path)
+    return summary
+
+
+def run_sweep(configs, seeds=(0,), cache_dir="sweep_cache", workers=None, metrics=None):
+    """ Runs every configuration with every seed, skipping runs whose summary is already in the on-disk cache.
+
+    Each run is content addressed (see cache_key) and its summary is written to cache_dir as soon as it finishes, so
+    an interrupted sweep resumes where it stopped when called again with the same arguments.
+
+    Required Inputs:
+        configs: list of park configurations (see ensemble.build_park), for example from expand_grid
+    Optional Inputs:
+        seeds: park seeds to run each configuration with
+        cache_dir: directory of cached run summaries
+        workers: number of processes for the runs that are not cached, defaults to the number of CPUs
+        metrics: history metrics to keep in each summary, all by default
+    Returns a list with a {"config", "random_seed", "key", "cached", "summary"} dictionary per run, in configuration
+    then seed order.
+    """
+
+    os.makedirs(cache_dir, exist_ok=True)
+    runs = []
+    for config in configs:
+        for random_seed in seeds:
+            key = cache_key(config=config, random_seed=random_seed, metrics=metrics)
+            path = os.path.join(cache_dir, f"{key}.npz")
+            run = {"config": config, "random_seed": random_seed, "key": key, "cached": os.path.exists(path)}
+            if run["cached"]:
+                run["summary"] = load_summary(path)
+            runs.append((run, path))
+
+    pending = [(run, path) for run, path in runs if not run["cached"]]
+    workers = min(workers or os.cpu_count() or 1, max(len(pending), 1))
+    if workers <= 1:
+        for run, path in pending:
+            run["summary"] = run_and_cache(config=run["config"], random_seed=run["random_seed"], path=path,
+                                           metrics=metrics)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(run_and_cache, run["config"], run["random_seed"], path, metrics): run
+                for run, path in pending
+            }
+            for future in as_completed(futures):
+                futures[future]["summary"] = future.result()
+
+    return [run for run, _ in runs]
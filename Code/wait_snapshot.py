@@ -0,0 +1,93 @@
+import numpy as np
+
+
+class WaitSnapshot:
+    """ Immutable view of what the park posts to its guests during one step: the posted standby and expedited waits,
+    the expedited return times and which attractions are handing out passes, as read-only NumPy arrays indexed by
+    attraction id (plus tuples of the same values for scalar lookups). Posted waits only change when the park updates
+    them at the start of a step, so the park publishes one snapshot per step and every decision of that step, per
+    agent or batched, reads the same values instead of asking each attraction again. """
+
+    def __init__(self, time, attraction_names, wait_times, exp_wait_times, exp_return_times, passes_open):
+        """
+        Required Inputs:
+            time: park minute the snapshot was published at
+            attraction_names: attraction names, in attraction id order
+            wait_times: (attractions,) posted standby waits (minutes)
+            exp_wait_times: (attractions,) posted expedited queue waits (minutes)
+            exp_return_times: (attractions,) return time of a pass obtained now (park minute)
+            passes_open: (attractions,) whether the attraction is handing out expedited passes
+        """
+
+        self.time = time
+        self.attraction_names = tuple(attraction_names)
+        self.attraction_ids = {name: ind for ind, name in enumerate(self.attraction_names)}
+        self.wait_times = np.array(wait_times, dtype=float)
+        self.exp_wait_times = np.array(exp_wait_times, dtype=float)
+        self.exp_return_times = np.array(exp_return_times, dtype=np.int64)
+        self.passes_open = np.array(passes_open, dtype=bool)
+        for values in (self.wait_times, self.exp_wait_times, self.exp_return_times, self.passes_open):
+            values.flags.writeable = False
+
+        # python scalars for the per agent decision loops, indexing a tuple is cheaper than indexing an array
+        self.wait_time_values = tuple(self.wait_times.tolist())
+        self.exp_return_time_values = tuple(self.exp_return_times.tolist())
+        self.pass_open_values = tuple(self.passes_open.tolist())
+
+    @classmethod
+    def from_attractions(cls, attractions, time, posting_policy=None):
+        """ Takes a snapshot of a dictionary of name -> Attraction. posting_policy, if given, turns the attractions'
+        estimated standby waits into the posted ones (see Overposting). """
+
+        wait_times = np.array([attraction.get_wait_time() for attraction in attractions.values()], dtype=float)
+        if posting_policy is not None:
+            wait_times = np.asarray(posting_policy(time=time, wait_times=wait_times), dtype=float)
+        return cls(
+            time=time,
+            attraction_names=attractions.keys(),
+            wait_times=wait_times,
+            exp_wait_times=[attraction.get_exp_wait_time() for attraction in attractions.values()],
+            exp_return_times=[attraction.get_exp_return_time() for attraction in attractions.values()],
+            passes_open=[
+                attraction.expedited_queue and attraction.exp_pass_status == "open"
+                for attraction in attractions.values()
+            ]
+        )
+
+    def wait_time(self, attraction):
+        """ Posted standby wait of an attraction, by name """
+
+        return self.wait_time_values[self.attraction_ids[attraction]]
+
+    def exp_return_time(self, attraction):
+        """ Return time of a pass obtained now for an attraction, by name """
+
+        return self.exp_return_time_values[self.attraction_ids[attraction]]
+
+    def pass_open(self, attraction):
+        """ Whether an attraction is handing out expedited passes, by name """
+
+        return self.pass_open_values[self.attraction_ids[attraction]]
+
+
+class Overposting:
+    """ Posting policy that posts standby waits longer than estimated, as parks do to manage expectations: the
+    posted wait is the estimate times factor plus offset minutes, rounded up to a multiple of round_to minutes. Pass
+    one as Park(posting_policy=Overposting(factor=1.2)). A posting policy is any picklable callable taking the park
+    minute and the (attractions,) estimated waits and returning the posted waits. """
+
+    def __init__(self, factor=1.0, offset=0, round_to=1):
+        """
+        Optional Inputs:
+            factor: multiplier applied to the estimated waits
+            offset: minutes added to every estimated wait
+            round_to: posted waits are rounded up to a multiple of this many minutes
+        """
+
+        self.factor = factor
+        self.offset = offset
+        self.round_to = round_to
+
+    def __call__(self, time, wait_times):
+        posted = wait_times * self.factor + self.offset
+        return np.ceil(posted / self.round_to) * self.round_to